@@ -0,0 +1,445 @@
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import random
+import time
+import uuid
+from collections import Counter
+
+from aiohttp import web
+
+WINGS_SUFFIXES = ("/resources", "/power", "/command", "/files/delete")
+
+
+class MockPanel:
+    """A fake Pterodactyl panel implementing the routes PteroAPI uses.
+
+    Latency, error rate, page size and per-key rate limits are configurable
+    so the bot can be measured without a live panel. ``requests`` counts
+    hits per route template. Backups are generated on the fly, so large
+    archives cost no memory; ``download_cut`` drops the first download of
+    each backup after that many bytes to exercise resuming.
+    """
+
+    def __init__(self, servers=200, nodes=4, latency=0.02, jitter=0.01, error_rate=0.0,
+                 per_page=50, rate_limit=None, host="127.0.0.1", port=0, ports_per_node=256,
+                 backup_size=8 << 20, backup_delay=0.0, download_cut=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.per_page = per_page
+        self.rate_limit = rate_limit
+        self.backup_size = backup_size
+        self.backup_delay = backup_delay
+        self.download_cut = download_cut
+        self._cut = set()
+        # Per-node faults for Wings-backed routes: node id -> extra latency
+        # in seconds, or None to answer 502 as if the daemon were down.
+        self.node_faults = {}
+        self.host = host
+        self.port = port
+        self.requests = Counter()
+        self._windows = {}
+        self._ids = itertools.count(1)
+        self._runner = None
+        self.nodes = {
+            n: {"id": n, "name": f"node-{n}", "fqdn": f"node{n}.example.com", "memory": 65536,
+                "memory_overallocate": 0, "disk": 1048576, "disk_overallocate": 0,
+                "allocated_resources": {"memory": 0, "disk": 0}}
+            for n in range(1, nodes + 1)
+        }
+        allocation_ids = itertools.count(1)
+        self.allocations = {}
+        for n in self.nodes:
+            for port in range(25565, 25565 + ports_per_node):
+                a = next(allocation_ids)
+                self.allocations[a] = {"id": a, "node": n, "ip": f"10.0.0.{n}", "port": port, "assigned": False}
+        self.users = {}
+        self.servers = {}
+        for _ in range(servers):
+            self.add_server(owner=1, node=random.randint(1, nodes))
+
+    def add_server(self, owner, node, memory=1024, disk=5120, cpu=100, name=None, allocation=None,
+                   external_id=None):
+        if allocation is None:
+            allocation = next(a for a in self.allocations.values() if a["node"] == node and not a["assigned"])
+        allocation["assigned"] = True
+        internal = next(self._ids)
+        identifier = uuid.uuid4().hex[:8]
+        self.servers[identifier] = {
+            "id": internal, "identifier": identifier, "uuid": str(uuid.uuid4()),
+            "name": name or f"server-{internal}", "node": node, "user": owner,
+            "suspended": False, "state": "running", "updated_at": _now(),
+            "limits": {"memory": memory, "swap": 0, "disk": disk, "io": 500, "cpu": cpu},
+            "feature_limits": {"databases": 1, "backups": 2, "allocations": 1},
+            "backups": [], "allocation": allocation["id"], "external_id": external_id,
+        }
+        self.nodes[node]["allocated_resources"]["memory"] += memory
+        self.nodes[node]["allocated_resources"]["disk"] += disk
+        return self.servers[identifier]
+
+    # --- server plumbing -----------------------------------------------
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        app = web.Application(middlewares=[self._middleware])
+        self._routes(app)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        route = request.match_info.route.resource
+        self.requests[route.canonical if route else request.path] += 1
+        if request.path.startswith(("/ws/", "/download/")):
+            return await handler(request)
+        await asyncio.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+
+        headers = {}
+        if self.rate_limit:
+            key = request.headers.get("Authorization", "")
+            window = int(time.time() // 60)
+            start, used = self._windows.get(key, (window, 0))
+            if start != window:
+                used = 0
+            used += 1
+            self._windows[key] = (window, used)
+            headers = {"X-RateLimit-Limit": str(self.rate_limit),
+                       "X-RateLimit-Remaining": str(max(self.rate_limit - used, 0))}
+            if used > self.rate_limit:
+                headers["Retry-After"] = str(60 - int(time.time()) % 60)
+                return web.json_response({"errors": [{"code": "TooManyRequestsHttpException"}]},
+                                         status=429, headers=headers)
+        server = self.servers.get(request.match_info.get("server", ""))
+        if server is not None and server["node"] in self.node_faults and request.path.endswith(WINGS_SUFFIXES):
+            fault = self.node_faults[server["node"]]
+            if fault is None:
+                return web.json_response({"errors": [{"code": "DaemonConnectionException"}]}, status=502)
+            await asyncio.sleep(fault)
+        if self.error_rate and random.random() < self.error_rate:
+            return web.json_response({"errors": [{"code": "HttpException"}]}, status=500, headers=headers)
+        response = await handler(request)
+        response.headers.update(headers)
+        return response
+
+    def _routes(self, app):
+        r = app.router
+        r.add_get("/api/client/servers/{server}", self.client_server)
+        r.add_get("/api/client/servers/{server}/resources", self.resources)
+        r.add_post("/api/client/servers/{server}/power", self.power)
+        r.add_post("/api/client/servers/{server}/command", self.command)
+        r.add_post("/api/client/servers/{server}/files/delete", self.no_content)
+        r.add_get("/api/client/servers/{server}/websocket", self.websocket_credentials)
+        r.add_get("/api/client/servers/{server}/backups", self.list_backups)
+        r.add_post("/api/client/servers/{server}/backups", self.create_backup)
+        r.add_get("/api/client/servers/{server}/backups/{backup}/download", self.backup_download_url)
+        r.add_delete("/api/client/servers/{server}/backups/{backup}", self.delete_backup)
+        r.add_get("/download/backups/{backup}", self.download)
+        r.add_get("/ws/{server}", self.websocket)
+        r.add_get("/api/application/servers", self.app_servers)
+        r.add_post("/api/application/servers", self.app_create_server)
+        r.add_get("/api/application/servers/external/{external_id}", self.app_server_external)
+        r.add_patch("/api/application/servers/{server}/details", self.app_update)
+        r.add_patch("/api/application/servers/{server}/build", self.app_update)
+        r.add_post("/api/application/servers/{server}/suspend", self.app_suspend)
+        r.add_post("/api/application/servers/{server}/unsuspend", self.app_suspend)
+        r.add_delete("/api/application/servers/{server}/force", self.app_delete)
+        r.add_get("/api/application/nodes", self.app_nodes)
+        r.add_get("/api/application/nodes/{node}", self.app_node)
+        r.add_get("/api/application/nodes/{node}/allocations", self.app_allocations)
+        r.add_get("/api/application/users", self.app_users)
+        r.add_post("/api/application/users", self.app_create_user)
+
+    def _server(self, request):
+        server = self.servers.get(request.match_info["server"])
+        if server is None:
+            raise web.HTTPNotFound()
+        return server
+
+    def _paginate(self, request, items):
+        per_page = int(request.query.get("per_page", self.per_page))
+        page = int(request.query.get("page", 1))
+        total_pages = max(1, -(-len(items) // per_page))
+        chunk = items[(page - 1) * per_page:page * per_page]
+        return web.json_response({
+            "object": "list",
+            "data": chunk,
+            "meta": {"pagination": {"total": len(items), "count": len(chunk), "per_page": per_page,
+                                    "current_page": page, "total_pages": total_pages}},
+        })
+
+    @staticmethod
+    def _filtered(request, items):
+        for key, value in request.query.items():
+            if key.startswith("filter[") and key.endswith("]"):
+                field = key[7:-1]
+                items = [i for i in items if str(i["attributes"].get(field, "")) == value]
+        return items
+
+    # --- client API ----------------------------------------------------
+
+    async def no_content(self, request):
+        self._server(request)
+        return web.Response(status=204)
+
+    async def client_server(self, request):
+        s = self._server(request)
+        return web.json_response({"object": "server", "attributes": {
+            "identifier": s["identifier"], "internal_id": s["id"], "uuid": s["uuid"], "name": s["name"],
+            "node": self.nodes[s["node"]]["name"], "limits": s["limits"], "feature_limits": s["feature_limits"],
+            "is_suspended": s["suspended"],
+        }})
+
+    async def resources(self, request):
+        s = self._server(request)
+        running = s["state"] == "running"
+        return web.json_response({"object": "stats", "attributes": {
+            "current_state": s["state"], "is_suspended": s["suspended"],
+            "resources": {
+                "memory_bytes": random.randint(256, s["limits"]["memory"]) << 20 if running else 0,
+                "cpu_absolute": round(random.uniform(0, s["limits"]["cpu"]), 3) if running else 0,
+                "disk_bytes": random.randint(100, s["limits"]["disk"]) << 20,
+                "network_rx_bytes": random.randint(0, 1 << 30),
+                "network_tx_bytes": random.randint(0, 1 << 30),
+                "uptime": 1000,
+            },
+        }})
+
+    async def power(self, request):
+        s = self._server(request)
+        signal = (await request.json())["signal"]
+        s["state"] = {"start": "running", "restart": "running", "stop": "offline", "kill": "offline"}[signal]
+        return web.Response(status=204)
+
+    async def command(self, request):
+        self._server(request)
+        await request.json()
+        return web.Response(status=204)
+
+    async def websocket_credentials(self, request):
+        s = self._server(request)
+        return web.json_response({"data": {"token": uuid.uuid4().hex,
+                                           "socket": f"ws://{self.host}:{self.port}/ws/{s['identifier']}"}})
+
+    async def websocket(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        async for msg in ws:
+            data = json.loads(msg.data)
+            if data["event"] == "auth":
+                await ws.send_json({"event": "auth success"})
+            elif data["event"] == "send logs":
+                for i in range(50):
+                    await ws.send_json({"event": "console output", "args": [f"[00:00:{i:02d}] [Server thread/INFO]: log line {i}"]})
+            elif data["event"] == "send command":
+                await ws.send_json({"event": "console output", "args": [f"> {data['args'][0]}"]})
+        return ws
+
+    async def list_backups(self, request):
+        s = self._server(request)
+        return web.json_response({"object": "list", "data": [{"object": "backup", "attributes": b} for b in s["backups"]]})
+
+    async def create_backup(self, request):
+        s = self._server(request)
+        if len(s["backups"]) >= s["feature_limits"]["backups"]:
+            return web.json_response({"errors": [{"code": "TooManyBackupsException"}]}, status=400)
+        backup = {"uuid": str(uuid.uuid4()), "name": f"Backup {len(s['backups']) + 1}", "bytes": 0,
+                  "checksum": None, "is_successful": False, "is_locked": False, "created_at": _now(),
+                  "completed_at": None}
+        s["backups"].append(backup)
+
+        def complete():
+            digest = hashlib.sha1()
+            for chunk in _backup_chunks(backup["uuid"], 0, self.backup_size):
+                digest.update(chunk)
+            backup.update(bytes=self.backup_size, checksum=f"sha1:{digest.hexdigest()}", is_successful=True,
+                          completed_at=_now())
+
+        if self.backup_delay:
+            asyncio.get_running_loop().call_later(self.backup_delay, complete)
+        else:
+            complete()
+        return web.json_response({"object": "backup", "attributes": backup}, status=200)
+
+    def _backup(self, request):
+        s = self._server(request)
+        backup = next((b for b in s["backups"] if b["uuid"] == request.match_info["backup"]), None)
+        if backup is None:
+            raise web.HTTPNotFound()
+        return s, backup
+
+    async def backup_download_url(self, request):
+        _, backup = self._backup(request)
+        return web.json_response({"object": "signed_url", "attributes": {
+            "url": f"{self.url}/download/backups/{backup['uuid']}?token={uuid.uuid4().hex}"}})
+
+    async def delete_backup(self, request):
+        s, backup = self._backup(request)
+        s["backups"].remove(backup)
+        return web.Response(status=204)
+
+    async def download(self, request):
+        backup_id = request.match_info["backup"]
+        size = self.backup_size
+        start = 0
+        if request.http_range.start is not None:
+            start = request.http_range.start
+        status = 206 if start else 200
+        response = web.StreamResponse(status=status, headers={"Content-Type": "application/gzip"})
+        response.content_length = size - start
+        if start:
+            response.headers["Content-Range"] = f"bytes {start}-{size - 1}/{size}"
+        await response.prepare(request)
+        cut = None
+        if self.download_cut is not None and backup_id not in self._cut:
+            self._cut.add(backup_id)
+            cut = start + self.download_cut
+        sent = start
+        for chunk in _backup_chunks(backup_id, start, size):
+            if cut is not None and sent + len(chunk) > cut:
+                await response.write(chunk[:cut - sent])
+                request.transport.close()
+                return response
+            await response.write(chunk)
+            sent += len(chunk)
+        await response.write_eof()
+        return response
+
+    # --- application API -----------------------------------------------
+
+    def _app_server(self, s):
+        return {"object": "server", "attributes": {
+            "id": s["id"], "identifier": s["identifier"], "uuid": s["uuid"], "name": s["name"],
+            "node": s["node"], "user": s["user"], "suspended": s["suspended"], "limits": s["limits"],
+            "feature_limits": s["feature_limits"], "updated_at": s["updated_at"], "external_id": s["external_id"],
+        }}
+
+    async def app_servers(self, request):
+        items = self._filtered(request, [self._app_server(s) for s in self.servers.values()])
+        return self._paginate(request, items)
+
+    async def app_create_server(self, request):
+        body = await request.json()
+        limits = body["limits"]
+        if "deploy" in body:
+            allocation = None
+            node = random.choice(list(self.nodes))
+        else:
+            allocation = self.allocations.get(body["allocation"]["default"])
+            if allocation is None or allocation["assigned"]:
+                return web.json_response({"errors": [{"code": "DisplayException"}]}, status=422)
+            node = allocation["node"]
+        s = self.add_server(body["user"], node, limits["memory"], limits["disk"], limits["cpu"], body.get("name"),
+                            allocation, body.get("external_id"))
+        return web.json_response(self._app_server(s), status=201)
+
+    async def app_server_external(self, request):
+        external_id = request.match_info["external_id"]
+        for s in self.servers.values():
+            if s["external_id"] == external_id:
+                return web.json_response(self._app_server(s))
+        raise web.HTTPNotFound()
+
+    async def app_update(self, request):
+        s = self._server(request)
+        body = await request.json()
+        if "name" in body:
+            s["name"] = body["name"]
+        if "limits" in body:
+            s["limits"] = body["limits"]
+        s["updated_at"] = _now()
+        return web.json_response(self._app_server(s))
+
+    async def app_suspend(self, request):
+        s = self._server(request)
+        s["suspended"] = request.path.endswith("/suspend")
+        s["updated_at"] = _now()
+        return web.Response(status=204)
+
+    async def app_delete(self, request):
+        s = self._server(request)
+        del self.servers[s["identifier"]]
+        self.allocations[s["allocation"]]["assigned"] = False
+        self.nodes[s["node"]]["allocated_resources"]["memory"] -= s["limits"]["memory"]
+        self.nodes[s["node"]]["allocated_resources"]["disk"] -= s["limits"]["disk"]
+        return web.Response(status=204)
+
+    async def app_nodes(self, request):
+        return self._paginate(request, [{"object": "node", "attributes": n} for n in self.nodes.values()])
+
+    async def app_node(self, request):
+        node = self.nodes.get(int(request.match_info["node"]))
+        if node is None:
+            raise web.HTTPNotFound()
+        servers = [s for s in self.servers.values() if s["node"] == node["id"]]
+        return web.json_response({"object": "node", "attributes": dict(
+            node,
+            memory_used=sum(s["limits"]["memory"] for s in servers),
+            disk_used=sum(s["limits"]["disk"] for s in servers),
+            servers_count=len(servers),
+        )})
+
+    async def app_allocations(self, request):
+        node = int(request.match_info["node"])
+        items = [{"object": "allocation", "attributes": {k: v for k, v in a.items() if k != "node"}}
+                 for a in self.allocations.values() if a["node"] == node]
+        return self._paginate(request, items)
+
+    async def app_users(self, request):
+        items = self._filtered(request, [{"object": "user", "attributes": u} for u in self.users.values()])
+        return self._paginate(request, items)
+
+    async def app_create_user(self, request):
+        body = await request.json()
+        user_id = len(self.users) + 1
+        self.users[user_id] = {"id": user_id, "username": body["username"], "email": body["email"],
+                               "updated_at": _now()}
+        return web.json_response({"object": "user", "attributes": self.users[user_id]}, status=201)
+
+
+def _backup_chunks(backup_id, start, end, size=64 << 10):
+    # Deterministic archive content, so checksums are stable across requests.
+    block = hashlib.sha256(backup_id.encode()).digest() * (size // 32)
+    position = start
+    while position < end:
+        offset = position % size
+        chunk = block[offset:offset + min(size - offset, end - position)]
+        yield chunk
+        position += len(chunk)
+
+
+def _now():
+    return time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime())
+
+
+async def _serve(args):
+    panel = MockPanel(servers=args.servers, nodes=args.nodes, latency=args.latency, error_rate=args.error_rate,
+                      per_page=args.per_page, rate_limit=args.rate_limit, port=args.port)
+    await panel.start()
+    print(f"Mock panel listening on {panel.url}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a fake Pterodactyl panel")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--servers", type=int, default=200)
+    parser.add_argument("--nodes", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--per-page", type=int, default=50)
+    parser.add_argument("--rate-limit", type=int, default=None)
+    asyncio.run(_serve(parser.parse_args()))
@@ -0,0 +1,190 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import discord
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.mock_panel import MockPanel
+from commands.core import Core
+from commands.user import UserCommands
+from utils.autocomplete import ServerDirectory
+from utils.console import ConsoleManager
+from utils.database import DB
+from utils.events import EventLog
+from utils.ptero_api import PteroAPI
+
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.mention = f"<@{user_id}>"
+
+    def __str__(self):
+        return f"user{self.id}"
+
+
+class FakeMessage:
+    id = 0
+
+    async def edit(self, **kwargs):
+        pass
+
+
+class FakeChannel:
+    id = 0
+
+    async def send(self, *args, **kwargs):
+        return FakeMessage()
+
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    async def defer(self, **kwargs):
+        self._done = True
+        self._interaction.acked_at = time.perf_counter()
+
+    async def send_message(self, *args, **kwargs):
+        self._done = True
+        self._interaction.acked_at = time.perf_counter()
+
+    async def edit_message(self, *args, **kwargs):
+        self._done = True
+
+
+class FakeFollowup:
+    async def send(self, *args, **kwargs):
+        return FakeMessage()
+
+
+class FakeInteraction:
+    """Just enough of discord.Interaction for the cog handlers."""
+
+    type = discord.InteractionType.application_command
+    command = None
+
+    def __init__(self, client, user_id):
+        self.client = client
+        self.user = FakeUser(user_id)
+        self.channel = FakeChannel()
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup()
+        self.extras = {}
+        self.acked_at = None
+
+
+class BenchBot:
+    latency = 0.0
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def run(args):
+    panel = await MockPanel(servers=0, nodes=args.nodes, latency=args.latency, error_rate=args.error_rate,
+                            rate_limit=args.rate_limit).start()
+    tmp = tempfile.mkdtemp(prefix="ptero-bench-")
+    bot = BenchBot()
+    bot.db = DB(os.path.join(tmp, "bench.db"))
+    await bot.db.connect()
+    bot.events = EventLog(bot.db)
+    bot.events.start()
+    bot.api = PteroAPI(panel.url, "client-key", "admin-key")
+    await bot.api.start()
+    bot.console = ConsoleManager(bot.api.get_websocket_credentials, origin=panel.url)
+    bot.server_directory = ServerDirectory(bot.db.authz)
+
+    owned = {}
+    for i in range(args.users):
+        user_id = 10_000 + i
+        await bot.db.add_user(user_id, i + 1, f"user{i}@example.com")
+        owned[user_id] = []
+        for _ in range(args.servers_per_user):
+            server = panel.add_server(owner=i + 1, node=random.randint(1, args.nodes))
+            await bot.db.add_server(server["identifier"], user_id)
+            owned[user_id].append(server["identifier"])
+
+    core, user_cog = Core(bot), UserCommands(bot)
+    workload = {
+        "status": lambda i, s: core.status.callback(core, i, s),
+        "start": lambda i, s: core.start_server.callback(core, i, s),
+        "cmd": lambda i, s: core.send_cmd.callback(core, i, s, "say hello"),
+        "server-resources": lambda i, s: user_cog.server_resources.callback(user_cog, i, s),
+        "server-logs": lambda i, s: user_cog.server_logs.callback(user_cog, i, s),
+        "dashboard": lambda i, s: user_cog.dashboard.callback(user_cog, i),
+        "list-servers": lambda i, s: user_cog.list_servers.callback(user_cog, i),
+    }
+    names = [n for n in args.mix.split(",") if n] or list(workload)
+
+    latencies = defaultdict(list)
+    ack = defaultdict(list)
+    errors = defaultdict(int)
+
+    async def simulate(user_id):
+        for _ in range(args.commands):
+            name = random.choice(names)
+            interaction = FakeInteraction(bot, user_id)
+            start = time.perf_counter()
+            try:
+                await workload[name](interaction, random.choice(owned[user_id]))
+            except Exception:
+                errors[name] += 1
+            latencies[name].append(time.perf_counter() - start)
+            if interaction.acked_at is not None:
+                ack[name].append(interaction.acked_at - start)
+
+    before = sum(panel.requests.values())
+    started = time.perf_counter()
+    await asyncio.gather(*(simulate(user_id) for user_id in owned))
+    elapsed = time.perf_counter() - started
+    panel_requests = sum(panel.requests.values()) - before
+    total = sum(len(v) for v in latencies.values())
+
+    print(f"{args.users} users x {args.commands} commands, panel latency {args.latency * 1000:.0f} ms")
+    print(f"{'command':<18}{'n':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'ack p95':>9}{'errors':>8}")
+    for name in sorted(latencies):
+        v = latencies[name]
+        print(f"{name:<18}{len(v):>6}{percentile(v, .5) * 1000:>9.1f}{percentile(v, .95) * 1000:>9.1f}"
+              f"{percentile(v, .99) * 1000:>9.1f}{percentile(ack[name], .95) * 1000:>9.1f}{errors[name]:>8}")
+    every = [x for v in latencies.values() for x in v]
+    print(f"{'all':<18}{total:>6}{percentile(every, .5) * 1000:>9.1f}{percentile(every, .95) * 1000:>9.1f}"
+          f"{percentile(every, .99) * 1000:>9.1f}")
+    print(f"throughput: {total / elapsed:.1f} commands/s over {elapsed:.2f}s")
+    print(f"panel requests: {panel_requests} ({panel_requests / max(total, 1):.2f} per command)")
+    for route, count in panel.requests.most_common(8):
+        print(f"  {count:>6}  {route}")
+
+    await bot.events.stop()
+    await bot.console.close()
+    await bot.api.close()
+    await bot.db.close()
+    await panel.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive the cog handlers against a mock panel")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--commands", type=int, default=20, help="commands per user")
+    parser.add_argument("--servers-per-user", type=int, default=3)
+    parser.add_argument("--nodes", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.02, help="mean panel latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=None, help="panel requests per minute per key")
+    parser.add_argument("--mix", default="", help="comma-separated commands to run (default: all)")
+    asyncio.run(run(parser.parse_args()))
@@ -1,20 +1,30 @@
+import io
+import re
+from typing import Literal, Optional
+
 import discord
 from discord.ext import commands
 from discord import app_commands, Interaction
-from utils.ptero_api import PteroAPI
-from utils.database import DB
-import os
-
-ADMIN_IDS = os.getenv("ADMIN_IDS", "").split(",")
-
-def is_admin(user_id: int) -> bool:
-    return str(user_id) in ADMIN_IDS
+from utils.autocomplete import panel_autocomplete, server_id_autocomplete
+from utils import metrics
+from utils.metrics import defer
+from utils.paginator import PaginatedView, UserSource, NodeServerSource, AuditSource
+from utils.authz import is_admin
+from utils.bulk import run_bulk, ProgressReporter
+from utils.console import MAX_BATCH, split_commands
+from utils.events import audit
+from utils.jobs import queued_message
+from utils.ratelimit import PRIORITY_ADMIN
 
 class AdminCommands(commands.Cog):
+    # Every command here is gated by admin_check instead of the tree's
+    # server-access check.
+    authz_exempt = True
+
     def __init__(self, bot):
         self.bot = bot
-        self.api = PteroAPI()
-        self.db = DB()
+        self.api = bot.api
+        self.db = bot.db
 
     async def admin_check(self, interaction: Interaction) -> bool:
         if not is_admin(interaction.user.id):
@@ -22,116 +32,298 @@ class AdminCommands(commands.Cog):
             return False
         return True
 
+    async def unknown_panel(self, interaction: Interaction, panel) -> bool:
+        if panel is None or panel in self.api.panels:
+            return False
+        await interaction.response.send_message(f"❌ Unknown panel `{panel}`.", ephemeral=True)
+        return True
+
     @app_commands.command(name="create-server", description="Create a new server for a user")
     async def create_server(self, interaction: Interaction, user: discord.User, ram: int, disk: int, cpu: int):
         if not await self.admin_check(interaction): return
-        await interaction.response.defer()
-        panel_user = self.db.get_user(user.id)
+        await defer(interaction)
+        panel_user = await self.db.get_user(user.id)
         if not panel_user:
             return await interaction.followup.send("❌ That user does not have a panel account.")
 
-        server = await self.api.create_server(panel_user["panel_id"], ram, disk, cpu)
-        if server:
-            self.db.add_server(server["identifier"], owner_id=user.id)
-            await interaction.followup.send(f"✅ Server created: `{server['identifier']}`")
+        job_id, created = await self.bot.jobs.submit(
+            "create-server", {"panel_id": panel_user["panel_id"], "panel": panel_user["panel"], "owner_id": user.id,
+                              "ram": ram, "disk": disk, "cpu": cpu},
+            key=f"create-server:{interaction.id}", interaction=interaction)
+        audit(interaction, "server.create", target_id=user.id, detail=f"job #{job_id} {ram}MB/{disk}MB/{cpu}%",
+              outcome="queued")
+        await interaction.followup.send(queued_message(job_id, created))
+
+    @app_commands.command(name="placement-preview", description="Show which node a new server would be placed on")
+    @app_commands.autocomplete(panel=panel_autocomplete)
+    async def placement_preview(self, interaction: Interaction, ram: int, disk: int, cpu: int,
+                                panel: Optional[str] = None):
+        if not await self.admin_check(interaction): return
+        if await self.unknown_panel(interaction, panel): return
+        await defer(interaction, ephemeral=True)
+        placement = self.bot.placement[self.api.key(panel)]
+        await placement.refresh()
+        decision = placement.decide(ram, disk, cpu)
+        if decision.node_id is None:
+            title, color = f"❌ {decision.reason}", discord.Color.red()
         else:
-            await interaction.followup.send("❌ Failed to create server.")
+            title, color = f"📍 Would place on {decision.name}", discord.Color.green()
+        embed = discord.Embed(title=title, description=f"Request: {ram} MB RAM · {disk} MB disk · {cpu}% CPU\n"
+                                                       f"Strategy: `{placement.strategy}`", color=color)
+        ranked = sorted(decision.candidates, key=lambda c: (c[1] is None, c[1] or 0))
+        for node, score, status in ranked[:25]:
+            pending = placement.pending(node.node_id)
+            limit = lambda x: "∞" if x == float("inf") else f"{x:.0f}"
+            value = (f"RAM {node.memory_used + pending[0]:.0f}/{limit(node.memory_total)} MB\n"
+                     f"Disk {node.disk_used + pending[1]:.0f}/{limit(node.disk_total)} MB\n"
+                     f"CPU {node.cpu_used + pending[2]:.0f}/{limit(node.cpu_total)}%")
+            label = f"score {score:.3f}" if score is not None else status
+            embed.add_field(name=f"{'⭐ ' if node.node_id == decision.node_id else ''}{node.name} ({label})",
+                            value=value, inline=True)
+        await interaction.followup.send(embed=embed)
 
     @app_commands.command(name="delete-server", description="Delete a server")
+    @app_commands.autocomplete(server_id=server_id_autocomplete)
     async def delete_server(self, interaction: Interaction, server_id: str):
         if not await self.admin_check(interaction): return
-        await interaction.response.defer()
-        success = await self.api.delete_server(server_id)
-        if success:
-            self.db.delete_server(server_id)
-            await interaction.followup.send("🗑️ Server deleted.")
-        else:
-            await interaction.followup.send("❌ Failed to delete server.")
+        await defer(interaction)
+        job_id, created = await self.bot.jobs.submit("delete-server", {"server_id": server_id},
+                                                     key=f"delete-server:{server_id}", interaction=interaction)
+        audit(interaction, "server.delete", server_id, detail=f"job #{job_id}", outcome="queued")
+        await interaction.followup.send(queued_message(job_id, created))
 
     @app_commands.command(name="suspend-server", description="Suspend a server")
+    @app_commands.autocomplete(server_id=server_id_autocomplete)
     async def suspend_server(self, interaction: Interaction, server_id: str):
         if not await self.admin_check(interaction): return
-        await interaction.response.defer()
+        await defer(interaction)
         success = await self.api.suspend_server(server_id)
+        audit(interaction, "server.suspend", server_id, outcome="ok" if success else "failed")
         await interaction.followup.send("⏸️ Suspended." if success else "❌ Failed.")
 
     @app_commands.command(name="unsuspend-server", description="Unsuspend a server")
+    @app_commands.autocomplete(server_id=server_id_autocomplete)
     async def unsuspend_server(self, interaction: Interaction, server_id: str):
         if not await self.admin_check(interaction): return
-        await interaction.response.defer()
+        await defer(interaction)
         success = await self.api.unsuspend_server(server_id)
+        audit(interaction, "server.unsuspend", server_id, outcome="ok" if success else "failed")
         await interaction.followup.send("▶️ Unsuspended." if success else "❌ Failed.")
 
     @app_commands.command(name="wipe-server", description="Wipe all server files")
+    @app_commands.autocomplete(server_id=server_id_autocomplete)
     async def wipe_server(self, interaction: Interaction, server_id: str):
         if not await self.admin_check(interaction): return
-        await interaction.response.defer()
-        success = await self.api.wipe_server(server_id)
-        await interaction.followup.send("🧼 Wiped." if success else "❌ Failed.")
+        await defer(interaction)
+        job_id, created = await self.bot.jobs.submit("wipe-server", {"server_id": server_id},
+                                                     key=f"wipe-server:{server_id}", interaction=interaction)
+        audit(interaction, "server.wipe", server_id, detail=f"job #{job_id}", outcome="queued")
+        await interaction.followup.send(queued_message(job_id, created))
 
     @app_commands.command(name="update-server-limits", description="Update server resource limits")
+    @app_commands.autocomplete(server_id=server_id_autocomplete)
     async def update_limits(self, interaction: Interaction, server_id: str, ram: int, disk: int, cpu: int):
         if not await self.admin_check(interaction): return
-        await interaction.response.defer()
+        await defer(interaction)
         success = await self.api.update_limits(server_id, ram, disk, cpu)
+        audit(interaction, "server.update-limits", server_id, detail=f"{ram}MB/{disk}MB/{cpu}%",
+              outcome="ok" if success else "failed")
         await interaction.followup.send("🔧 Updated." if success else "❌ Failed.")
 
+    async def _bulk_targets(self, node_id, owner, server_ids, panel=None):
+        if node_id is not None:
+            return await self.api.list_servers_on_node(node_id, panel)
+        if owner is not None:
+            return await self.db.get_owned_servers(owner.id)
+        return list(dict.fromkeys(s for s in re.split(r"[\s,]+", server_ids) if s))
+
+    @app_commands.command(name="bulk-action", description="Run a power or admin action across many servers")
+    @app_commands.autocomplete(panel=panel_autocomplete)
+    @app_commands.describe(
+        node_id="Target every server on this node",
+        panel="The panel node_id is on (required when there are several)",
+        owner="Target every server owned by this user",
+        server_ids="Target an explicit list of server IDs (comma or space separated)",
+        dry_run="Only list the servers that would be affected",
+        concurrency="How many servers to act on at once",
+    )
+    async def bulk_action(self, interaction: Interaction,
+                          action: Literal["start", "stop", "restart", "kill", "suspend", "unsuspend", "update-limits",
+                                          "backup"],
+                          node_id: Optional[int] = None, panel: Optional[str] = None,
+                          owner: Optional[discord.User] = None,
+                          server_ids: Optional[str] = None, ram: Optional[int] = None, disk: Optional[int] = None,
+                          cpu: Optional[int] = None, dry_run: bool = False,
+                          concurrency: app_commands.Range[int, 1, 32] = 8):
+        if not await self.admin_check(interaction): return
+        if sum(x is not None for x in (node_id, owner, server_ids)) != 1:
+            return await interaction.response.send_message(
+                "❌ Pick exactly one target: `node_id`, `owner` or `server_ids`.", ephemeral=True)
+        if await self.unknown_panel(interaction, panel): return
+        if node_id is not None and panel is None and len(self.api.panels) > 1:
+            return await interaction.response.send_message(
+                "❌ Node IDs are per panel; pick the `panel` too.", ephemeral=True)
+        if action == "update-limits" and None in (ram, disk, cpu):
+            return await interaction.response.send_message(
+                "❌ `update-limits` needs `ram`, `disk` and `cpu`.", ephemeral=True)
+        await defer(interaction)
+
+        targets = await self._bulk_targets(node_id, owner, server_ids, panel)
+        if not targets:
+            return await interaction.followup.send("❌ No servers matched that target.")
+
+        if dry_run:
+            listing = "\n".join(targets)
+            return await interaction.followup.send(
+                f"🧪 Dry run: `{action}` would affect {len(targets)} server(s).",
+                file=discord.File(io.BytesIO(listing.encode()), filename="targets.txt"))
+
+        if action == "suspend":
+            operation = self.api.suspend_server
+        elif action == "unsuspend":
+            operation = self.api.unsuspend_server
+        elif action == "update-limits":
+            operation = lambda sid: self.api.update_limits(sid, ram, disk, cpu)
+        elif action == "backup":
+            operation = lambda sid: self.bot.backups.backup_server(sid, rotate=True, priority=PRIORITY_ADMIN)
+        else:
+            operation = lambda sid: self.api.send_power_action(sid, action)
+
+        title = f"🛠️ Bulk `{action}` on {len(targets)} server(s)"
+        message = await interaction.followup.send(title, wait=True)
+        reporter = ProgressReporter(message, title)
+        results = await run_bulk(targets, operation, concurrency=concurrency, on_progress=reporter)
+
+        failed = [r for r in results if not r.ok]
+        audit(interaction, f"bulk.{action}", detail=f"{len(results)} servers, {len(failed)} failed",
+              outcome="ok" if not failed else "partial")
+        report = "\n".join(f"{r.server_id}\t{'ok' if r.ok else 'FAILED: ' + r.error}" for r in results)
+        summary = f"✅ {len(results) - len(failed)} succeeded, ❌ {len(failed)} failed."
+        # A large run can outlive the 15-minute interaction token; the
+        # results then go by DM.
+        try:
+            await message.edit(content=reporter.render(results, len(targets)).replace("⏳", "🏁"))
+        except discord.HTTPException:
+            pass
+        try:
+            await interaction.followup.send(summary, file=discord.File(io.BytesIO(report.encode()),
+                                                                       filename="results.txt"))
+        except discord.HTTPException:
+            await interaction.user.send(f"{title}\n{summary}",
+                                        file=discord.File(io.BytesIO(report.encode()), filename="results.txt"))
+
+    @app_commands.command(name="bulk-schedule", description="Schedule a recurring action across many servers")
+    @app_commands.autocomplete(panel=panel_autocomplete)
+    @app_commands.describe(
+        cron="Five-field cron expression in UTC, or @hourly/@daily/@weekly",
+        command="For the command action: console commands separated by ;",
+        node_id="Target every server on this node",
+        panel="The panel node_id is on (required when there are several)",
+        owner="Target every server owned by this user",
+        server_ids="Target an explicit list of server IDs (comma or space separated)",
+        jitter="Spread start times over this many seconds",
+    )
+    async def bulk_schedule(self, interaction: Interaction, cron: str,
+                            action: Literal["command", "start", "stop", "restart", "kill"],
+                            command: Optional[str] = None, node_id: Optional[int] = None, panel: Optional[str] = None,
+                            owner: Optional[discord.User] = None, server_ids: Optional[str] = None,
+                            jitter: app_commands.Range[int, 0, 3600] = 300):
+        if not await self.admin_check(interaction): return
+        if sum(x is not None for x in (node_id, owner, server_ids)) != 1:
+            return await interaction.response.send_message(
+                "❌ Pick exactly one target: `node_id`, `owner` or `server_ids`.", ephemeral=True)
+        if await self.unknown_panel(interaction, panel): return
+        if node_id is not None and panel is None and len(self.api.panels) > 1:
+            return await interaction.response.send_message(
+                "❌ Node IDs are per panel; pick the `panel` too.", ephemeral=True)
+        commands_ = split_commands(command or "")
+        if action == "command" and not 1 <= len(commands_) <= MAX_BATCH:
+            return await interaction.response.send_message(
+                f"❌ The command action needs between 1 and {MAX_BATCH} commands.", ephemeral=True)
+        await defer(interaction)
+        targets = await self._bulk_targets(node_id, owner, server_ids, panel)
+        if not targets:
+            return await interaction.followup.send("❌ No servers matched that target.")
+        # Listed IDs are checked against the local DB and the last panel
+        # walk, so a typo is refused now rather than failing on every run.
+        known = self.db.authz.owners.keys() | self.bot.server_directory.names.keys()
+        unknown = [sid for sid in targets if sid not in known]
+        if server_ids is not None and unknown:
+            return await interaction.followup.send(f"❌ Unknown server(s): {', '.join(unknown)[:1800]}")
+        try:
+            ids = await self.bot.scheduler.add(interaction.user.id, targets, cron, action, commands_ or None, jitter)
+        except ValueError as e:
+            return await interaction.followup.send(f"❌ Invalid schedule: {e}")
+        audit(interaction, "schedule.bulk-add", detail=f"{len(ids)} servers: {cron} {action} {command or ''}")
+        await interaction.followup.send(f"⏰ Created {len(ids)} schedule(s), #{ids[0]}–#{ids[-1]}, "
+                                        f"spread over {jitter}s after each `{cron}` match.")
+
     @app_commands.command(name="ban-user", description="Ban a user from using the bot")
     async def ban_user(self, interaction: Interaction, user: discord.User):
         if not await self.admin_check(interaction): return
-        self.db.ban_user(user.id)
+        await self.db.ban_user(user.id)
+        audit(interaction, "user.ban", target_id=user.id)
         await interaction.response.send_message(f"🚫 Banned {user.mention}", ephemeral=True)
 
     @app_commands.command(name="unban-user", description="Unban a previously banned user")
     async def unban_user(self, interaction: Interaction, user: discord.User):
         if not await self.admin_check(interaction): return
-        self.db.unban_user(user.id)
+        await self.db.unban_user(user.id)
+        audit(interaction, "user.unban", target_id=user.id)
         await interaction.response.send_message(f"✅ Unbanned {user.mention}", ephemeral=True)
 
     @app_commands.command(name="list-users", description="List all users linked to the panel")
     async def list_users(self, interaction: Interaction):
         if not await self.admin_check(interaction): return
-        users = self.db.list_users()
-        if not users:
+        view = PaginatedView(UserSource(self.db), interaction.user.id)
+        embed = await view.render(0)
+        if view.last_page == 0 and not view.pages[0]:
             return await interaction.response.send_message("❌ No users found.", ephemeral=True)
-        msg = "\n".join(f"`{u['discord_id']}` | {u['email']}" for u in users)
-        await interaction.response.send_message(f"📋 **Linked Users:**\n{msg}", ephemeral=True)
+        await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
 
     @app_commands.command(name="list-shared-access", description="List who has access to a server")
+    @app_commands.autocomplete(server_id=server_id_autocomplete)
     async def list_shared(self, interaction: Interaction, server_id: str):
         if not await self.admin_check(interaction): return
-        users = self.db.get_shared_users(server_id)
+        users = await self.db.get_shared_users(server_id)
         if not users:
             return await interaction.response.send_message("No one has access to this server.", ephemeral=True)
         mentions = [f"<@{uid}>" for uid in users]
         await interaction.response.send_message(f"👥 Shared with: {', '.join(mentions)}", ephemeral=True)
 
     @app_commands.command(name="servers-on-node", description="List all servers on a given node")
-    async def servers_on_node(self, interaction: Interaction, node_id: int):
+    @app_commands.describe(panel="Only this panel's node; by default every panel is searched")
+    @app_commands.autocomplete(panel=panel_autocomplete)
+    async def servers_on_node(self, interaction: Interaction, node_id: int, panel: Optional[str] = None):
         if not await self.admin_check(interaction): return
-        await interaction.response.defer()
-        servers = await self.api.list_servers_on_node(node_id)
-        if not servers:
+        if await self.unknown_panel(interaction, panel): return
+        await defer(interaction)
+        view = PaginatedView(NodeServerSource(self.api, node_id, panel), interaction.user.id)
+        embed = await view.render(0)
+        if view.last_page == 0 and not view.pages[0]:
             return await interaction.followup.send("❌ No servers found.")
-        await interaction.followup.send("🖥️ Servers:\n" + "\n".join(f"`{s}`" for s in servers))
+        await interaction.followup.send(embed=embed, view=view)
 
     @app_commands.command(name="nodes", description="List all nodes")
     async def list_nodes(self, interaction: Interaction):
         if not await self.admin_check(interaction): return
-        await interaction.response.defer()
+        await defer(interaction)
         nodes = await self.api.list_nodes()
         if not nodes:
             return await interaction.followup.send("❌ Could not fetch nodes.")
         embed = discord.Embed(title="📡 Registered Nodes", color=discord.Color.purple())
-        for node in nodes:
-            embed.add_field(name=node["name"], value=f"ID: `{node['id']}` - {node['fqdn']}", inline=False)
+        for node in nodes[:25]:
+            panel = f" · {node['panel'] or self.api.default}" if len(self.api.panels) > 1 else ""
+            embed.add_field(name=node["name"], value=f"ID: `{node['id']}` - {node['fqdn']}{panel}", inline=False)
         await interaction.followup.send(embed=embed)
 
     @app_commands.command(name="node-status", description="Show usage stats of a node")
-    async def node_status(self, interaction: Interaction, node_id: int):
+    @app_commands.autocomplete(panel=panel_autocomplete)
+    async def node_status(self, interaction: Interaction, node_id: int, panel: Optional[str] = None):
         if not await self.admin_check(interaction): return
-        await interaction.response.defer()
-        usage = await self.api.get_node_status(node_id)
+        if await self.unknown_panel(interaction, panel): return
+        await defer(interaction)
+        usage = await self.api.get_node_status(node_id, panel=panel)
         if not usage:
             return await interaction.followup.send("❌ Could not get node stats.")
         embed = discord.Embed(title=f"📊 Node Status (ID: {node_id})", color=discord.Color.teal())
@@ -139,3 +331,97 @@ class AdminCommands(commands.Cog):
         embed.add_field(name="Memory", value=usage.get("memory", "N/A"), inline=True)
         embed.add_field(name="Servers", value=usage.get("servers", "N/A"), inline=True)
         await interaction.followup.send(embed=embed)
+
+    @app_commands.command(name="audit-log", description="Browse recorded admin and user actions")
+    @app_commands.autocomplete(server_id=server_id_autocomplete)
+    @app_commands.describe(user="Only actions taken by this user", server_id="Only actions on this server",
+                           action="Only actions starting with this, e.g. `server.` or `power.start`")
+    async def audit_log(self, interaction: Interaction, user: Optional[discord.User] = None,
+                        server_id: Optional[str] = None, action: Optional[str] = None):
+        if not await self.admin_check(interaction): return
+        await defer(interaction, ephemeral=True)
+        # Make sure what was just recorded is visible.
+        await self.bot.events.flush()
+        view = PaginatedView(AuditSource(self.db, user.id if user else None, server_id), interaction.user.id,
+                             per_page=10)
+        if action:
+            view.reset(action.lower())
+        embed = await view.render(0)
+        await interaction.followup.send(embed=embed, view=view)
+
+    @app_commands.command(name="panel-health", description="Show circuit breaker state for the panel and nodes")
+    async def panel_health(self, interaction: Interaction):
+        if not await self.admin_check(interaction): return
+        icons = {"closed": "🟢", "half-open": "🟡", "open": "🔴"}
+        stats = self.api.breaker_stats()
+        unhealthy = any(s["state"] != "closed" for s in stats)
+        embed = discord.Embed(title="🩺 Panel Health",
+                              color=discord.Color.red() if unhealthy else discord.Color.green())
+        for s in stats[:25]:
+            value = (f"{icons[s['state']]} {s['state']}\n"
+                     f"failures in a row: {s['failures']}\n"
+                     f"slow: {s['slow']}/{s['recent']} recent\n"
+                     f"opened {s['opened']}×, rejected {s['rejected']}")
+            if s["state"] == "open":
+                value += f"\nprobe in {s['retry_in']:.0f}s"
+            embed.add_field(name=s["name"], value=value, inline=True)
+        hedges = sum(metrics.PANEL_HEDGES.series.values())
+        won = sum(n for (_, winner), n in metrics.PANEL_HEDGES.series.items() if winner == "hedge")
+        embed.set_footer(text=f"Hedged reads: {hedges} ({won} answered by the hedge)")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="bot-stats", description="Show command and panel latency statistics")
+    async def show_bot_stats(self, interaction: Interaction):
+        if not await self.admin_check(interaction): return
+        embed = discord.Embed(title="📊 Bot Stats", color=discord.Color.gold())
+
+        commands_seen = {}
+        for (name, outcome), series in metrics.COMMAND_LATENCY.series.items():
+            commands_seen.setdefault(name, []).append((outcome, series[2]))
+        lines = []
+        for name, outcomes in sorted(commands_seen.items(), key=lambda kv: -sum(n for _, n in kv[1]))[:10]:
+            total = sum(n for _, n in outcomes)
+            p50 = metrics.COMMAND_LATENCY.quantile(0.5, name, "ok") * 1000
+            p95 = metrics.COMMAND_LATENCY.quantile(0.95, name, "ok") * 1000
+            errors = sum(n for outcome, n in outcomes if outcome == "error")
+            lines.append(f"`/{name}` ×{total} p50 {p50:.0f}ms p95 {p95:.0f}ms err {errors}")
+        embed.add_field(name="Commands", value="\n".join(lines) or "No data yet", inline=False)
+
+        endpoints = {}
+        for (method, endpoint, status), series in metrics.PANEL_LATENCY.series.items():
+            key = (method, endpoint)
+            endpoints.setdefault(key, []).append((status, series[2]))
+        lines = []
+        for (method, endpoint), statuses in sorted(endpoints.items(), key=lambda kv: -sum(n for _, n in kv[1]))[:10]:
+            total = sum(n for _, n in statuses)
+            failed = sum(n for status, n in statuses if not 200 <= status < 300)
+            ok = next((s for s, _ in statuses if 200 <= s < 300), None)
+            p95 = metrics.PANEL_LATENCY.quantile(0.95, method, endpoint, ok) * 1000 if ok else 0
+            lines.append(f"`{method} {endpoint.replace('/api', '')}` ×{total} p95 {p95:.0f}ms fail {failed}")
+        embed.add_field(name="Panel API", value="\n".join(lines)[:1024] or "No data yet", inline=False)
+
+        limits = "\n".join(
+            f"`{s['name']}` queue {s['queue_depth']} tokens {s['tokens']}/{s['capacity']} "
+            f"p95 wait {s['p95_wait'] * 1000:.0f}ms throttled {s['throttled']}"
+            for s in self.api.limiter_stats())
+        embed.add_field(name="Rate limits", value=limits, inline=False)
+        cache = self.api.cache_stats()
+        embed.add_field(name="Cache", value=f"{cache['size']} entries, {cache['hits']} hits, "
+                                            f"{cache['stale_hits']} stale, {cache['misses']} misses", inline=False)
+        depth = await self.db.job_counts()
+        jobs = ", ".join(f"{n} {state}" for state, n in sorted(depth.items())) or "No jobs yet"
+        job_p95 = [f"`{kind}` p95 {metrics.JOB_LATENCY.quantile(0.95, kind, outcome):.1f}s"
+                   for kind, outcome in metrics.JOB_LATENCY.series if outcome == "done"]
+        embed.add_field(name="Jobs", value="\n".join([jobs] + job_p95)[:1024], inline=False)
+        report = self.bot.reconciler.last_report
+        if report:
+            drift = ", ".join(f"{k} {v}" for k, v in report.items()
+                              if k not in ("at", "duration", "cursor", "unchanged") and v) or "no drift"
+            embed.add_field(name="Reconciler", value=f"<t:{report['at']}:R> in {report['duration']}s — {drift}",
+                            inline=False)
+        embed.add_field(name="Gateway", value=f"{round(self.bot.latency * 1000)}ms", inline=True)
+        shard_ids = getattr(self.bot, "shard_ids", None)
+        shards = f", shards {', '.join(map(str, shard_ids))}" if shard_ids else ""
+        role = "leader" if self.bot.leader.is_leader else "follower"
+        embed.add_field(name="Process", value=f"`{self.bot.process_id}` {role}{shards}", inline=True)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
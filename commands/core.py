@@ -1,43 +1,53 @@
 import discord
 from discord import app_commands, Interaction
 from discord.ext import commands
-from utils.ptero_api import PteroAPI
+from utils.autocomplete import server_id_autocomplete
+from utils.console import MAX_BATCH, send_commands, split_commands
+from utils.events import audit
+from utils.metrics import defer
 
 class Core(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.api = PteroAPI()
+        self.api = bot.api
 
     @app_commands.command(name="start", description="Start your Minecraft server")
+    @app_commands.autocomplete(server_id=server_id_autocomplete)
     async def start_server(self, interaction: Interaction, server_id: str):
-        await interaction.response.defer()
+        await defer(interaction)
         result = await self.api.send_power_action(server_id, "start")
+        audit(interaction, "power.start", server_id, outcome="ok" if result else "failed")
         if result:
             await interaction.followup.send("🟢 Server starting...")
         else:
             await interaction.followup.send("❌ Failed to start server.")
 
     @app_commands.command(name="stop", description="Stop your Minecraft server")
+    @app_commands.autocomplete(server_id=server_id_autocomplete)
     async def stop_server(self, interaction: Interaction, server_id: str):
-        await interaction.response.defer()
+        await defer(interaction)
         result = await self.api.send_power_action(server_id, "stop")
+        audit(interaction, "power.stop", server_id, outcome="ok" if result else "failed")
         if result:
             await interaction.followup.send("🔴 Server stopping...")
         else:
             await interaction.followup.send("❌ Failed to stop server.")
 
     @app_commands.command(name="restart", description="Restart your Minecraft server")
+    @app_commands.autocomplete(server_id=server_id_autocomplete)
     async def restart_server(self, interaction: Interaction, server_id: str):
-        await interaction.response.defer()
+        await defer(interaction)
         result = await self.api.send_power_action(server_id, "restart")
+        audit(interaction, "power.restart", server_id, outcome="ok" if result else "failed")
         if result:
             await interaction.followup.send("🔁 Server restarting...")
         else:
             await interaction.followup.send("❌ Failed to restart server.")
 
     @app_commands.command(name="status", description="Check server status")
+    @app_commands.autocomplete(server_id=server_id_autocomplete)
     async def status(self, interaction: Interaction, server_id: str):
-        await interaction.response.defer()
+        await defer(interaction)
         status = await self.api.get_server_status(server_id)
         if status:
             state = status["attributes"]["current_state"]
@@ -46,11 +56,22 @@ class Core(commands.Cog):
             await interaction.followup.send("❌ Unable to retrieve status.")
 
     @app_commands.command(name="cmd", description="Send a command to your server console")
+    @app_commands.describe(command=f"One command, or up to {MAX_BATCH} separated by ; to run in order")
+    @app_commands.autocomplete(server_id=server_id_autocomplete)
     async def send_cmd(self, interaction: Interaction, server_id: str, command: str):
-        await interaction.response.defer()
-        result = await self.api.send_command(server_id, command)
-        if result:
-            await interaction.followup.send(f"📥 Sent command: `{command}`")
+        batch = split_commands(command)
+        if not batch or len(batch) > MAX_BATCH:
+            return await interaction.response.send_message(
+                f"❌ Send between 1 and {MAX_BATCH} commands.", ephemeral=True)
+        await defer(interaction)
+        sent = await send_commands(self.bot.console, self.api, server_id, batch)
+        audit(interaction, "console.command", server_id, detail=command,
+              outcome="ok" if sent == len(batch) else "failed")
+        if sent == len(batch):
+            await interaction.followup.send(f"📥 Sent command: `{command}`" if sent == 1 else
+                                            "📥 Sent commands:\n" + "\n".join(f"`{c}`" for c in batch))
+        elif sent:
+            await interaction.followup.send(f"⚠️ Sent {sent} of {len(batch)} commands; stopped at `{batch[sent]}`.")
         else:
             await interaction.followup.send("❌ Failed to send command.")
 
@@ -78,18 +99,25 @@ class Core(commands.Cog):
                 name="/list-servers", value="List your owned and shared servers", inline=False
             ).add_field(
                 name="/server-logs", value="View recent logs of a server", inline=False
+            ).add_field(
+                name="/live-tail", value="Mirror a server console into the channel", inline=False
             ).add_field(
                 name="/change-name", value="Change the name of your server", inline=False
             ).add_field(
                 name="/server-resources", value="Check RAM, CPU, and disk usage", inline=False
             ).add_field(
                 name="/download-backup", value="List and download backups", inline=False
+            ).add_field(
+                name="/create-backup", value="Start a new backup of your server", inline=False
             ).add_field(
                 name="/reset-server", value="Wipe all files on the server", inline=False
             ).add_field(
                 name="/start /stop /restart /status", value="Control your server’s power state", inline=False
             ).add_field(
-                name="/cmd", value="Send a command to the server console", inline=False
+                name="/cmd", value="Send commands to the server console (separate several with ;)", inline=False
+            ).add_field(
+                name="/schedule-add /schedules /schedule-remove",
+                value="Run commands or power actions on a cron schedule", inline=False
             ).add_field(
                 name="/ping", value="Check bot responsiveness", inline=False),
 
@@ -99,6 +127,8 @@ class Core(commands.Cog):
                 color=discord.Color.dark_red()
             ).add_field(
                 name="/create-server", value="Create a server for a user", inline=False
+            ).add_field(
+                name="/placement-preview", value="Show which node a new server would land on", inline=False
             ).add_field(
                 name="/delete-server", value="Permanently delete a server", inline=False
             ).add_field(
@@ -109,6 +139,10 @@ class Core(commands.Cog):
                 name="/wipe-server", value="Delete all server files", inline=False
             ).add_field(
                 name="/update-server-limits", value="Modify RAM, CPU, disk of a server", inline=False
+            ).add_field(
+                name="/bulk-action", value="Run an action across a node, an owner's servers or a list", inline=False
+            ).add_field(
+                name="/bulk-schedule", value="Schedule a recurring action across many servers", inline=False
             ).add_field(
                 name="/ban-user", value="Prevent a user from using the bot", inline=False
             ).add_field(
@@ -122,7 +156,13 @@ class Core(commands.Cog):
             ).add_field(
                 name="/nodes", value="View all registered nodes", inline=False
             ).add_field(
-                name="/node-status", value="Check usage and status of a node", inline=False)
+                name="/node-status", value="Check usage and status of a node", inline=False
+            ).add_field(
+                name="/audit-log", value="Browse recorded actions by user, server or action", inline=False
+            ).add_field(
+                name="/panel-health", value="Circuit breaker state for the panel and each node", inline=False
+            ).add_field(
+                name="/bot-stats", value="Command and panel latency statistics", inline=False)
         ]
 
         class HelpView(discord.ui.View):
@@ -141,6 +181,3 @@ class Core(commands.Cog):
                 await interaction.response.edit_message(embed=pages[self.page], view=self)
 
         await interaction.response.send_message(embed=pages[0], view=HelpView(), ephemeral=True)
-
-    def cog_unload(self):
-        self.bot.loop.create_task(self.api.close())
@@ -1,18 +1,48 @@
+import asyncio
+import json
+import os
+import time
+from typing import Literal, Optional
+
 import discord
 from discord.ext import commands
 from discord import app_commands, Interaction
-from utils.ptero_api import PteroAPI
-from utils.database import DB
+from utils.authz import is_admin
+from utils.autocomplete import panel_autocomplete, server_id_autocomplete
+from utils.console import MAX_BATCH, split_commands
+from utils.bulk import FanOut
+from utils.events import audit
+from utils.jobs import queued_message
+from utils.metrics import defer
+
+HISTORY_WINDOWS = {"1h": 3600, "24h": 86400, "7d": 7 * 86400}
+STATE_ICONS = {"running": "🟢", "starting": "🟡", "stopping": "🟠", "offline": "🔴"}
+DASHBOARD_MAX_SERVERS = 10
+MAX_SCHEDULES = int(os.getenv("MAX_SCHEDULES_PER_USER", 25))
+DASHBOARD_CONCURRENCY = int(os.getenv("DASHBOARD_CONCURRENCY", 8))
+DASHBOARD_DEADLINE = float(os.getenv("DASHBOARD_DEADLINE", 2.5))
+DASHBOARD_STRAGGLER_TIMEOUT = float(os.getenv("DASHBOARD_STRAGGLER_TIMEOUT", 20))
+
 
 class UserCommands(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.api = PteroAPI()
-        self.db = DB()
+        self.api = bot.api
+        self.db = bot.db
+
+    def _server_lines(self, server_ids):
+        # Names come from the reconciler's last walk; no panel call here.
+        names = self.bot.server_directory.names
+        lines = [f"`{s}` — {names[s]}" if s in names else f"`{s}`" for s in server_ids]
+        return "\n".join(lines)[:1024] or "None"
 
     @app_commands.command(name="create-account", description="Register a Pterodactyl account with your email and password")
-    async def create_account(self, interaction: Interaction, email: str, password: str):
-        await interaction.response.defer(thinking=True, ephemeral=True)
+    @app_commands.describe(panel="Which panel to create the account on, if there are several")
+    @app_commands.autocomplete(panel=panel_autocomplete)
+    async def create_account(self, interaction: Interaction, email: str, password: str, panel: Optional[str] = None):
+        if panel is not None and panel not in self.api.panels:
+            return await interaction.response.send_message(f"❌ Unknown panel `{panel}`.", ephemeral=True)
+        await defer(interaction, thinking=True, ephemeral=True)
 
         # Optional email domain check
         allowed_domains = os.getenv("ALLOWED_DOMAINS", "")
@@ -21,86 +51,146 @@ class UserCommands(commands.Cog):
             if not any(email.endswith("@" + d) for d in allowed):
                 return await interaction.followup.send("❌ That email domain is not allowed.")
 
-        user_exists = self.db.get_user(interaction.user.id)
+        user_exists = await self.db.get_user(interaction.user.id)
         if user_exists:
             return await interaction.followup.send("⚠️ You already have a linked account.")
 
-        created = await self.api.create_account(email, password, str(interaction.user))
+        created = await self.api.create_account(email, password, str(interaction.user), panel=panel)
+        audit(interaction, "account.create", detail=email, outcome="ok" if created else "failed")
         if created:
-            self.db.add_user(discord_id=interaction.user.id, panel_id=created["id"], email=email)
+            await self.db.add_user(discord_id=interaction.user.id, panel_id=created["id"], email=email,
+                                   panel=created["panel"])
             await interaction.followup.send("✅ Account created successfully and linked.")
         else:
             await interaction.followup.send("❌ Failed to create account. Try again later.")
 
     @app_commands.command(name="dashboard", description="View your linked account and servers")
     async def dashboard(self, interaction: Interaction):
-        await interaction.response.defer(ephemeral=True)
-        user = self.db.get_user(interaction.user.id)
+        await defer(interaction, ephemeral=True)
+        user = await self.db.get_user(interaction.user.id)
         if not user:
             return await interaction.followup.send("❌ You have not created an account yet.")
 
-        owned = self.db.get_owned_servers(interaction.user.id)
-        shared = self.db.get_shared_servers(interaction.user.id)
+        owned = await self.db.get_owned_servers(interaction.user.id)
+        shared = await self.db.get_shared_servers(interaction.user.id)
 
+        # Every server is fetched at once; whatever is back by the deadline
+        # is shown, and the message is edited when the rest arrive.
+        fanout = FanOut(owned[:DASHBOARD_MAX_SERVERS] + shared[:DASHBOARD_MAX_SERVERS], self.api.get_server_status,
+                        concurrency=DASHBOARD_CONCURRENCY)
+        try:
+            pending = await fanout.wait(DASHBOARD_DEADLINE)
+            message = await interaction.followup.send(
+                embed=self._dashboard_embed(user, owned, shared, fanout), wait=True)
+            if pending:
+                await fanout.wait(DASHBOARD_STRAGGLER_TIMEOUT)
+                await message.edit(embed=self._dashboard_embed(user, owned, shared, fanout, final=True))
+        finally:
+            fanout.cancel()
+
+    def _dashboard_embed(self, user, owned, shared, fanout, final=False):
         embed = discord.Embed(
             title="📊 Your Hosting Dashboard",
             color=discord.Color.green()
         )
         embed.add_field(name="📧 Email", value=user['email'], inline=True)
         embed.add_field(name="🆔 Panel User ID", value=str(user['panel_id']), inline=True)
-        embed.add_field(name="🧾 Owned Servers", value="\n".join(f"`{s}`" for s in owned) or "None", inline=False)
-        embed.add_field(name="🔁 Shared With You", value="\n".join(f"`{s}`" for s in shared) or "None", inline=False)
+        embed.add_field(name="🧾 Owned Servers", value=self._status_lines(owned, fanout, final), inline=False)
+        embed.add_field(name="🔁 Shared With You", value=self._status_lines(shared, fanout, final), inline=False)
+        if fanout.pending and not final:
+            embed.set_footer(text=f"⏳ Waiting on {len(fanout.pending)} server(s)...")
+        return embed
 
-        await interaction.followup.send(embed=embed)
+    def _status_lines(self, server_ids, fanout, final):
+        names = self.bot.server_directory.names
+        lines = []
+        for sid in server_ids[:DASHBOARD_MAX_SERVERS]:
+            label = f"`{sid}` — {names[sid]}" if sid in names else f"`{sid}`"
+            data = fanout.results.get(sid)
+            if sid not in fanout.results:
+                lines.append(f"{'❔' if final else '⏳'} {label} · {'timed out' if final else 'pending'}")
+            elif not data or isinstance(data, Exception):
+                lines.append(f"❔ {label} · unavailable")
+            else:
+                attrs = data["attributes"]
+                usage = attrs["resources"]
+                lines.append(f"{STATE_ICONS.get(attrs['current_state'], '❔')} {label} · "
+                             f"{usage['cpu_absolute']:.0f}% CPU · {usage['memory_bytes'] // 1024 // 1024} MB")
+        if len(server_ids) > DASHBOARD_MAX_SERVERS:
+            lines.append(f"... and {len(server_ids) - DASHBOARD_MAX_SERVERS} more, see `/list-servers`")
+        return "\n".join(lines)[:1024] or "None"
 
     @app_commands.command(name="share-access", description="Grant server access to another Discord user")
+    @app_commands.autocomplete(server_id=server_id_autocomplete)
     async def share_access(self, interaction: Interaction, user: discord.User, server_id: str):
-        await interaction.response.defer(ephemeral=True)
-        if not self.db.server_exists(server_id, interaction.user.id):
+        await defer(interaction, ephemeral=True)
+        if not self.db.authz.owns(interaction.user.id, server_id):
             return await interaction.followup.send("❌ You do not own that server.")
-        self.db.share_server(server_id, user.id)
+        await self.db.share_server(server_id, user.id)
+        audit(interaction, "access.share", server_id, user.id)
         await interaction.followup.send(f"✅ Shared server `{server_id}` with {user.mention}")
 
     @app_commands.command(name="unshare-access", description="Remove server access from a shared user")
+    @app_commands.autocomplete(server_id=server_id_autocomplete)
     async def unshare_access(self, interaction: Interaction, user: discord.User, server_id: str):
-        await interaction.response.defer(ephemeral=True)
-        if not self.db.server_exists(server_id, interaction.user.id):
+        await defer(interaction, ephemeral=True)
+        if not self.db.authz.owns(interaction.user.id, server_id):
             return await interaction.followup.send("❌ You do not own that server.")
-        self.db.unshare_server(server_id, user.id)
+        await self.db.unshare_server(server_id, user.id)
+        audit(interaction, "access.unshare", server_id, user.id)
         await interaction.followup.send(f"✅ Removed server access for {user.mention}")
 
     @app_commands.command(name="list-servers", description="List all servers you own or have access to")
     async def list_servers(self, interaction: Interaction):
-        await interaction.response.defer(ephemeral=True)
-        owned = self.db.get_owned_servers(interaction.user.id)
-        shared = self.db.get_shared_servers(interaction.user.id)
+        await defer(interaction, ephemeral=True)
+        owned = await self.db.get_owned_servers(interaction.user.id)
+        shared = await self.db.get_shared_servers(interaction.user.id)
 
         embed = discord.Embed(title="📦 Your Servers", color=discord.Color.blue())
-        embed.add_field(name="Owned", value="\n".join(f"`{s}`" for s in owned) or "None", inline=False)
-        embed.add_field(name="Shared", value="\n".join(f"`{s}`" for s in shared) or "None", inline=False)
+        embed.add_field(name="Owned", value=self._server_lines(owned), inline=False)
+        embed.add_field(name="Shared", value=self._server_lines(shared), inline=False)
         await interaction.followup.send(embed=embed)
 
     @app_commands.command(name="server-logs", description="Get the recent logs from your server")
-    async def server_logs(self, interaction: Interaction, server_id: str):
-        await interaction.response.defer()
-        content = await self.api.get_logs(server_id)
+    @app_commands.autocomplete(server_id=server_id_autocomplete)
+    async def server_logs(self, interaction: Interaction, server_id: str, lines: app_commands.Range[int, 1, 200] = 30):
+        await defer(interaction)
+        content = "\n".join(await self.bot.console.tail(server_id, lines))
         if content:
             await interaction.followup.send(f"🧾 Latest logs:\n```\n{content[-1500:]}\n```")
         else:
             await interaction.followup.send("❌ Could not fetch logs.")
 
+    @app_commands.command(name="live-tail", description="Mirror your server console into this channel")
+    @app_commands.autocomplete(server_id=server_id_autocomplete)
+    async def live_tail(self, interaction: Interaction, server_id: str, enabled: bool = True):
+        if enabled:
+            started = await self.bot.console.start_tail(server_id, interaction.channel, interaction.user.id)
+            msg = "📡 Live console tail started." if started else "⚠️ Already tailing that server here."
+        else:
+            stopped = await self.bot.console.stop_tail(server_id, interaction.channel.id)
+            msg = "⏹️ Live console tail stopped." if stopped else "⚠️ That server is not being tailed here."
+        await interaction.response.send_message(msg, ephemeral=True)
+
     @app_commands.command(name="change-name", description="Change the name of your server")
+    @app_commands.autocomplete(server_id=server_id_autocomplete)
     async def change_name(self, interaction: Interaction, server_id: str, new_name: str):
-        await interaction.response.defer()
+        await defer(interaction)
         success = await self.api.rename_server(server_id, new_name)
+        audit(interaction, "server.rename", server_id, detail=new_name, outcome="ok" if success else "failed")
         if success:
             await interaction.followup.send("✅ Server name updated.")
         else:
             await interaction.followup.send("❌ Failed to rename server.")
 
     @app_commands.command(name="server-resources", description="Check your server’s current usage")
-    async def server_resources(self, interaction: Interaction, server_id: str):
-        await interaction.response.defer()
+    @app_commands.describe(history="Show min/avg/max over a time window instead of the current usage")
+    @app_commands.autocomplete(server_id=server_id_autocomplete)
+    async def server_resources(self, interaction: Interaction, server_id: str,
+                               history: Optional[Literal["1h", "24h", "7d"]] = None):
+        await defer(interaction)
+        if history:
+            return await self._resource_history(interaction, server_id, history)
         data = await self.api.get_server_status(server_id)
         if not data:
             return await interaction.followup.send("❌ Could not fetch status.")
@@ -111,20 +201,102 @@ class UserCommands(commands.Cog):
         embed.add_field(name="CPU", value=f"{usage['cpu_absolute']}%", inline=True)
         await interaction.followup.send(embed=embed)
 
+    async def _resource_history(self, interaction: Interaction, server_id: str, window: str):
+        since = int(time.time()) - HISTORY_WINDOWS[window]
+        stats = await self.db.resource_history(server_id, since)
+        if not stats:
+            return await interaction.followup.send("❌ No samples recorded for that server yet.")
+        embed = discord.Embed(title=f"📈 Server Usage (last {window})", color=discord.Color.blurple())
+        mem, cpu, disk = stats["memory"], stats["cpu"], stats["disk"]
+        embed.add_field(name="RAM (min/avg/max)", value=f"{mem[0]} / {mem[1]:.0f} / {mem[2]} MB", inline=False)
+        embed.add_field(name="CPU (min/avg/max)",
+                        value=f"{cpu[0] / 100:.1f} / {cpu[1] / 100:.1f} / {cpu[2] / 100:.1f}%", inline=False)
+        embed.add_field(name="Disk (min/avg/max)", value=f"{disk[0]} / {disk[1]:.0f} / {disk[2]} MB", inline=False)
+        embed.add_field(name="Uptime", value=f"{stats['uptime']:.1%}", inline=True)
+        embed.add_field(name="Samples", value=str(stats["samples"]), inline=True)
+        await interaction.followup.send(embed=embed)
+
     @app_commands.command(name="download-backup", description="List and download server backups")
+    @app_commands.autocomplete(server_id=server_id_autocomplete)
     async def download_backup(self, interaction: Interaction, server_id: str):
-        await interaction.response.defer()
+        await defer(interaction, ephemeral=True)
         backups = await self.api.list_backups(server_id)
+        backups = sorted((b for b in backups or () if b["is_successful"]), key=lambda b: b["created_at"],
+                         reverse=True)[:10]
         if not backups:
             return await interaction.followup.send("❌ No backups found.")
-        message = "\n".join([f"🗂️ `{b['name']}` → {b['url']}" for b in backups])
-        await interaction.followup.send(f"**Backups:**\n{message}")
+        urls = await asyncio.gather(*(self.api.get_backup_download_url(server_id, b["uuid"]) for b in backups))
+        lines = []
+        for backup, url in zip(backups, urls):
+            size = f"{backup['bytes'] / (1 << 20):.1f} MB"
+            lines.append(f"🗂️ [{backup['name']}]({url}) — {size}" if url else f"🗂️ `{backup['name']}` — {size} (no link)")
+        await interaction.followup.send("**Backups** (links expire in about 15 minutes):\n" + "\n".join(lines))
+
+    @app_commands.command(name="create-backup", description="Start a backup of a server")
+    @app_commands.autocomplete(server_id=server_id_autocomplete)
+    async def create_backup(self, interaction: Interaction, server_id: str):
+        await defer(interaction)
+        job_id, created = await self.bot.jobs.submit("create-backup", {"server_id": server_id},
+                                                     key=f"create-backup:{server_id}", interaction=interaction)
+        audit(interaction, "backup.create", server_id, detail=f"job #{job_id}", outcome="queued")
+        await interaction.followup.send(queued_message(job_id, created))
 
     @app_commands.command(name="reset-server", description="Wipe all server files")
+    @app_commands.autocomplete(server_id=server_id_autocomplete)
     async def reset_server(self, interaction: Interaction, server_id: str):
-        await interaction.response.defer()
-        success = await self.api.wipe_server(server_id)
-        if success:
-            await interaction.followup.send("⚠️ Server has been wiped.")
-        else:
-            await interaction.followup.send("❌ Failed to wipe the server.")
+        await defer(interaction)
+        job_id, created = await self.bot.jobs.submit("wipe-server", {"server_id": server_id},
+                                                     key=f"wipe-server:{server_id}", interaction=interaction)
+        audit(interaction, "server.wipe", server_id, detail=f"job #{job_id}", outcome="queued")
+        await interaction.followup.send(queued_message(job_id, created))
+
+    @app_commands.command(name="schedule-add", description="Run a command or power action on a cron schedule")
+    @app_commands.describe(
+        cron="Five-field cron expression in UTC, e.g. `0 4 * * *` for 04:00 daily, or @hourly/@daily/@weekly",
+        command="For the command action: up to 10 console commands separated by ;",
+        jitter="Start up to this many seconds late, to spread out load",
+    )
+    @app_commands.autocomplete(server_id=server_id_autocomplete)
+    async def schedule_add(self, interaction: Interaction, server_id: str, cron: str,
+                           action: Literal["command", "start", "stop", "restart", "kill"],
+                           command: Optional[str] = None, jitter: Optional[app_commands.Range[int, 0, 3600]] = None):
+        commands_ = split_commands(command or "")
+        if action == "command" and not 1 <= len(commands_) <= MAX_BATCH:
+            return await interaction.response.send_message(
+                f"❌ The command action needs between 1 and {MAX_BATCH} commands.", ephemeral=True)
+        if (not is_admin(interaction.user.id)
+                and len(await self.db.get_schedules(owner_id=interaction.user.id)) >= MAX_SCHEDULES):
+            return await interaction.response.send_message(
+                f"❌ You already have {MAX_SCHEDULES} schedules. Remove one first.", ephemeral=True)
+        try:
+            schedule_id, = await self.bot.scheduler.add(interaction.user.id, [server_id], cron, action,
+                                                        commands_ or None, jitter)
+        except ValueError as e:
+            return await interaction.response.send_message(f"❌ Invalid schedule: {e}", ephemeral=True)
+        schedule = self.bot.scheduler.schedules[schedule_id]
+        audit(interaction, "schedule.add", server_id, detail=f"#{schedule_id} {cron} {action} {command or ''}")
+        await interaction.response.send_message(
+            f"⏰ Schedule #{schedule_id} created. First run <t:{int(schedule['next_run'])}:R>.", ephemeral=True)
+
+    @app_commands.command(name="schedules", description="List your scheduled commands and power actions")
+    async def schedules(self, interaction: Interaction):
+        await defer(interaction, ephemeral=True)
+        rows = await self.db.get_schedules(owner_id=interaction.user.id)
+        if not rows:
+            return await interaction.followup.send("📭 You have no schedules.")
+        lines = []
+        for row in rows:
+            what = " ; ".join(json.loads(row["payload"])) if row["action"] == "command" else row["action"]
+            last = f" · last: {row['last_result']}" if row["last_result"] else ""
+            lines.append(f"**#{row['id']}** `{row['server_id']}` `{row['cron']}` → `{what}` · "
+                         f"next <t:{int(row['next_run'])}:R>{last}")
+        await interaction.followup.send("\n".join(lines)[:2000])
+
+    @app_commands.command(name="schedule-remove", description="Delete one of your schedules")
+    async def schedule_remove(self, interaction: Interaction, schedule_id: int):
+        schedule = self.bot.scheduler.schedules.get(schedule_id)
+        if schedule is None or (schedule["owner_id"] != str(interaction.user.id) and not is_admin(interaction.user.id)):
+            return await interaction.response.send_message("❌ No such schedule.", ephemeral=True)
+        await self.bot.scheduler.remove(schedule_id)
+        audit(interaction, "schedule.remove", schedule["server_id"], detail=f"#{schedule_id}")
+        await interaction.response.send_message(f"🗑️ Schedule #{schedule_id} removed.", ephemeral=True)
@@ -1,35 +1,274 @@
 import discord
 from discord.ext import commands
 from dotenv import load_dotenv
+import hashlib
+import json
+import logging
 import os
 import asyncio
+import signal
+import sys
+import time
+
+STARTED = time.perf_counter()
+
+load_dotenv()
 
 from commands.core import Core
 from commands.user import UserCommands
 from commands.admin import AdminCommands
+from utils.authz import AuthorizedTree
+from utils.autocomplete import ServerDirectory
+from utils import metrics
+from utils.console import ConsoleManager
+from utils.backups import BackupManager
+from utils.breaker import STATE_VALUES
+from utils.coherence import Coherence
+from utils.database import DB
+from utils.events import EventLog
+from utils.jobs import JobQueue, register_panel_jobs
+from utils.leader import LeaderLease, process_id
+from utils.placement import PlacementEngine
+from utils.poller import ResourcePoller
+from utils.reconciler import Reconciler
+from utils.scheduler import Scheduler
+from utils.panels import PanelRouter
 
-load_dotenv()
 TOKEN = os.getenv("DISCORD_TOKEN")
+DEV_GUILD_ID = os.getenv("DEV_GUILD_ID")
+# BOT_PROCESSES > 1 makes this process a supervisor that runs that many
+# copies of itself, each given PROCESS_INDEX and a range of SHARD_IDS.
+PROCESSES = int(os.getenv("BOT_PROCESSES", 1))
+PROCESS_INDEX = os.getenv("PROCESS_INDEX")
+SHARD_IDS = os.getenv("SHARD_IDS")
+# Seconds between gateway identifies; Discord allows one per 5s per bot.
+IDENTIFY_SPACING = 5.5
+
+log = logging.getLogger("ptero")
 
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 
-bot = commands.Bot(command_prefix="!", intents=intents)
+
+class HostingBot(commands.AutoShardedBot if SHARD_IDS else commands.Bot):
+    async def setup_hook(self):
+        await setup()
+
+    async def close(self):
+        await shutdown()
+        await super().close()
+
+
+shard_options = {}
+if SHARD_IDS:
+    shard_options = {"shard_ids": [int(s) for s in SHARD_IDS.split(",")], "shard_count": int(os.getenv("SHARD_COUNT"))}
+bot = HostingBot(command_prefix="!", intents=intents, tree_cls=AuthorizedTree, **shard_options)
+bot.ready_once = False
 
 @bot.event
 async def on_ready():
-    await bot.tree.sync()
-    print(f"✅ Logged in as {bot.user} ({bot.user.id})")
+    # on_ready fires again after every gateway reconnect; only the first
+    # one marks startup.
+    if bot.ready_once:
+        log.info("Gateway session ready again (resumed after reconnect)")
+        return
+    bot.ready_once = True
+    log.info("✅ Logged in as %s (%s), ready in %.2fs", bot.user, bot.user.id, time.perf_counter() - STARTED)
+
+@bot.event
+async def on_app_command_completion(interaction, command):
+    metrics.command_finished(interaction, "ok")
+
+def register_gauges():
+    metrics.REGISTRY.register(metrics.Gauge(
+        "panel_ratelimit_queue_depth", "Requests waiting for a rate-limit token.",
+        lambda: {s["name"]: s["queue_depth"] for s in bot.api.limiter_stats()}))
+    metrics.REGISTRY.register(metrics.Gauge(
+        "panel_cache_entries", "Entries in the panel response cache.", lambda: bot.api.cache_stats()["size"]))
+    metrics.REGISTRY.register(metrics.Gauge(
+        "console_streams_open", "Open console websockets.", lambda: len(bot.console.streams)))
+    metrics.REGISTRY.register(metrics.Gauge(
+        "panel_breaker_state", "Circuit breaker state (0 closed, 1 half-open, 2 open).",
+        lambda: {s["name"]: STATE_VALUES[s["state"]] for s in bot.api.breaker_stats()}))
+    metrics.REGISTRY.register(metrics.Gauge(
+        "audit_events_pending", "Audit events waiting to be written.", lambda: len(bot.events.pending)))
+    metrics.REGISTRY.register(metrics.Gauge(
+        "bot_jobs", "Background jobs by state.", bot.db.job_counts))
+    metrics.REGISTRY.register(metrics.Gauge(
+        "bot_schedules", "Active recurring schedules.", lambda: len(bot.scheduler.schedules)))
+    metrics.REGISTRY.register(metrics.Gauge(
+        "bot_leader", "1 if this process runs the background services.", lambda: int(bot.leader.is_leader)))
+
+async def sync_commands():
+    # Syncing is a slow, tightly rate-limited global call, so only do it
+    # when the serialized command definitions actually changed.
+    guild = discord.Object(id=int(DEV_GUILD_ID)) if DEV_GUILD_ID else None
+    if guild is not None:
+        bot.tree.copy_global_to(guild=guild)
+    payload = [cmd.to_dict(bot.tree) for cmd in bot.tree.get_commands(guild=guild)]
+    digest = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+    key = f"command_tree_hash:{DEV_GUILD_ID or 'global'}"
+    if await bot.db.get_meta(key) == digest:
+        log.info("Command tree unchanged, skipping sync")
+        return
+    started = time.perf_counter()
+    await bot.tree.sync(guild=guild)
+    await bot.db.set_meta(key, digest)
+    log.info("Synced %d commands to %s in %.2fs", len(payload), DEV_GUILD_ID or "global scope",
+             time.perf_counter() - started)
+
+async def start_background():
+    await bot.jobs.start()
+    await bot.scheduler.start()
+    bot.backups.start()
+    bot.poller.start()
+    bot.reconciler.start()
+
+async def stop_background():
+    for service in (bot.jobs, bot.scheduler, bot.backups, bot.poller, bot.reconciler):
+        await service.stop()
+
+def subscribe_invalidations(coherence):
+    db, authz = bot.db, bot.db.authz
+
+    async def servers(keys):
+        if keys is None:
+            await authz.load(db)
+            bot.api.server_panels.clear()
+            bot.api.server_panels.update(await db.server_panels())
+            bot.server_directory.set_names(await db.server_names())
+            return
+        rows = await authz.reload_servers(db, keys)
+        for server_id in keys:
+            panel = rows[server_id]["panel"] if server_id in rows else None
+            if panel is None:
+                bot.api.server_panels.pop(server_id, None)
+            else:
+                bot.api.server_panels[server_id] = panel
+        bot.server_directory.update_names({sid: row["name"] for sid, row in rows.items() if row["name"]},
+                                          [sid for sid in keys if sid not in rows])
+
+    async def users(keys):
+        if keys is None:
+            await authz.load(db)
+        else:
+            await authz.reload_users(db, keys)
+
+    coherence.subscribe("server", servers)
+    coherence.subscribe("user", users)
+    coherence.subscribe("schedule", bot.scheduler.reload)
+    coherence.subscribe("job", lambda keys: bot.jobs.wake())
+    coherence.subscribe("cache", bot.api.apply_invalidations)
+    bot.api.share_invalidations(db)
 
 async def setup():
+    started = time.perf_counter()
+    bot.process_id = process_id()
+    bot.db = DB()
+    await bot.db.connect()
+    bot.events = EventLog(bot.db)
+    bot.events.start()
+    bot.api = PanelRouter.from_env()
+    await bot.api.start()
+    bot.api.server_panels.update(await bot.db.server_panels())
+    bot.console = ConsoleManager(bot.api.get_websocket_credentials, origin=bot.api.panel_url, authz=bot.db.authz)
+    # Node ids are per panel, so placement is too.
+    bot.placement = {bot.api.key(name): PlacementEngine(api, bot.db, panel=bot.api.key(name))
+                     for name, api in bot.api.panels.items()}
+    bot.backups = BackupManager(bot.db, bot.api)
+    bot.jobs = JobQueue(bot.db, bot, workers=int(os.getenv("JOB_WORKERS", 4)), events=bot.events)
+    register_panel_jobs(bot.jobs, bot.api, bot.db, bot.placement, bot.backups)
+    bot.scheduler = Scheduler(bot.db, bot.api, bot.console, events=bot.events)
+    await bot.scheduler.load()
+    bot.poller = ResourcePoller(bot.db, bot.api)
+    bot.server_directory = ServerDirectory(bot.db.authz)
+    bot.server_directory.set_names(await bot.db.server_names())
+    # The reconciler walks the server listing anyway, so it also feeds
+    # autocomplete names instead of the directory polling on its own.
+    bot.reconciler = Reconciler(bot.db, bot.api, directory=bot.server_directory)
+    if PROCESS_INDEX is not None:
+        # Other processes write to the same DB; pick up what they change.
+        bot.coherence = Coherence(bot.db, bot.process_id)
+        subscribe_invalidations(bot.coherence)
+        await bot.coherence.start()
+    # Every process serves commands and queues jobs, but only the lease
+    # holder polls, reconciles, runs schedules, backups and job workers.
+    bot.leader = LeaderLease(bot.db, bot.process_id, on_elected=start_background, on_deposed=stop_background)
+    await bot.leader.start()
+    register_gauges()
+    bot.metrics_runner = None
+    if os.getenv("METRICS_PORT"):
+        port = int(os.getenv("METRICS_PORT")) + int(PROCESS_INDEX or 0)
+        bot.metrics_runner = await metrics.start_server(port)
     await bot.add_cog(Core(bot))
     await bot.add_cog(UserCommands(bot))
     await bot.add_cog(AdminCommands(bot))
+    if PROCESS_INDEX in (None, "0"):
+        await sync_commands()
+    log.info("Setup finished in %.2fs", time.perf_counter() - started)
+
+async def shutdown():
+    # close() can run more than once, and after a setup that failed part
+    # way, so only stop what was actually started.
+    if getattr(bot, "metrics_runner", None) is not None:
+        await bot.metrics_runner.cleanup()
+        bot.metrics_runner = None
+    # The lease goes first: stepping down stops the background services
+    # and releasing it lets another process take them over immediately.
+    for name in ("leader", "jobs", "scheduler", "backups", "reconciler", "poller", "coherence", "events"):
+        if hasattr(bot, name):
+            await getattr(bot, name).stop()
+    for name in ("console", "api", "db"):
+        if hasattr(bot, name):
+            await getattr(bot, name).close()
 
 async def main():
-    await setup()
-    await bot.start(TOKEN)
+    discord.utils.setup_logging()
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, lambda: asyncio.ensure_future(bot.close()))
+    async with bot:
+        await bot.start(TOKEN)
+
+async def supervise():
+    """Run PROCESSES copies of this script, each on its own range of shards, restarting any that exit."""
+    discord.utils.setup_logging()
+    shard_count = int(os.getenv("SHARD_COUNT", PROCESSES))
+    if shard_count < PROCESSES:
+        raise RuntimeError("SHARD_COUNT must be at least BOT_PROCESSES")
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+    children = {}
+
+    async def run(index):
+        shards = range(index * shard_count // PROCESSES, (index + 1) * shard_count // PROCESSES)
+        env = dict(os.environ, PROCESS_INDEX=str(index), SHARD_IDS=",".join(map(str, shards)),
+                   SHARD_COUNT=str(shard_count))
+        # Identifies are rate limited per bot, not per process, so the
+        # processes come up one after another.
+        await asyncio.sleep(shards.start * IDENTIFY_SPACING)
+        while not stopping.is_set():
+            started = time.monotonic()
+            children[index] = await asyncio.create_subprocess_exec(sys.executable, os.path.abspath(__file__), env=env)
+            code = await children[index].wait()
+            if stopping.is_set():
+                return
+            log.warning("Process %d (shards %s) exited with %s; restarting", index, env["SHARD_IDS"], code)
+            # Back off if it keeps dying right after starting.
+            await asyncio.sleep(5 if time.monotonic() - started > 60 else 30)
+
+    tasks = [asyncio.ensure_future(run(i)) for i in range(PROCESSES)]
+    log.info("Running %d processes over %d shards", PROCESSES, shard_count)
+    await stopping.wait()
+    for child in children.values():
+        if child.returncode is None:
+            child.terminate()
+    await asyncio.gather(*(child.wait() for child in children.values()))
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(supervise() if PROCESSES > 1 and PROCESS_INDEX is None else main())
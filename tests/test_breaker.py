@@ -0,0 +1,104 @@
+import asyncio
+import time
+
+import pytest
+
+from bench.mock_panel import MockPanel
+from utils.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, PanelUnavailable
+from utils.ptero_api import PteroAPI
+
+
+def tripped(**kwargs):
+    breaker = CircuitBreaker("t", "Test", failures=2, reset_timeout=0.05, **kwargs)
+    breaker.record(False, 0.01)
+    breaker.record(False, 0.01)
+    return breaker
+
+
+def test_opens_after_consecutive_failures_only():
+    breaker = CircuitBreaker("t", "Test", failures=3)
+    for ok in (False, False, True, False, False):
+        breaker.check()
+        breaker.record(ok, 0.01)
+    assert breaker.state == CLOSED
+    breaker.record(False, 0.01)
+    assert breaker.state == OPEN
+    with pytest.raises(PanelUnavailable):
+        breaker.check()
+    assert breaker.rejected == 1
+
+
+def test_half_open_lets_exactly_one_probe_through():
+    breaker = tripped()
+    time.sleep(0.06)
+    assert breaker.check() is True
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(PanelUnavailable):
+        breaker.check()
+    breaker.record(True, 0.01)
+    assert breaker.state == CLOSED
+    assert breaker.check() is False
+
+
+def test_failed_or_slow_probe_opens_again():
+    for ok, duration in ((False, 0.01), (True, 1.0)):
+        breaker = tripped(slo=0.5)
+        time.sleep(0.06)
+        assert breaker.check() is True
+        breaker.record(ok, duration)
+        assert breaker.state == OPEN
+        assert breaker.opened_count == 2
+        with pytest.raises(PanelUnavailable):
+            breaker.check()
+
+
+def test_released_probe_frees_the_slot():
+    breaker = tripped()
+    time.sleep(0.06)
+    assert breaker.check() is True
+    breaker.release()
+    assert breaker.check() is True
+
+
+def test_slow_calls_open_the_breaker():
+    breaker = CircuitBreaker("t", "Test", slo=0.5, slo_ratio=0.5, window=4)
+    breaker.record(True, 1.0)
+    assert breaker.state == CLOSED
+    breaker.record(True, 1.0)
+    assert breaker.state == OPEN
+
+
+def test_dead_node_trips_only_its_own_breaker():
+    async def run():
+        panel = await MockPanel(servers=4, nodes=2, latency=0.005, jitter=0.0).start()
+        api = PteroAPI(panel.url, "client", "admin")
+        api.breakers.failures, api.breakers.reset_timeout = 2, 0.1
+        await api.start()
+        try:
+            async for _ in api.iter_servers():
+                pass
+            dead = next(sid for sid, s in panel.servers.items() if s["node"] == 1)
+            alive = next(sid for sid, s in panel.servers.items() if s["node"] == 2)
+            panel.node_faults[1] = None
+
+            assert not await api.send_power_action(dead, "start")
+            assert not await api.send_power_action(dead, "start")
+            with pytest.raises(PanelUnavailable):
+                await api.send_power_action(dead, "start")
+            assert panel.requests["/api/client/servers/{server}/power"] == 2
+            assert await api.send_power_action(alive, "start")
+
+            # Once the node is back, the first call after the timeout probes
+            # it while a concurrent one is still turned away.
+            del panel.node_faults[1]
+            await asyncio.sleep(0.15)
+            results = await asyncio.gather(api.send_power_action(dead, "start"),
+                                           api.send_power_action(dead, "start"), return_exceptions=True)
+            assert results[0] is True
+            assert isinstance(results[1], PanelUnavailable)
+            assert api.breakers.node(1).state == CLOSED
+            assert await api.send_power_action(dead, "start")
+        finally:
+            await api.close()
+            await panel.stop()
+    asyncio.run(run())
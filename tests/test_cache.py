@@ -0,0 +1,120 @@
+import asyncio
+
+from bench.mock_panel import MockPanel
+from utils.cache import TTLCache
+from utils.ptero_api import PteroAPI
+
+
+class Loader:
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.calls = 0
+        self.value = "v1"
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.value
+
+
+def test_concurrent_misses_share_one_load():
+    async def run():
+        cache, load = TTLCache(), Loader()
+        values = await asyncio.gather(*(cache.get_or_fetch(("server", "a"), load, 10) for _ in range(20)))
+        assert values == ["v1"] * 20
+        assert load.calls == 1
+        assert cache.stats()["misses"] == 20
+        assert await cache.get_or_fetch(("server", "a"), load, 10) == "v1"
+        assert load.calls == 1
+    asyncio.run(run())
+
+
+def test_stale_entry_is_served_while_one_refresh_runs():
+    async def run():
+        cache, load = TTLCache(), Loader()
+        await cache.get_or_fetch(("resources", "a"), load, 0.05, stale=10)
+        await asyncio.sleep(0.06)
+        load.value = "v2"
+        # Both stale reads get the old value straight away and share one refresh.
+        assert await cache.get_or_fetch(("resources", "a"), load, 0.05, stale=10) == "v1"
+        assert await cache.get_or_fetch(("resources", "a"), load, 0.05, stale=10) == "v1"
+        await asyncio.sleep(0.05)
+        assert load.calls == 2
+        assert cache.stats()["stale_hits"] == 2
+        assert await cache.get_or_fetch(("resources", "a"), load, 0.05, stale=10) == "v2"
+    asyncio.run(run())
+
+
+def test_failed_loads_are_not_cached():
+    async def run():
+        cache, load = TTLCache(), Loader()
+        load.value = None
+        assert await cache.get_or_fetch(("server", "a"), load, 10) is None
+        assert await cache.get_or_fetch(("server", "a"), load, 10) is None
+        assert load.calls == 2
+    asyncio.run(run())
+
+
+def test_invalidation_only_discards_loads_for_that_key():
+    async def run():
+        cache, a, b = TTLCache(), Loader(), Loader()
+        pending = [asyncio.ensure_future(cache.get_or_fetch(("server", k), loader, 10))
+                   for k, loader in (("a", a), ("b", b))]
+        await asyncio.sleep(0.005)
+        cache.invalidate_object("b")
+        await asyncio.gather(*pending)
+        await cache.get_or_fetch(("server", "a"), a, 10)
+        await cache.get_or_fetch(("server", "b"), b, 10)
+        assert (a.calls, b.calls) == (1, 2)
+    asyncio.run(run())
+
+
+def test_invalidations_are_reported_and_applied_without_echo():
+    async def run():
+        sent, received = [], TTLCache()
+        cache = TTLCache()
+        cache.on_invalidate = lambda what, value: sent.append((what, value))
+        received.on_invalidate = lambda what, value: sent.append(("echo", value))
+        for cache_ in (cache, received):
+            cache_.set(("server", "a"), 1, 10)
+            cache_.set(("node", 1), 1, 10)
+        cache.invalidate(("server", "a"))
+        cache.invalidate_kind("node")
+        assert sent == [("key", ("server", "a")), ("kind", "node")]
+        for what, value in list(sent):
+            received.apply(what, list(value) if isinstance(value, tuple) else value)
+        assert received.stats()["size"] == 0
+        assert len(sent) == 2
+    asyncio.run(run())
+
+
+def test_size_is_bounded_least_recently_used_first():
+    async def run():
+        cache, load = TTLCache(maxsize=3), Loader()
+        for key in "abc":
+            cache.set(("server", key), key, 10)
+        assert await cache.get_or_fetch(("server", "a"), load, 10) == "a"
+        cache.set(("server", "d"), "d", 10)
+        assert await cache.get_or_fetch(("server", "b"), load, 10) == "v1"
+        assert load.calls == 1
+    asyncio.run(run())
+
+
+def test_server_status_reads_hit_the_panel_once():
+    async def run():
+        panel = await MockPanel(servers=2, nodes=1, latency=0.02, jitter=0.0).start()
+        api = PteroAPI(panel.url, "client", "admin")
+        await api.start()
+        try:
+            server_id = next(iter(panel.servers))
+            results = await asyncio.gather(*(api.get_server_status(server_id) for _ in range(10)))
+            assert all(r is not None for r in results)
+            assert panel.requests["/api/client/servers/{server}/resources"] == 1
+            # A power action invalidates the cached resources.
+            await api.send_power_action(server_id, "restart")
+            await api.get_server_status(server_id)
+            assert panel.requests["/api/client/servers/{server}/resources"] == 2
+        finally:
+            await api.close()
+            await panel.stop()
+    asyncio.run(run())
@@ -0,0 +1,53 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from utils.scheduler import CronExpr
+
+
+def after(expr, when):
+    ts = datetime.fromisoformat(when).replace(tzinfo=timezone.utc).timestamp()
+    return datetime.fromtimestamp(CronExpr(expr).next_after(ts), timezone.utc).strftime("%Y-%m-%d %H:%M")
+
+
+def test_next_run_is_strictly_after():
+    assert after("*/15 * * * *", "2024-01-01 00:07") == "2024-01-01 00:15"
+    assert after("*/15 * * * *", "2024-01-01 00:15") == "2024-01-01 00:30"
+    assert after("*/15 * * * *", "2024-01-01 00:14:59") == "2024-01-01 00:15"
+    assert after("30 23 * * *", "2024-12-31 23:30") == "2025-01-01 23:30"
+
+
+def test_ranges_lists_and_steps():
+    assert after("0 9 * * 1-5", "2024-01-05 10:00") == "2024-01-08 09:00"
+    assert after("5,10 8-10/2 * * *", "2024-01-01 08:10") == "2024-01-01 10:05"
+    assert after("0 0 1 * *", "2024-12-15 00:00") == "2025-01-01 00:00"
+
+
+def test_restricted_day_fields_match_either():
+    # The 13th, or any Friday; 2024-01-05 and 2024-01-12 are Fridays.
+    assert after("0 0 13 * 5", "2024-01-01 00:00") == "2024-01-05 00:00"
+    assert after("0 0 13 * 5", "2024-01-12 00:00") == "2024-01-13 00:00"
+    assert after("0 0 13 * 5", "2024-01-13 00:00") == "2024-01-19 00:00"
+
+
+def test_a_wildcard_day_field_does_not_widen_the_other():
+    assert after("0 0 13 * *", "2024-01-01 00:00") == "2024-01-13 00:00"
+    assert after("0 0 * * 5", "2024-01-06 00:00") == "2024-01-12 00:00"
+
+
+def test_sunday_is_0_or_7():
+    assert after("0 0 * * 0", "2024-01-01 00:00") == "2024-01-07 00:00"
+    assert after("0 0 * * 7", "2024-01-01 00:00") == "2024-01-07 00:00"
+    assert after("@weekly", "2024-01-01 00:00") == "2024-01-07 00:00"
+
+
+def test_feb_29_waits_for_a_leap_year():
+    assert after("0 0 29 2 *", "2024-01-01 00:00") == "2024-02-29 00:00"
+    assert after("0 0 29 2 *", "2024-03-01 00:00") == "2028-02-29 00:00"
+
+
+@pytest.mark.parametrize("expr", ["0 0 30 2 *", "0 0 31 4 *", "60 * * * *", "* * *", "x * * * *", "*/0 * * * *",
+                                  "5-1 * * * *"])
+def test_invalid_or_impossible_expressions_are_rejected(expr):
+    with pytest.raises(ValueError):
+        CronExpr(expr)
@@ -0,0 +1,69 @@
+import asyncio
+import sqlite3
+
+from utils.database import DB
+from utils.migrations import MIGRATIONS, _v1_users
+
+
+def test_failing_write_rolls_back_only_itself(tmp_path):
+    async def run():
+        db = DB(str(tmp_path / "t.db"), commit_window=0.05)
+        await db.connect()
+        try:
+            def failing(conn):
+                conn.execute("INSERT INTO meta (key, value) VALUES ('b', '1')")
+                raise RuntimeError("boom")
+
+            # Queued together, so all four share one transaction.
+            results = await asyncio.gather(
+                db.set_meta("a", 1),
+                db.transaction(failing),
+                db.execute("INSERT INTO meta (key, value) VALUES ('a', '2')"),
+                db.set_meta("c", 3),
+                return_exceptions=True)
+            assert results[0] == results[3] is None
+            assert isinstance(results[1], RuntimeError)
+            assert isinstance(results[2], sqlite3.IntegrityError)
+            rows = await db.fetchall("SELECT key, value FROM meta WHERE key IN ('a', 'b', 'c') ORDER BY key")
+            assert [tuple(r) for r in rows] == [("a", "1"), ("c", "3")]
+        finally:
+            await db.close()
+    asyncio.run(run())
+
+
+def test_v2_moves_csv_columns_into_tables(tmp_path):
+    path = str(tmp_path / "users.db")
+    conn = sqlite3.connect(path)
+    _v1_users(conn)
+    conn.executemany("INSERT INTO users VALUES (?, ?, ?, ?, ?, ?)", [
+        ("1", 10, "a@x.io", "aaaa1111,bbbb2222", "cccc3333", 0),
+        ("2", 20, "b@x.io", "cccc3333,", "aaaa1111,bbbb2222", 1),
+        ("3", None, None, None, None, None),
+        ("4", 40, "d@x.io", "", "", 0),
+    ])
+    conn.execute("PRAGMA user_version = 1")
+    conn.commit()
+    conn.close()
+
+    async def run():
+        db = DB(path)
+        await db.connect()
+        try:
+            version = await db.fetchone("PRAGMA user_version")
+            assert version[0] == len(MIGRATIONS)
+            servers = await db.fetchall("SELECT identifier, owner_id FROM servers ORDER BY identifier")
+            assert [tuple(r) for r in servers] == [("aaaa1111", "1"), ("bbbb2222", "1"), ("cccc3333", "2")]
+            access = await db.fetchall("SELECT server_id, user_id FROM server_access ORDER BY server_id, user_id")
+            assert [tuple(r) for r in access] == [("aaaa1111", "2"), ("bbbb2222", "2"), ("cccc3333", "1")]
+            columns = {r["name"] for r in await db.fetchall("PRAGMA table_info(users)")}
+            assert not columns & {"servers", "shared"}
+            banned = await db.fetchall("SELECT discord_id, banned FROM users ORDER BY discord_id")
+            assert [tuple(r) for r in banned] == [("1", 0), ("2", 1), ("3", 0), ("4", 0)]
+
+            assert db.authz.owned["1"] == {"aaaa1111", "bbbb2222"}
+            assert db.authz.shared["2"] == {"aaaa1111", "bbbb2222"}
+            assert db.authz.is_banned(2) and not db.authz.is_banned(1)
+        finally:
+            await db.close()
+    asyncio.run(run())
+
@@ -0,0 +1,91 @@
+import asyncio
+
+from bench.mock_panel import MockPanel
+from utils.ptero_api import PteroAPI
+from utils.ratelimit import PRIORITY_ADMIN, PRIORITY_BACKGROUND, PRIORITY_DEFAULT, RateLimiter
+
+
+def test_budget_is_spent_without_waiting():
+    async def run():
+        limiter = RateLimiter("t", 5)
+        for _ in range(5):
+            await asyncio.wait_for(limiter.acquire(), 0.05)
+        assert limiter.tokens < 1
+    asyncio.run(run())
+
+
+def test_waiters_are_served_by_priority_then_arrival():
+    async def run():
+        # 20 tokens a second, all spent up front.
+        limiter = RateLimiter("t", 2, per=0.1)
+        await limiter.acquire()
+        await limiter.acquire()
+        order = []
+
+        async def waiter(name, priority):
+            await limiter.acquire(priority)
+            order.append(name)
+
+        tasks = []
+        for name, priority in [("bg1", PRIORITY_BACKGROUND), ("user1", PRIORITY_DEFAULT), ("bg2", PRIORITY_BACKGROUND),
+                               ("admin", PRIORITY_ADMIN), ("user2", PRIORITY_DEFAULT)]:
+            tasks.append(asyncio.ensure_future(waiter(name, priority)))
+            await asyncio.sleep(0)
+        await asyncio.wait_for(asyncio.gather(*tasks), 2)
+        assert order == ["admin", "user1", "user2", "bg1", "bg2"]
+        assert limiter.stats()["queue_depth"] == 0
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_does_not_take_a_token():
+    async def run():
+        limiter = RateLimiter("t", 1, per=0.2)
+        await limiter.acquire()
+        cancelled = asyncio.ensure_future(limiter.acquire(PRIORITY_ADMIN))
+        kept = asyncio.ensure_future(limiter.acquire(PRIORITY_BACKGROUND))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.wait_for(kept, 1)
+        assert cancelled.cancelled()
+    asyncio.run(run())
+
+
+def test_headers_lower_the_bucket_and_share_splits_it():
+    limiter = RateLimiter("t", 720, share=3)
+    assert limiter.capacity == 240
+    limiter.update({"X-RateLimit-Limit": "600", "X-RateLimit-Remaining": "4"})
+    assert limiter.capacity == 200
+    assert limiter.tokens <= 4
+
+
+def test_pause_blocks_until_retry_after():
+    async def run():
+        limiter = RateLimiter("t", 100)
+        limiter.pause(0.2)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await asyncio.wait_for(limiter.acquire(), 1)
+        assert loop.time() - started >= 0.15
+        assert limiter.throttled == 1
+    asyncio.run(run())
+
+
+def test_panel_headers_correct_the_client_budget():
+    async def run():
+        panel = await MockPanel(servers=3, nodes=1, latency=0.0, jitter=0.0, rate_limit=30).start()
+        api = PteroAPI(panel.url, "client", "admin", client_ratelimit=1000)
+        await api.start()
+        try:
+            server_id = next(iter(panel.servers))
+            # Configured for far more than the panel allows; the responses'
+            # X-RateLimit-Remaining pulls the bucket down to what is left.
+            results = await asyncio.gather(*(api.send_power_action(server_id, "start") for _ in range(25)))
+            assert all(results)
+            limiter = api.limiters["client"]
+            assert limiter.acquired == 25
+            assert limiter.capacity == 30
+            assert limiter.tokens <= 5 + 1
+        finally:
+            await api.close()
+            await panel.stop()
+    asyncio.run(run())
@@ -0,0 +1,144 @@
+import os
+from collections import defaultdict
+
+import discord
+from discord import app_commands
+
+from utils import metrics
+from utils.breaker import PanelUnavailable
+
+ADMIN_IDS = os.getenv("ADMIN_IDS", "").split(",")
+
+
+def is_admin(user_id: int) -> bool:
+    return str(user_id) in ADMIN_IDS
+
+
+class AuthIndex:
+    """In-memory copy of server ownership, shares and bans.
+
+    Loaded once from the DB at startup and kept current by the DB's write
+    methods, so permission checks are dictionary lookups. Writes made by
+    other processes arrive through ``reload_servers`` / ``reload_users``.
+    """
+
+    def __init__(self):
+        self.owners = {}
+        self.owned = defaultdict(set)
+        self.grantees = defaultdict(set)
+        self.shared = defaultdict(set)
+        self.banned = set()
+
+    async def load(self, db):
+        servers = await db.fetchall("SELECT identifier, owner_id FROM servers")
+        access = await db.fetchall("SELECT server_id, user_id FROM server_access")
+        banned = await db.fetchall("SELECT discord_id FROM users WHERE banned = 1")
+        fresh = AuthIndex()
+        for row in servers:
+            fresh.add_server(row["identifier"], row["owner_id"])
+        for row in access:
+            fresh.share(row["server_id"], row["user_id"])
+        fresh.banned = {row["discord_id"] for row in banned}
+        self.__dict__.update(fresh.__dict__)
+
+    async def reload_servers(self, db, server_ids):
+        """Re-read ownership and shares of ``server_ids`` after another process changed them."""
+        rows = {row["identifier"]: row for row in await db.servers_by_id(server_ids)}
+        access = await db.access_by_server(list(rows))
+        for server_id in server_ids:
+            self.remove_server(server_id)
+            if server_id in rows:
+                self.add_server(server_id, rows[server_id]["owner_id"])
+        for row in access:
+            self.share(row["server_id"], row["user_id"])
+        return rows
+
+    async def reload_users(self, db, user_ids):
+        for user_id in user_ids:
+            row = await db.get_user(user_id)
+            self.set_banned(user_id, row is not None and row["banned"])
+
+    def add_server(self, server_id, owner_id):
+        owner_id = str(owner_id)
+        previous = self.owners.get(server_id)
+        if previous is not None:
+            self.owned[previous].discard(server_id)
+        self.owners[server_id] = owner_id
+        self.owned[owner_id].add(server_id)
+
+    def remove_server(self, server_id):
+        owner_id = self.owners.pop(server_id, None)
+        if owner_id is not None:
+            self.owned[owner_id].discard(server_id)
+        for user_id in self.grantees.pop(server_id, ()):
+            self.shared[user_id].discard(server_id)
+
+    def share(self, server_id, user_id):
+        self.grantees[server_id].add(str(user_id))
+        self.shared[str(user_id)].add(server_id)
+
+    def unshare(self, server_id, user_id):
+        self.grantees[server_id].discard(str(user_id))
+        self.shared[str(user_id)].discard(server_id)
+
+    def set_banned(self, user_id, banned):
+        if banned:
+            self.banned.add(str(user_id))
+        else:
+            self.banned.discard(str(user_id))
+
+    def is_banned(self, user_id):
+        return str(user_id) in self.banned
+
+    def owns(self, user_id, server_id):
+        return self.owners.get(server_id) == str(user_id)
+
+    def can_access(self, user_id, server_id):
+        return self.owns(user_id, server_id) or str(user_id) in self.grantees.get(server_id, ())
+
+
+class AuthorizedTree(app_commands.CommandTree):
+    """Command tree that rejects banned users and enforces server access.
+
+    Any command with a ``server_id`` parameter requires the caller to own
+    the server or have it shared with them. Admins bypass the check, and
+    cogs with ``authz_exempt = True`` do their own authorization.
+    """
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        authz = interaction.client.db.authz
+        banned = authz.is_banned(interaction.user.id) and not is_admin(interaction.user.id)
+        if interaction.type is discord.InteractionType.autocomplete:
+            # Autocomplete can't carry a message; a banned user just gets
+            # no suggestions.
+            return not banned
+        if interaction.type is not discord.InteractionType.application_command:
+            return True
+        metrics.command_started(interaction)
+        if is_admin(interaction.user.id):
+            return True
+        if banned:
+            await interaction.response.send_message("🚫 You are banned from using this bot.", ephemeral=True)
+            metrics.command_finished(interaction, "denied")
+            return False
+        command = interaction.command
+        if command is None or getattr(command.binding, "authz_exempt", False):
+            return True
+        server_id = interaction.namespace.server_id
+        if server_id is not None and not authz.can_access(interaction.user.id, server_id):
+            await interaction.response.send_message("❌ You do not have access to that server.", ephemeral=True)
+            metrics.command_finished(interaction, "denied")
+            return False
+        return True
+
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        original = getattr(error, "original", error)
+        if isinstance(original, PanelUnavailable):
+            metrics.command_finished(interaction, "unavailable")
+            if interaction.response.is_done():
+                await interaction.followup.send(str(original), ephemeral=True)
+            else:
+                await interaction.response.send_message(str(original), ephemeral=True)
+            return
+        metrics.command_finished(interaction, "error")
+        await super().on_error(interaction, error)
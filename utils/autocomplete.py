@@ -0,0 +1,85 @@
+import bisect
+
+from discord import app_commands
+
+from utils.authz import is_admin
+
+MAX_CHOICES = 25
+
+
+class ServerDirectory:
+    """Answers server_id autocomplete from memory.
+
+    Regular users are matched against the servers they own or have shared
+    (taken from the authorization index). Admins are matched against a
+    global index that is rebuilt from the application servers listing,
+    which also supplies the display names; whatever walks the listing
+    calls ``set_names``.
+    """
+
+    def __init__(self, authz):
+        self.authz = authz
+        self.names = {}
+        self._ids = []
+        self._by_name = []
+
+    def set_names(self, names):
+        self.names = names
+        self._ids = sorted(names)
+        self._by_name = sorted((name.lower(), sid) for sid, name in names.items())
+
+    def update_names(self, changed, removed=()):
+        names = {**self.names, **changed}
+        for server_id in removed:
+            names.pop(server_id, None)
+        self.set_names(names)
+
+    def _label(self, server_id):
+        name = self.names.get(server_id)
+        return f"{name} ({server_id})"[:100] if name else server_id
+
+    def _match_user(self, user_id, current):
+        candidates = self.authz.owned.get(str(user_id), set()) | self.authz.shared.get(str(user_id), set())
+        prefix, substring = [], []
+        for server_id in sorted(candidates):
+            name = self.names.get(server_id, "").lower()
+            if server_id.startswith(current) or name.startswith(current):
+                prefix.append(server_id)
+            elif current in server_id or current in name:
+                substring.append(server_id)
+        return prefix + substring
+
+    def _match_global(self, current):
+        i = bisect.bisect_left(self._ids, current)
+        found = dict.fromkeys(sid for sid in self._ids[i:i + MAX_CHOICES] if sid.startswith(current))
+        i = bisect.bisect_left(self._by_name, (current,))
+        while len(found) < MAX_CHOICES and i < len(self._by_name) and self._by_name[i][0].startswith(current):
+            found.setdefault(self._by_name[i][1])
+            i += 1
+        if len(found) < MAX_CHOICES and current:
+            for name, sid in self._by_name:
+                if current in name or current in sid:
+                    found.setdefault(sid)
+                    if len(found) >= MAX_CHOICES:
+                        break
+        return list(found)
+
+    def choices(self, user_id, current, admin=False):
+        current = current.strip().lower()
+        if admin and self._ids:
+            matches = self._match_global(current)
+        else:
+            matches = self._match_user(user_id, current)
+        return [app_commands.Choice(name=self._label(sid), value=sid) for sid in matches[:MAX_CHOICES]]
+
+
+async def server_id_autocomplete(interaction, current: str):
+    directory = interaction.client.server_directory
+    if directory.authz.is_banned(interaction.user.id) and not is_admin(interaction.user.id):
+        return []
+    return directory.choices(interaction.user.id, current, admin=is_admin(interaction.user.id))
+
+
+async def panel_autocomplete(interaction, current: str):
+    names = interaction.client.api.panels
+    return [app_commands.Choice(name=n, value=n) for n in names if current.lower() in n.lower()][:MAX_CHOICES]
@@ -0,0 +1,199 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+
+import aiohttp
+
+from utils.bulk import run_bulk
+from utils.ratelimit import PRIORITY_BACKGROUND
+
+log = logging.getLogger("ptero.backups")
+
+CHUNK_SIZE = 1 << 20
+# Archives can be large; only bound how long the stream may sit idle.
+DOWNLOAD_TIMEOUT = aiohttp.ClientTimeout(total=None, connect=10, sock_read=60)
+
+
+class DownloadError(Exception):
+    pass
+
+
+def _checksum(backup):
+    # The panel reports checksums as "<algorithm>:<hex digest>", e.g. "sha1:...".
+    value = backup.get("checksum")
+    if not value or ":" not in value:
+        return None, None
+    algorithm, digest = value.split(":", 1)
+    return algorithm, digest.lower()
+
+
+def _hash_file(hasher, path):
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher
+
+
+class BackupManager:
+    """Creates, rotates and downloads backups.
+
+    Downloads stream to ``<name>.part`` in fixed-size chunks and resume
+    from the partial file with a Range request, asking the panel for a
+    fresh signed URL on each attempt since those expire quickly. The
+    scheduled run backs up every registered server through ``run_bulk``
+    at most ``concurrency`` at a time, deleting the oldest unlocked
+    backups first so the server stays within ``feature_limits.backups``.
+    Backups a user asks for never rotate; at the limit they just fail.
+    """
+
+    def __init__(self, db, api, archive_dir=None, interval=None, concurrency=4, downloads=2,
+                 completion_timeout=1800):
+        self.db = db
+        self.api = api
+        self.archive_dir = archive_dir or os.getenv("BACKUP_ARCHIVE_DIR")
+        self.interval = interval if interval is not None else int(os.getenv("BACKUP_INTERVAL_HOURS", 0)) * 3600
+        self.concurrency = concurrency
+        self.completion_timeout = completion_timeout
+        self.last_run = None
+        self._downloads = asyncio.Semaphore(downloads)
+        self._task = None
+
+    # --- backups -------------------------------------------------------
+
+    async def _usage(self, server_id, priority):
+        info = await self.api.get_server_info(server_id, priority=priority)
+        backups = await self.api.list_backups(server_id, priority=priority)
+        if info is None or backups is None:
+            raise RuntimeError("could not read the server's backups")
+        return info["attributes"]["feature_limits"]["backups"], backups
+
+    async def at_limit(self, server_id, priority=PRIORITY_BACKGROUND):
+        """The server's backup limit if every slot is taken, else None."""
+        limit, backups = await self._usage(server_id, priority)
+        return limit if len(backups) >= limit else None
+
+    async def rotate(self, server_id, keep_free=1, priority=PRIORITY_BACKGROUND):
+        """Delete the oldest unlocked backups until ``keep_free`` slots are open; returns how many went."""
+        limit, backups = await self._usage(server_id, priority)
+        deletable = sorted((b for b in backups if not b["is_locked"] and b["completed_at"]),
+                           key=lambda b: b["created_at"])
+        excess = len(backups) + keep_free - limit
+        deleted = 0
+        for backup in deletable[:max(excess, 0)]:
+            if await self.api.delete_backup(server_id, backup["uuid"], priority=priority):
+                deleted += 1
+        return deleted
+
+    async def backup_server(self, server_id, wait=False, archive=False, rotate=False, priority=PRIORITY_BACKGROUND):
+        if rotate:
+            await self.rotate(server_id, priority=priority)
+        created = await self.api.create_backup(server_id, priority=priority)
+        if created is None:
+            return None
+        backup = created["attributes"]
+        if wait or archive:
+            backup = await self.wait_until_complete(server_id, backup["uuid"], priority=priority)
+        if archive and self.archive_dir:
+            await self.download(server_id, backup, self.archive_dir)
+        return backup
+
+    async def wait_until_complete(self, server_id, backup_id, poll=5, priority=PRIORITY_BACKGROUND):
+        deadline = time.monotonic() + self.completion_timeout
+        while time.monotonic() < deadline:
+            backups = await self.api.list_backups(server_id, priority=priority) or []
+            backup = next((b for b in backups if b["uuid"] == backup_id), None)
+            if backup is not None and backup["completed_at"]:
+                if not backup["is_successful"]:
+                    raise RuntimeError(f"backup {backup_id} failed on the node")
+                return backup
+            await asyncio.sleep(poll)
+        raise asyncio.TimeoutError(f"backup {backup_id} did not finish in time")
+
+    # --- downloads -----------------------------------------------------
+
+    async def download(self, server_id, backup, directory, attempts=5):
+        """Stream ``backup`` into ``directory`` and return the final path."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{server_id}-{backup['uuid']}.tar.gz")
+        if os.path.exists(path):
+            return path
+        partial = path + ".part"
+        algorithm, expected = _checksum(backup)
+        async with self._downloads:
+            for attempt in range(attempts):
+                try:
+                    await self._fetch(server_id, backup, partial)
+                    break
+                except (aiohttp.ClientError, asyncio.TimeoutError, DownloadError) as e:
+                    if attempt == attempts - 1:
+                        raise
+                    log.warning("Backup download %s interrupted (%s), resuming", backup["uuid"], e)
+                    await asyncio.sleep(2 ** attempt)
+            if expected is not None:
+                digest = (await asyncio.to_thread(_hash_file, hashlib.new(algorithm), partial)).hexdigest()
+                if digest != expected:
+                    os.remove(partial)
+                    raise DownloadError(f"checksum mismatch for backup {backup['uuid']}")
+            os.replace(partial, path)
+        return path
+
+    async def _fetch(self, server_id, backup, partial):
+        url = await self.api.get_backup_download_url(server_id, backup["uuid"])
+        if url is None:
+            raise DownloadError("the panel did not return a download URL")
+        offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+        size = backup.get("bytes") or 0
+        if size and offset >= size:
+            return
+        headers = {"Accept": "*/*"}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+        async with self.api.session.get(url, headers=headers, timeout=DOWNLOAD_TIMEOUT) as r:
+            if r.status == 200:
+                # The server ignored the Range header; start over.
+                offset = 0
+            elif r.status != 206 or not offset:
+                raise DownloadError(f"unexpected status {r.status}")
+            with open(partial, "ab" if offset else "wb") as f:
+                async for chunk in r.content.iter_chunked(CHUNK_SIZE):
+                    await asyncio.to_thread(f.write, chunk)
+        if size and os.path.getsize(partial) != size:
+            raise DownloadError(f"got {os.path.getsize(partial)} of {size} bytes")
+
+    # --- schedule ------------------------------------------------------
+
+    async def run_scheduled(self, server_ids=None, on_progress=None):
+        server_ids = server_ids if server_ids is not None else await self.db.get_all_server_ids()
+        archive = bool(self.archive_dir)
+        results = await run_bulk(server_ids, lambda sid: self.backup_server(sid, archive=archive, rotate=True),
+                                 concurrency=self.concurrency, on_progress=on_progress)
+        self.last_run = (time.time(), len(results), sum(1 for r in results if r.ok))
+        await self.db.set_meta("backups_last_run", int(self.last_run[0]))
+        return results
+
+    def start(self):
+        if self.interval and (self._task is None or self._task.done()):
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        # The last run is kept in meta so a restart doesn't trigger an
+        # extra round of backups.
+        while True:
+            last = float(await self.db.get_meta("backups_last_run", 0))
+            await asyncio.sleep(max(last + self.interval - time.time(), 0))
+            started = time.monotonic()
+            results = await self.run_scheduled()
+            failed = [r for r in results if not r.ok]
+            log.info("Scheduled backups: %d servers, %d failed, %.0fs", len(results), len(failed),
+                     time.monotonic() - started)
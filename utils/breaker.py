@@ -0,0 +1,125 @@
+import os
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class PanelUnavailable(Exception):
+    """Raised instead of calling an endpoint class whose breaker is open."""
+
+    def __init__(self, breaker):
+        self.breaker = breaker
+        retry = max(round(breaker.opened_at + breaker.reset_timeout - time.monotonic()), 1)
+        super().__init__(f"⚠️ {breaker.label} is not responding right now. Try again in about {retry}s.")
+
+
+class CircuitBreaker:
+    """Fails fast once an endpoint class looks unhealthy.
+
+    Opens after ``failures`` consecutive failed calls, or when at least
+    ``slo_ratio`` of the last ``window`` calls took longer than ``slo``
+    seconds. After ``reset_timeout`` one probe is let through (half-open);
+    its outcome closes the breaker or opens it again.
+    """
+
+    def __init__(self, name, label, failures=5, slo=None, slo_ratio=0.5, window=20, reset_timeout=30.0):
+        self.name = name
+        self.label = label
+        self.failure_threshold = failures
+        self.slo = slo
+        self.slo_ratio = slo_ratio
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opened_count = 0
+        self.rejected = 0
+        self.probing = False
+        self._recent = deque(maxlen=window)
+
+    def check(self):
+        """Raise PanelUnavailable if the call may not go out; returns True if it is the half-open probe."""
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+        if self.state == CLOSED:
+            return False
+        if self.state == HALF_OPEN and not self.probing:
+            self.probing = True
+            return True
+        self.rejected += 1
+        raise PanelUnavailable(self)
+
+    def release(self):
+        # A probe that was cancelled before it finished proves nothing.
+        self.probing = False
+
+    def record(self, ok, duration):
+        self.probing = False
+        slow = self.slo is not None and duration > self.slo
+        self._recent.append(slow)
+        if not ok:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                return self._open()
+            return
+        self.failures = 0
+        if self.state == HALF_OPEN:
+            if slow:
+                return self._open()
+            self.state = CLOSED
+            self._recent.clear()
+            return
+        if len(self._recent) >= self._recent.maxlen // 2 and sum(self._recent) >= self.slo_ratio * len(self._recent):
+            self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.opened_count += 1
+        self._recent.clear()
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "state": self.state,
+            "failures": self.failures,
+            "slow": sum(self._recent),
+            "recent": len(self._recent),
+            "opened": self.opened_count,
+            "rejected": self.rejected,
+            "retry_in": max(self.opened_at + self.reset_timeout - time.monotonic(), 0) if self.state == OPEN else 0,
+        }
+
+
+class BreakerSet:
+    """The breakers one panel's PteroAPI routes through: one per API key and one per node."""
+
+    def __init__(self, panel=None):
+        self.panel = panel
+        self.slo = float(os.getenv("PANEL_LATENCY_SLO", 5.0))
+        self.failures = int(os.getenv("BREAKER_FAILURES", 5))
+        self.reset_timeout = float(os.getenv("BREAKER_RESET_TIMEOUT", 30))
+        label = f"Panel `{panel}`" if panel else "The panel"
+        self.breakers = {
+            "client": self._make("client", label),
+            "application": self._make("application", f"{label}'s admin API"),
+        }
+
+    def _make(self, name, label):
+        return CircuitBreaker(name, label, failures=self.failures, slo=self.slo, reset_timeout=self.reset_timeout)
+
+    def node(self, node_id):
+        name = f"node:{node_id}"
+        breaker = self.breakers.get(name)
+        if breaker is None:
+            label = f"Node {node_id} on `{self.panel}`" if self.panel else f"Node {node_id}"
+            breaker = self.breakers[name] = self._make(name, label)
+        return breaker
+
+    def stats(self):
+        return [b.stats() for b in self.breakers.values()]
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import time
+from collections import namedtuple
+
+log = logging.getLogger("ptero.bulk")
+
+BulkResult = namedtuple("BulkResult", "server_id ok error")
+
+
+async def run_bulk(server_ids, operation, concurrency=8, on_progress=None):
+    """Run ``operation(server_id)`` over every server with a fixed worker pool.
+
+    ``operation`` returns truthy on success; exceptions are recorded as
+    failures rather than aborting the batch. ``on_progress(results, total)``
+    is awaited after each server finishes; if it raises, the error is
+    logged and the batch carries on.
+    """
+    queue = asyncio.Queue()
+    for server_id in server_ids:
+        queue.put_nowait(server_id)
+    results = []
+
+    async def worker():
+        while True:
+            try:
+                server_id = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                ok = bool(await operation(server_id))
+                results.append(BulkResult(server_id, ok, None if ok else "panel rejected the request"))
+            except Exception as e:
+                results.append(BulkResult(server_id, False, str(e) or type(e).__name__))
+            if on_progress is not None:
+                try:
+                    await on_progress(results, len(server_ids))
+                except Exception:
+                    log.exception("Bulk progress callback failed")
+
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, len(server_ids)) or 1)))
+    return results
+
+
+class ProgressReporter:
+    """Edits one message with bulk progress, at most once per ``interval`` seconds."""
+
+    def __init__(self, message, title, interval=2.0):
+        self.message = message
+        self.title = title
+        self.interval = interval
+        self._last = 0.0
+        self._lock = asyncio.Lock()
+
+    def render(self, results, total):
+        failed = sum(1 for r in results if not r.ok)
+        return f"{self.title}\n⏳ {len(results)}/{total} done — ✅ {len(results) - failed} ❌ {failed}"
+
+    async def __call__(self, results, total):
+        if len(results) < total and time.monotonic() - self._last < self.interval:
+            return
+        if self._lock.locked():
+            return
+        async with self._lock:
+            self._last = time.monotonic()
+            await self.message.edit(content=self.render(results, total))
+
+
+class FanOut:
+    """Starts ``fetch(key)`` for every key at once, at most ``concurrency`` in flight.
+
+    Callers wait with a deadline, render what has arrived, and wait again
+    for the stragglers. ``results`` maps key to the value or the exception
+    raised; keys still running are listed by ``pending``.
+    """
+
+    def __init__(self, keys, fetch, concurrency=8):
+        self.results = {}
+        self._fetch = fetch
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks = {key: asyncio.ensure_future(self._one(key)) for key in dict.fromkeys(keys)}
+
+    async def _one(self, key):
+        async with self._semaphore:
+            try:
+                self.results[key] = await self._fetch(key)
+            except Exception as e:
+                self.results[key] = e
+
+    @property
+    def pending(self):
+        return [key for key, task in self._tasks.items() if not task.done()]
+
+    async def wait(self, timeout=None):
+        """Wait up to ``timeout`` seconds; returns the keys still pending."""
+        running = [task for task in self._tasks.values() if not task.done()]
+        if running:
+            await asyncio.wait(running, timeout=timeout)
+        return self.pending
+
+    def cancel(self):
+        for task in self._tasks.values():
+            task.cancel()
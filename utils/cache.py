@@ -0,0 +1,119 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Bounded LRU cache with per-entry TTLs and single-flight loading.
+
+    Keys are tuples whose first element names the endpoint and whose second
+    names the object, e.g. ``("resources", "a1b2c3d4")``. An entry is fresh
+    until ``ttl`` expires; after that it may still be served for ``stale``
+    more seconds while one background request refreshes it. Concurrent
+    misses for the same key share one in-flight request.
+    """
+
+    def __init__(self, maxsize=2048):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        # Called with ("key" | "object" | "kind", value) on every
+        # invalidation, so it can be passed to other processes.
+        self.on_invalidate = None
+
+    async def get_or_fetch(self, key, fetch, ttl, stale=0.0):
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, fresh_until, stale_until = entry
+            if now < fresh_until:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            if now < stale_until:
+                self.stale_hits += 1
+                self._load(key, fetch, ttl, stale)
+                return value
+        self.misses += 1
+        # Shielded so one caller cancelling does not cancel the shared request.
+        return await asyncio.shield(self._load(key, fetch, ttl, stale))
+
+    def _load(self, key, fetch, ttl, stale):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(key, fetch, ttl, stale))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        return task
+
+    def _done(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()
+
+    async def _fetch(self, key, fetch, ttl, stale):
+        value = await fetch()
+        # Failed lookups are not cached, and neither is a result fetched
+        # before its key was invalidated: that drops it from _inflight.
+        if value is not None and self._inflight.get(key) is asyncio.current_task():
+            self.set(key, value, ttl, stale)
+        return value
+
+    def set(self, key, value, ttl, stale=0.0):
+        now = time.monotonic()
+        self._entries[key] = (value, now + ttl, now + ttl + stale)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _drop(self, keys):
+        for key in keys:
+            self._entries.pop(key, None)
+            self._inflight.pop(key, None)
+
+    def _matching(self, part, value):
+        # In-flight loads count too, so they aren't cached when they finish.
+        return [k for k in (*self._entries, *self._inflight) if k[part] == value]
+
+    def _notify(self, what, value):
+        if self.on_invalidate is not None:
+            self.on_invalidate(what, value)
+
+    def invalidate(self, *keys):
+        self._drop(keys)
+        for key in keys:
+            self._notify("key", key)
+
+    def invalidate_object(self, obj):
+        self._drop(self._matching(1, obj))
+        self._notify("object", obj)
+
+    def invalidate_kind(self, kind):
+        self._drop(self._matching(0, kind))
+        self._notify("kind", kind)
+
+    def apply(self, what, value):
+        """Drop what another process's cache invalidated, without passing it on again."""
+        if what == "key":
+            self._drop([tuple(value)])
+        elif what == "object":
+            self._drop(self._matching(1, value))
+        elif what == "kind":
+            self._drop(self._matching(0, value))
+
+    def clear(self):
+        self._entries.clear()
+        self._inflight.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+        }
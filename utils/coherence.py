@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from collections import defaultdict
+
+log = logging.getLogger("ptero.coherence")
+
+PRUNE_EVERY = 60
+
+
+class Coherence:
+    """Keeps this process's in-memory state in step with other processes' writes.
+
+    Writes whose results are held in memory (authorization, schedules,
+    server panels and names, panel responses) add rows to the
+    invalidations table in the same transaction, tagged with the writing
+    process. Each process watches ``PRAGMA data_version`` on a connection
+    of its own, which changes whenever another connection commits, and
+    only then reads the rows it has not seen and passes their keys to the
+    handlers subscribed to each scope. A None key means "everything", which
+    every handler also gets when this process could not poll for so long
+    that rows may have been pruned before it saw them.
+    """
+
+    def __init__(self, db, origin, interval=0.25, retention=600):
+        self.db = db
+        self.origin = origin
+        self.interval = interval
+        self.retention = retention
+        self.handlers = defaultdict(list)
+        self.last_id = 0
+        self.applied = 0
+        self._conn = None
+        self._version = None
+        self._last_poll = 0.0
+        self._last_prune = 0.0
+        self._task = None
+        db.origin = origin
+
+    def subscribe(self, scope, handler):
+        """``handler(keys)`` gets a set of string keys, or None to reload everything; it may be async."""
+        self.handlers[scope].append(handler)
+
+    async def start(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db.path, check_same_thread=False)
+            self._conn.execute("PRAGMA query_only=ON")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self.last_id = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM invalidations").fetchone()[0]
+        self._last_poll = time.monotonic()
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _poll(self):
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._version:
+            return []
+        self._version = version
+        rows = self._conn.execute("SELECT id, origin, scope, key FROM invalidations WHERE id > ? ORDER BY id",
+                                  (self.last_id,)).fetchall()
+        if rows:
+            self.last_id = rows[-1][0]
+        return [(scope, key) for _, origin, scope, key in rows if origin != self.origin]
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                changes = await loop.run_in_executor(None, self._poll)
+            except Exception:
+                log.exception("Could not read invalidations")
+                continue
+            now = time.monotonic()
+            if now - self._last_poll > self.retention / 2:
+                log.warning("Missed invalidations for %.0fs; reloading everything", now - self._last_poll)
+                await self._dispatch({scope: None for scope in self.handlers})
+            elif changes:
+                keys = defaultdict(set)
+                for scope, key in changes:
+                    if key is None or keys.get(scope, ()) is None:
+                        keys[scope] = None
+                    else:
+                        keys[scope].add(key)
+                await self._dispatch(keys)
+                self.applied += len(changes)
+            self._last_poll = now
+            if now - self._last_prune > PRUNE_EVERY:
+                self._last_prune = now
+                try:
+                    await self.db.prune_invalidations(time.time() - self.retention)
+                except Exception:
+                    log.exception("Could not prune invalidations")
+
+    async def _dispatch(self, keys):
+        for scope, scope_keys in keys.items():
+            for handler in self.handlers.get(scope, ()):
+                try:
+                    result = handler(scope_keys)
+                    if asyncio.iscoroutine(result):
+                        await result
+                except Exception:
+                    log.exception("Invalidation handler for %s failed", scope)
@@ -0,0 +1,326 @@
+import asyncio
+import json
+import logging
+import random
+import re
+import time
+from collections import deque
+
+import aiohttp
+import discord
+
+from utils.authz import is_admin
+from utils.breaker import PanelUnavailable
+from utils.ratelimit import PRIORITY_DEFAULT
+
+log = logging.getLogger("ptero.console")
+
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;?]*[ -/]*[@-~]")
+MESSAGE_LIMIT = 1900
+# Most commands one /cmd or schedule may send.
+MAX_BATCH = 10
+
+
+class ConsoleStream:
+    """One Wings websocket for one server, buffering console output in memory."""
+
+    def __init__(self, server_id, credentials, session, origin=None, buffer_lines=500):
+        self.server_id = server_id
+        self.credentials = credentials
+        self.session = session
+        self.origin = origin
+        self.buffer = deque(maxlen=buffer_lines)
+        self.listeners = set()
+        self.ready = asyncio.Event()
+        self.connected = False
+        self.last_used = time.monotonic()
+        self._ws = None
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        backoff = 1.0
+        while True:
+            try:
+                creds = await self.credentials(self.server_id)
+                if creds:
+                    await self._session(creds)
+                    backoff = 1.0
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, PanelUnavailable):
+                pass
+            except Exception:
+                # Malformed credentials or frames; keep reconnecting rather
+                # than leaving readers on a buffer that never updates.
+                log.exception("Console stream for %s failed", self.server_id)
+            self.connected = False
+            self._ws = None
+            await asyncio.sleep(backoff + random.uniform(0, backoff))
+            backoff = min(backoff * 2, 60.0)
+
+    async def _session(self, creds):
+        # Wings checks the Origin against its panel, so with several panels
+        # the credentials say which one to present.
+        origin = creds.get("origin", self.origin)
+        async with self.session.ws_connect(creds["socket"], origin=origin, heartbeat=30) as ws:
+            self._ws = ws
+            await ws.send_json({"event": "auth", "args": [creds["token"]]})
+            async for msg in ws:
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    if msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                        break
+                    continue
+                data = json.loads(msg.data)
+                event, args = data.get("event"), data.get("args") or []
+                if event == "auth success":
+                    self.connected = True
+                    if not self.buffer:
+                        await ws.send_json({"event": "send logs", "args": [None]})
+                elif event == "console output" and args:
+                    self._append(args[0])
+                elif event == "token expiring":
+                    creds = await self.credentials(self.server_id)
+                    if creds:
+                        await ws.send_json({"event": "auth", "args": [creds["token"]]})
+                elif event in ("token expired", "jwt error"):
+                    break
+
+    def _append(self, text):
+        lines = ANSI_ESCAPE.sub("", text).splitlines()
+        self.buffer.extend(lines)
+        self.ready.set()
+        for listener in list(self.listeners):
+            listener(lines)
+
+    async def send_command(self, command):
+        return await self.send_commands([command]) == 1
+
+    async def send_commands(self, commands):
+        """Write ``commands`` to the socket in order; returns how many were sent."""
+        if self._ws is None or not self.connected:
+            return 0
+        for sent, command in enumerate(commands):
+            try:
+                await self._ws.send_json({"event": "send command", "args": [command]})
+            except ConnectionError:
+                return sent
+        return len(commands)
+
+    def tail(self, lines):
+        self.last_used = time.monotonic()
+        return list(self.buffer)[-lines:]
+
+
+class LiveTail:
+    """Mirrors a console stream into a Discord channel.
+
+    Lines are collected as they arrive and flushed at most once per
+    ``interval`` seconds by editing the current message, starting a new
+    message once it would go over Discord's length limit. It ends by
+    itself once the channel is gone or the bot may no longer post there.
+    """
+
+    def __init__(self, stream, channel, user_id=None, interval=2.0):
+        self.stream = stream
+        self.channel = channel
+        self.user_id = user_id
+        self.interval = interval
+        self.closed = False
+        self._pending = []
+        self._lines = []
+        self._message = None
+        self._wake = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        self.stream.listeners.add(self._on_lines)
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        self.stream.listeners.discard(self._on_lines)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def _on_lines(self, lines):
+        self._pending.extend(lines)
+        self._wake.set()
+
+    @staticmethod
+    def _render(lines):
+        return "```\n" + "\n".join(lines) + "\n```"
+
+    async def _run(self):
+        while not self.closed:
+            await self._wake.wait()
+            self._wake.clear()
+            pending, self._pending = self._pending, []
+            for line in pending:
+                if self.closed:
+                    break
+                line = line[:MESSAGE_LIMIT - 10]
+                if len(self._render(self._lines + [line])) > MESSAGE_LIMIT:
+                    await self._flush()
+                    self._message, self._lines = None, []
+                self._lines.append(line)
+            await self._flush()
+            await asyncio.sleep(self.interval)
+        self.stream.listeners.discard(self._on_lines)
+
+    async def _flush(self):
+        if not self._lines:
+            return
+        content = self._render(self._lines)
+        try:
+            if self._message is None:
+                self._message = await self.channel.send(content)
+            else:
+                await self._message.edit(content=content)
+        except (discord.NotFound, discord.Forbidden) as e:
+            if self._message is not None and isinstance(e, discord.NotFound):
+                # Only the message was deleted; start a fresh one.
+                self._message = None
+                return
+            log.info("Stopping the console tail of %s in %s: %s", self.stream.server_id, self.channel.id, e)
+            self.closed = True
+        except Exception:
+            # Keep tailing if one edit fails (deleted message, transient
+            # Discord error); the next flush starts a fresh message.
+            self._message = None
+
+
+class ConsoleManager:
+    """Keeps console streams open for watched servers.
+
+    ``credentials(server_id)`` must return ``{"token": ..., "socket": ...}``
+    as given by the panel's websocket endpoint, which makes it easy to point
+    the manager at a local websocket stand-in. Websockets hold their
+    connection for as long as they are open, so by default the manager
+    uses its own session rather than borrowing slots from the REST pool.
+    """
+
+    def __init__(self, credentials, session=None, origin=None, buffer_lines=500, idle_timeout=900, authz=None):
+        self.credentials = credentials
+        # Tails are dropped once their starter loses access to the server.
+        self.authz = authz
+        self.session = session
+        self._owns_session = session is None
+        self.origin = origin
+        self.buffer_lines = buffer_lines
+        self.idle_timeout = idle_timeout
+        self.streams = {}
+        self.tails = {}
+        self._reaper = None
+
+    def watch(self, server_id):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0, ttl_dns_cache=300))
+        stream = self.streams.get(server_id)
+        if stream is None:
+            stream = ConsoleStream(server_id, self.credentials, self.session, self.origin, self.buffer_lines)
+            self.streams[server_id] = stream
+            stream.start()
+        stream.last_used = time.monotonic()
+        if self._reaper is None:
+            self._reaper = asyncio.ensure_future(self._reap())
+        return stream
+
+    async def tail(self, server_id, lines=30, wait=3.0):
+        stream = self.watch(server_id)
+        if not stream.ready.is_set():
+            try:
+                await asyncio.wait_for(stream.ready.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+        return stream.tail(lines)
+
+    async def send_command(self, server_id, command):
+        stream = self.streams.get(server_id)
+        return stream is not None and await stream.send_command(command)
+
+    async def send_commands(self, server_id, commands):
+        """Send over the open console socket if there is one, else return 0."""
+        stream = self.streams.get(server_id)
+        if stream is None:
+            return 0
+        stream.last_used = time.monotonic()
+        return await stream.send_commands(commands)
+
+    async def start_tail(self, server_id, channel, user_id=None, interval=2.0):
+        key = (server_id, channel.id)
+        if key in self.tails:
+            if not self.tails[key].closed:
+                return False
+            await self.stop_tail(server_id, channel.id)
+        tail = LiveTail(self.watch(server_id), channel, user_id, interval)
+        self.tails[key] = tail
+        tail.start()
+        return True
+
+    async def stop_tail(self, server_id, channel_id):
+        tail = self.tails.pop((server_id, channel_id), None)
+        if tail is None:
+            return False
+        await tail.stop()
+        return True
+
+    def _may_tail(self, tail, server_id):
+        if self.authz is None or tail.user_id is None or is_admin(tail.user_id):
+            return True
+        return not self.authz.is_banned(tail.user_id) and self.authz.can_access(tail.user_id, server_id)
+
+    async def _reap(self):
+        while True:
+            await asyncio.sleep(60)
+            for (server_id, channel_id), tail in list(self.tails.items()):
+                if tail.closed or not self._may_tail(tail, server_id):
+                    await self.stop_tail(server_id, channel_id)
+            now = time.monotonic()
+            tailed = {server_id for server_id, _ in self.tails}
+            for server_id, stream in list(self.streams.items()):
+                if server_id not in tailed and now - stream.last_used > self.idle_timeout:
+                    del self.streams[server_id]
+                    await stream.stop()
+
+    async def close(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+        for tail in self.tails.values():
+            await tail.stop()
+        for stream in self.streams.values():
+            await stream.stop()
+        self.tails.clear()
+        self.streams.clear()
+        if self._owns_session and self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+async def send_commands(console, api, server_id, commands, priority=PRIORITY_DEFAULT):
+    """Send ``commands`` in order and return how many went out.
+
+    An open console socket carries the whole batch in one go; otherwise,
+    or for whatever the socket could not take, they are POSTed one by one.
+    """
+    sent = await console.send_commands(server_id, commands)
+    if sent < len(commands):
+        sent += await api.send_commands(server_id, commands[sent:], priority=priority)
+    return sent
+
+
+def split_commands(text):
+    return [c.strip() for c in text.split(";") if c.strip()]
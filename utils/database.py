@@ -1,47 +1,607 @@
-import sqlite3
+import asyncio
+import logging
 import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.authz import AuthIndex
+from utils.migrations import migrate
+
+log = logging.getLogger("ptero.db")
 
 DB_FILE = "data/users.db"
 
+
+def _resolve(fut, result, exc):
+    if fut.cancelled():
+        return
+    if exc is not None:
+        fut.set_exception(exc)
+    else:
+        fut.set_result(result)
+
+
 class DB:
-    def __init__(self):
-        os.makedirs("data", exist_ok=True)  # Ensure 'data' directory exists
-        self.conn = sqlite3.connect(DB_FILE)
-        self.conn.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                discord_id TEXT PRIMARY KEY,
-                panel_id INTEGER,
-                email TEXT,
-                servers TEXT DEFAULT '',
-                shared TEXT DEFAULT '',
-                banned INTEGER DEFAULT 0
+    """Async facade over SQLite.
+
+    All writes go through one writer thread which groups everything queued
+    within ``commit_window`` seconds into a single transaction. Reads run on
+    a small pool of threads, each holding its own connection; WAL mode lets
+    them proceed while the writer commits.
+    """
+
+    def __init__(self, path=DB_FILE, readers=4, commit_window=0.005):
+        self.path = path
+        self.readers = readers
+        self.commit_window = commit_window
+        self._writes = queue.Queue()
+        self._writer = None
+        self._reader_pool = None
+        self._local = threading.local()
+        self._reader_conns = []
+        self._reader_lock = threading.Lock()
+        self.authz = AuthIndex()
+        # Set when several processes share the file; writes that other
+        # processes cache are then recorded in the invalidations table.
+        self.origin = None
+
+    async def connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._writer = threading.Thread(target=self._write_loop, name="db-writer", daemon=True)
+        self._writer.start()
+        self._reader_pool = ThreadPoolExecutor(max_workers=self.readers, thread_name_prefix="db-reader")
+        await self.transaction(migrate)
+        await self.authz.load(self)
+
+    async def close(self):
+        if self._writer is None:
+            return
+        self._writes.put(None)
+        await asyncio.get_running_loop().run_in_executor(None, self._writer.join)
+        self._writer = None
+        self._reader_pool.shutdown(wait=True)
+        with self._reader_lock:
+            for conn in self._reader_conns:
+                conn.close()
+            self._reader_conns.clear()
+
+    # --- writer thread -------------------------------------------------
+
+    def _open_writer(self):
+        conn = sqlite3.connect(self.path, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    def _write_loop(self):
+        conn = self._open_writer()
+        stopping = False
+        while not stopping:
+            item = self._writes.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.commit_window
+            while True:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._writes.get(timeout=remaining) if remaining > 0 else self._writes.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                self._commit(conn, batch)
+            except Exception:
+                log.exception("Write batch of %d failed", len(batch))
+        conn.close()
+
+    @staticmethod
+    def _commit(conn, batch):
+        done, results = [], None
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for fn, fut, loop in batch:
+                # A savepoint per operation keeps one failing write from
+                # rolling back the others that share the transaction.
+                conn.execute("SAVEPOINT op")
+                try:
+                    result = fn(conn)
+                    conn.execute("RELEASE op")
+                    done.append((fut, loop, result, None))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO op")
+                    conn.execute("RELEASE op")
+                    done.append((fut, loop, None, e))
+            conn.execute("COMMIT")
+            results = done
+        except Exception as e:
+            # The lock could not be taken (another process held it past
+            # busy_timeout) or the commit failed: the whole batch fails.
+            results = [(fut, loop, None, e) for _, fut, loop in batch]
+            try:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+            except Exception:
+                log.exception("Rollback of a failed write batch failed")
+        finally:
+            # Every future is resolved, whatever happened above.
+            if results is None:
+                error = sqlite3.OperationalError("write batch aborted")
+                results = [(fut, loop, None, error) for _, fut, loop in batch]
+            for fut, loop, result, exc in results:
+                try:
+                    loop.call_soon_threadsafe(_resolve, fut, result, exc)
+                except RuntimeError:
+                    # The caller's loop has already closed.
+                    pass
+
+    def transaction(self, fn):
+        """Queue ``fn(conn)`` on the writer thread; returns an awaitable of its result."""
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._writes.put((fn, fut, loop))
+        return fut
+
+    async def execute(self, sql, params=()):
+        return await self.transaction(lambda c: c.execute(sql, params).rowcount)
+
+    async def executemany(self, sql, rows):
+        rows = list(rows)
+        return await self.transaction(lambda c: c.executemany(sql, rows).rowcount)
+
+    # --- reader pool ---------------------------------------------------
+
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA query_only=ON")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+            with self._reader_lock:
+                self._reader_conns.append(conn)
+        return conn
+
+    async def read(self, fn):
+        """Run ``fn(conn)`` on a pooled read connection."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._reader_pool, lambda: fn(self._reader()))
+
+    async def fetchone(self, sql, params=()):
+        return await self.read(lambda c: c.execute(sql, params).fetchone())
+
+    async def fetchall(self, sql, params=()):
+        return await self.read(lambda c: c.execute(sql, params).fetchall())
+
+    async def _fetch_in(self, sql, values, chunk=500):
+        """Run ``sql`` (with one ``{}`` for the IN list) over ``values`` in chunks."""
+        def fn(conn):
+            rows = []
+            for i in range(0, len(values), chunk):
+                part = values[i:i + chunk]
+                rows += conn.execute(sql.format(",".join("?" * len(part))), part).fetchall()
+            return rows
+        return await self.read(fn)
+
+    # --- cross-process -------------------------------------------------
+
+    def _publish(self, conn, scope, keys=(None,)):
+        """Record inside a write that ``keys`` of ``scope`` changed; a None key means all of them."""
+        if self.origin is None:
+            return
+        now = time.time()
+        conn.executemany("INSERT INTO invalidations (origin, scope, key, created_at) VALUES (?, ?, ?, ?)",
+                         [(self.origin, scope, None if k is None else str(k), now) for k in keys])
+
+    async def publish(self, scope, *keys):
+        if self.origin is not None:
+            await self.transaction(lambda c: self._publish(c, scope, keys or (None,)))
+
+    async def prune_invalidations(self, before):
+        return await self.execute("DELETE FROM invalidations WHERE created_at < ?", (before,))
+
+    async def acquire_lease(self, name, holder, ttl):
+        """Take or renew lease ``name``; True if ``holder`` holds it afterwards."""
+        def fn(conn):
+            now = time.time()
+            return conn.execute(
+                "INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?) ON CONFLICT (name) DO UPDATE SET "
+                "holder = excluded.holder, expires_at = excluded.expires_at "
+                "WHERE leases.holder = excluded.holder OR leases.expires_at < ?",
+                (name, holder, now + ttl, now),
+            ).rowcount == 1
+        return await self.transaction(fn)
+
+    async def release_lease(self, name, holder):
+        await self.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+
+    async def get_lease(self, name):
+        return await self.fetchone("SELECT * FROM leases WHERE name = ?", (name,))
+
+    # --- meta ----------------------------------------------------------
+
+    async def get_meta(self, key, default=None):
+        row = await self.fetchone("SELECT value FROM meta WHERE key = ?", (key,))
+        return row["value"] if row else default
+
+    async def set_meta(self, key, value):
+        await self.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    # --- users ---------------------------------------------------------
+
+    async def add_user(self, discord_id, panel_id, email, panel=None):
+        await self.execute(
+            "INSERT OR IGNORE INTO users (discord_id, panel_id, email, panel) VALUES (?, ?, ?, ?)",
+            (str(discord_id), panel_id, email, panel),
+        )
+
+    async def get_user(self, discord_id):
+        return await self.fetchone("SELECT * FROM users WHERE discord_id = ?", (str(discord_id),))
+
+    async def set_banned(self, discord_id, banned):
+        # Upsert so users without a linked panel account can be banned too.
+        def fn(conn):
+            conn.execute(
+                "INSERT INTO users (discord_id, banned) VALUES (?, ?) "
+                "ON CONFLICT (discord_id) DO UPDATE SET banned = excluded.banned",
+                (str(discord_id), int(banned)),
+            )
+            self._publish(conn, "user", [discord_id])
+        await self.transaction(fn)
+        self.authz.set_banned(discord_id, banned)
+
+    async def ban_user(self, discord_id):
+        await self.set_banned(discord_id, True)
+
+    async def unban_user(self, discord_id):
+        await self.set_banned(discord_id, False)
+
+    async def get_all_users(self):
+        return await self.fetchall("SELECT * FROM users")
+
+    async def list_users(self):
+        return await self.fetchall("SELECT * FROM users WHERE panel_id IS NOT NULL")
+
+    async def list_users_page(self, after=None, limit=20, query=None):
+        # Keyset pagination on the primary key: each page is an index seek,
+        # however deep into the list it is.
+        sql = "SELECT * FROM users WHERE panel_id IS NOT NULL AND discord_id > ?"
+        params = [after or ""]
+        if query:
+            sql += " AND (discord_id LIKE ? ESCAPE '\\' OR email LIKE ? ESCAPE '\\')"
+            pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            params += [pattern, pattern]
+        sql += " ORDER BY discord_id LIMIT ?"
+        params.append(limit)
+        return await self.fetchall(sql, params)
+
+    async def linked_users(self):
+        return await self.fetchall("SELECT discord_id, panel_id, email, panel FROM users WHERE panel_id IS NOT NULL")
+
+    async def apply_user_changes(self, emails, unlinked):
+        def fn(conn):
+            conn.executemany("UPDATE users SET email = ? WHERE discord_id = ?", emails)
+            conn.executemany("UPDATE users SET panel_id = NULL WHERE discord_id = ?", [(d,) for d in unlinked])
+        await self.transaction(fn)
+
+    # --- servers -------------------------------------------------------
+
+    async def add_server(self, server_id, owner_id, node_id=None, memory=None, disk=None, cpu=None, panel=None):
+        def fn(conn):
+            conn.execute(
+                "INSERT OR REPLACE INTO servers (identifier, owner_id, created_at, node_id, memory, disk, cpu, panel) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (server_id, str(owner_id), int(time.time()), node_id, memory, disk, cpu, panel),
             )
-        ''')
-        self.conn.commit()
+            self._publish(conn, "server", [server_id])
+        await self.transaction(fn)
+        self.authz.add_server(server_id, owner_id)
+
+    async def delete_server(self, server_id):
+        def fn(conn):
+            conn.execute("DELETE FROM server_access WHERE server_id = ?", (server_id,))
+            self._publish(conn, "server", [server_id])
+            return conn.execute("DELETE FROM servers WHERE identifier = ?", (server_id,)).rowcount
+        deleted = await self.transaction(fn)
+        self.authz.remove_server(server_id)
+        return deleted
+
+    async def get_server_owner(self, server_id):
+        row = await self.fetchone("SELECT owner_id FROM servers WHERE identifier = ?", (server_id,))
+        return row["owner_id"] if row else None
+
+    async def server_exists(self, server_id, owner_id):
+        row = await self.fetchone(
+            "SELECT 1 FROM servers WHERE identifier = ? AND owner_id = ?", (server_id, str(owner_id))
+        )
+        return row is not None
+
+    async def get_owned_servers(self, discord_id):
+        rows = await self.fetchall(
+            "SELECT identifier FROM servers WHERE owner_id = ? ORDER BY identifier", (str(discord_id),)
+        )
+        return [r["identifier"] for r in rows]
+
+    async def get_all_server_ids(self):
+        rows = await self.fetchall("SELECT identifier FROM servers")
+        return [r["identifier"] for r in rows]
+
+    async def provisioned_by_node(self, panel=None):
+        rows = await self.fetchall(
+            "SELECT node_id, SUM(memory) AS memory, SUM(disk) AS disk, SUM(cpu) AS cpu "
+            "FROM servers WHERE node_id IS NOT NULL AND panel IS ? GROUP BY node_id", (panel,)
+        )
+        return {r["node_id"]: r for r in rows}
+
+    async def server_sync_state(self):
+        return await self.fetchall("SELECT identifier, owner_id, updated_at, created_at, panel FROM servers")
+
+    async def apply_server_changes(self, upserts, deletes):
+        """Write reconciled servers in one transaction.
+
+        ``upserts`` rows are (identifier, owner_id, created_at, node_id,
+        memory, disk, cpu, name, updated_at, panel); created_at is only
+        used for new rows.
+        """
+        def fn(conn):
+            conn.executemany(
+                "INSERT INTO servers (identifier, owner_id, created_at, node_id, memory, disk, cpu, name, updated_at, "
+                "panel) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (identifier) DO UPDATE SET "
+                "owner_id = excluded.owner_id, node_id = excluded.node_id, memory = excluded.memory, "
+                "disk = excluded.disk, cpu = excluded.cpu, name = excluded.name, updated_at = excluded.updated_at, "
+                "panel = excluded.panel",
+                upserts,
+            )
+            conn.executemany("DELETE FROM server_access WHERE server_id = ?", [(sid,) for sid in deletes])
+            conn.executemany("DELETE FROM servers WHERE identifier = ?", [(sid,) for sid in deletes])
+            self._publish(conn, "server", [row[0] for row in upserts] + list(deletes))
+        await self.transaction(fn)
+        for row in upserts:
+            self.authz.add_server(row[0], row[1])
+        for server_id in deletes:
+            self.authz.remove_server(server_id)
+
+    async def server_panels(self):
+        rows = await self.fetchall("SELECT identifier, panel FROM servers WHERE panel IS NOT NULL")
+        return {r["identifier"]: r["panel"] for r in rows}
+
+    async def servers_by_id(self, server_ids):
+        return await self._fetch_in(
+            "SELECT identifier, owner_id, name, panel FROM servers WHERE identifier IN ({})", list(server_ids))
+
+    async def server_names(self):
+        rows = await self.fetchall("SELECT identifier, name FROM servers WHERE name IS NOT NULL")
+        return {r["identifier"]: r["name"] for r in rows}
+
+    # --- shared access -------------------------------------------------
+
+    async def share_server(self, server_id, user_id):
+        def fn(conn):
+            conn.execute("INSERT OR IGNORE INTO server_access (server_id, user_id) VALUES (?, ?)",
+                         (server_id, str(user_id)))
+            self._publish(conn, "server", [server_id])
+        await self.transaction(fn)
+        self.authz.share(server_id, user_id)
+
+    async def unshare_server(self, server_id, user_id):
+        def fn(conn):
+            conn.execute("DELETE FROM server_access WHERE server_id = ? AND user_id = ?", (server_id, str(user_id)))
+            self._publish(conn, "server", [server_id])
+        await self.transaction(fn)
+        self.authz.unshare(server_id, user_id)
 
-    def add_user(self, discord_id, panel_id, email):
-        self.conn.execute(
-            "INSERT OR IGNORE INTO users (discord_id, panel_id, email) VALUES (?, ?, ?)",
-            (discord_id, panel_id, email),
+    async def get_shared_servers(self, discord_id):
+        rows = await self.fetchall(
+            "SELECT server_id FROM server_access WHERE user_id = ? ORDER BY server_id", (str(discord_id),)
         )
-        self.conn.commit()
+        return [r["server_id"] for r in rows]
+
+    async def get_shared_users(self, server_id):
+        rows = await self.fetchall("SELECT user_id FROM server_access WHERE server_id = ?", (server_id,))
+        return [r["user_id"] for r in rows]
+
+    async def access_by_server(self, server_ids):
+        return await self._fetch_in("SELECT server_id, user_id FROM server_access WHERE server_id IN ({})",
+                                    list(server_ids))
+
+    # --- resource samples ----------------------------------------------
+
+    async def add_resource_samples(self, samples):
+        await self.executemany("INSERT OR REPLACE INTO resource_samples VALUES (?, ?, ?, ?, ?, ?, ?, ?)", samples)
+
+    async def compact_resources(self, raw_before, rollup_before, bucket=300):
+        def fn(conn):
+            conn.execute('''
+                INSERT INTO resource_rollups
+                SELECT server_id, ts - ts % :bucket, COUNT(*), SUM(state = 2),
+                       MIN(memory), SUM(memory), MAX(memory),
+                       MIN(cpu), SUM(cpu), MAX(cpu),
+                       MIN(disk), SUM(disk), MAX(disk)
+                FROM resource_samples WHERE ts < :before
+                GROUP BY server_id, ts - ts % :bucket
+                ON CONFLICT (server_id, bucket) DO UPDATE SET
+                    samples = samples + excluded.samples,
+                    running = running + excluded.running,
+                    memory_min = MIN(memory_min, excluded.memory_min),
+                    memory_sum = memory_sum + excluded.memory_sum,
+                    memory_max = MAX(memory_max, excluded.memory_max),
+                    cpu_min = MIN(cpu_min, excluded.cpu_min),
+                    cpu_sum = cpu_sum + excluded.cpu_sum,
+                    cpu_max = MAX(cpu_max, excluded.cpu_max),
+                    disk_min = MIN(disk_min, excluded.disk_min),
+                    disk_sum = disk_sum + excluded.disk_sum,
+                    disk_max = MAX(disk_max, excluded.disk_max)
+            ''', {"bucket": bucket, "before": raw_before})
+            conn.execute("DELETE FROM resource_samples WHERE ts < ?", (raw_before,))
+            conn.execute("DELETE FROM resource_rollups WHERE bucket < ?", (rollup_before,))
+        await self.transaction(fn)
+
+    async def resource_history(self, server_id, since):
+        def fn(conn):
+            raw = conn.execute('''
+                SELECT COUNT(*), SUM(state = 2), MIN(memory), SUM(memory), MAX(memory),
+                       MIN(cpu), SUM(cpu), MAX(cpu), MIN(disk), SUM(disk), MAX(disk)
+                FROM resource_samples WHERE server_id = ? AND ts >= ?
+            ''', (server_id, since)).fetchone()
+            rolled = conn.execute('''
+                SELECT SUM(samples), SUM(running), MIN(memory_min), SUM(memory_sum), MAX(memory_max),
+                       MIN(cpu_min), SUM(cpu_sum), MAX(cpu_max), MIN(disk_min), SUM(disk_sum), MAX(disk_max)
+                FROM resource_rollups WHERE server_id = ? AND bucket >= ?
+            ''', (server_id, since)).fetchone()
+            return raw, rolled
+        raw, rolled = await self.read(fn)
+        parts = [p for p in (raw, rolled) if p[0]]
+        if not parts:
+            return None
+        samples = sum(p[0] for p in parts)
+        history = {"samples": samples, "uptime": sum(p[1] for p in parts) / samples}
+        for i, name in enumerate(("memory", "cpu", "disk")):
+            history[name] = (
+                min(p[2 + i * 3] for p in parts),
+                sum(p[3 + i * 3] for p in parts) / samples,
+                max(p[4 + i * 3] for p in parts),
+            )
+        return history
+
+    # --- jobs ----------------------------------------------------------
+
+    async def enqueue_job(self, kind, payload, key, max_attempts, user_id=None, application_id=None, token=None,
+                          token_expires=None):
+        """Insert a queued job and return ``(job_id, created)``; an unfinished job with the same key wins."""
+        def fn(conn):
+            now = time.time()
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO jobs (kind, payload, idempotency_key, max_attempts, run_after, created_at, "
+                "user_id, application_id, token, token_expires) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (kind, payload, key, max_attempts, now, now, user_id, application_id, token, token_expires),
+            )
+            if cur.rowcount:
+                # Wakes the leader's workers when queued from another process.
+                self._publish(conn, "job", [cur.lastrowid])
+                return cur.lastrowid, True
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE idempotency_key = ? AND state IN ('queued', 'running')", (key,)
+            ).fetchone()
+            return row["id"], False
+        return await self.transaction(fn)
+
+    async def claim_jobs(self, limit):
+        def fn(conn):
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE state = 'queued' AND run_after <= ? ORDER BY run_after, id LIMIT ?",
+                (time.time(), limit),
+            ).fetchall()
+            conn.executemany("UPDATE jobs SET state = 'running', attempts = attempts + 1 WHERE id = ?",
+                             [(r["id"],) for r in rows])
+            return rows
+        return await self.transaction(fn)
+
+    async def retry_job(self, job_id, run_after, error):
+        await self.execute("UPDATE jobs SET state = 'queued', run_after = ?, result = ? WHERE id = ?",
+                           (run_after, error, job_id))
+
+    async def finish_job(self, job_id, state, result):
+        # The interaction token is only needed for delivery; don't keep it around.
+        await self.execute(
+            "UPDATE jobs SET state = ?, result = ?, finished_at = ?, token = NULL WHERE id = ?",
+            (state, result, time.time(), job_id),
+        )
+
+    async def requeue_running_jobs(self):
+        # Anything still marked running was interrupted by a restart.
+        return await self.execute("UPDATE jobs SET state = 'queued' WHERE state = 'running'")
+
+    async def job_counts(self):
+        rows = await self.fetchall("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state")
+        return {r["state"]: r["n"] for r in rows}
+
+    async def next_job_due(self):
+        row = await self.fetchone("SELECT MIN(run_after) AS due FROM jobs WHERE state = 'queued'")
+        return row["due"] if row else None
+
+    async def prune_jobs(self, before):
+        return await self.execute("DELETE FROM jobs WHERE state IN ('done', 'failed') AND finished_at < ?", (before,))
+
+    # --- events --------------------------------------------------------
+
+    async def add_events(self, rows):
+        await self.executemany(
+            "INSERT INTO events (ts, actor_id, action, server_id, target_id, detail, outcome) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    async def events_page(self, before=None, limit=20, actor_id=None, server_id=None, action=None):
+        # Newest first, keyset on id so deep pages cost the same as the first.
+        sql = "SELECT * FROM events WHERE id < ?"
+        params = [before if before is not None else 1 << 62]
+        if actor_id is not None:
+            sql += " AND actor_id = ?"
+            params.append(str(actor_id))
+        if server_id is not None:
+            sql += " AND server_id = ?"
+            params.append(server_id)
+        if action:
+            sql += " AND action LIKE ?"
+            params.append(f"{action}%")
+        sql += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        return await self.fetchall(sql, params)
+
+    async def prune_events(self, before, prefixes=None, chunk=5000):
+        # Deleted in chunks so a large backlog never holds the writer for long.
+        sql = "DELETE FROM events WHERE id IN (SELECT id FROM events WHERE ts < ?"
+        params = [before]
+        if prefixes:
+            sql += " AND (" + " OR ".join("action LIKE ?" for _ in prefixes) + ")"
+            params += [f"{p}%" for p in prefixes]
+        sql += " LIMIT ?)"
+        total = 0
+        while True:
+            deleted = await self.execute(sql, params + [chunk])
+            total += deleted
+            if deleted < chunk:
+                return total
 
-    def get_user(self, discord_id):
-        cursor = self.conn.execute("SELECT * FROM users WHERE discord_id = ?", (discord_id,))
-        return cursor.fetchone()
+    # --- schedules -----------------------------------------------------
 
-    def set_banned(self, discord_id, banned):
-        self.conn.execute("UPDATE users SET banned = ? WHERE discord_id = ?", (banned, discord_id))
-        self.conn.commit()
+    async def add_schedules(self, rows):
+        """Insert (owner_id, server_id, cron, action, payload, jitter, next_run) rows; returns their ids."""
+        def fn(conn):
+            now = int(time.time())
+            ids = [conn.execute(
+                "INSERT INTO schedules (owner_id, server_id, cron, action, payload, jitter, next_run, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (str(row[0]), *row[1:], now)).lastrowid for row in rows]
+            self._publish(conn, "schedule", ids)
+            return ids
+        return await self.transaction(fn)
 
-    def get_all_users(self):
-        cursor = self.conn.execute("SELECT * FROM users")
-        return cursor.fetchall()
+    async def remove_schedule(self, schedule_id):
+        def fn(conn):
+            self._publish(conn, "schedule", [schedule_id])
+            return conn.execute("DELETE FROM schedules WHERE id = ?", (schedule_id,)).rowcount
+        return await self.transaction(fn)
 
-    def update_servers(self, discord_id, servers):
-        self.conn.execute("UPDATE users SET servers = ? WHERE discord_id = ?", (servers, discord_id))
-        self.conn.commit()
+    async def get_schedules(self, owner_id=None, server_id=None, ids=None):
+        if ids is not None:
+            return await self._fetch_in("SELECT * FROM schedules WHERE id IN ({})", list(ids))
+        sql = "SELECT * FROM schedules WHERE 1"
+        params = []
+        if owner_id is not None:
+            sql += " AND owner_id = ?"
+            params.append(str(owner_id))
+        if server_id is not None:
+            sql += " AND server_id = ?"
+            params.append(server_id)
+        return await self.fetchall(sql + " ORDER BY id", params)
 
-    def update_shared(self, discord_id, shared):
-        self.conn.execute("UPDATE users SET shared = ? WHERE discord_id = ?", (shared, discord_id))
-        self.conn.commit()
+    async def record_schedule_runs(self, rows):
+        """``rows`` are (next_run, last_run, last_result, schedule_id)."""
+        await self.executemany("UPDATE schedules SET next_run = ?, last_run = ?, last_result = ? WHERE id = ?", rows)
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+
+log = logging.getLogger("ptero.events")
+
+DAY = 24 * 3600
+# High-volume actions are kept for a shorter time than everything else.
+NOISY_ACTIONS = ("power.", "console.")
+PRUNE_EVERY = 3600
+
+
+class EventLog:
+    """Append-only audit log fed through an in-memory buffer.
+
+    ``record`` never touches the database: events are appended to a
+    bounded deque and a background task writes them in one batch every
+    ``flush_interval`` seconds, or sooner once ``batch_size`` are waiting.
+    If the buffer overflows the oldest events are dropped and counted.
+    """
+
+    def __init__(self, db, flush_interval=1.0, batch_size=500, max_pending=20000):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.retention = int(os.getenv("AUDIT_RETENTION_DAYS", 365)) * DAY
+        self.noisy_retention = int(os.getenv("AUDIT_NOISY_RETENTION_DAYS", 30)) * DAY
+        self.pending = deque(maxlen=max_pending)
+        self.dropped = 0
+        self.written = 0
+        self._wake = asyncio.Event()
+        self._task = None
+        self._last_prune = 0.0
+
+    def record(self, actor_id, action, server_id=None, target_id=None, detail=None, outcome="ok"):
+        if len(self.pending) == self.pending.maxlen:
+            self.dropped += 1
+        self.pending.append((int(time.time()), str(actor_id) if actor_id is not None else None, action, server_id,
+                             str(target_id) if target_id is not None else None, detail, outcome))
+        if len(self.pending) >= self.batch_size:
+            self._wake.set()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def flush(self):
+        while self.pending:
+            batch = [self.pending.popleft() for _ in range(min(self.batch_size, len(self.pending)))]
+            try:
+                await self.db.add_events(batch)
+            except Exception:
+                # Put them back so the next flush retries them.
+                self.pending.extendleft(reversed(batch))
+                raise
+            self.written += len(batch)
+
+    async def prune(self):
+        now = int(time.time())
+        noisy = await self.db.prune_events(now - self.noisy_retention, NOISY_ACTIONS)
+        rest = await self.db.prune_events(now - self.retention)
+        if noisy or rest:
+            log.info("Pruned %d audit events", noisy + rest)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+                if time.monotonic() - self._last_prune > PRUNE_EVERY:
+                    self._last_prune = time.monotonic()
+                    await self.prune()
+            except Exception:
+                log.exception("Could not write audit events")
+
+
+def audit(interaction, action, server_id=None, target_id=None, detail=None, outcome="ok"):
+    """Record an action taken by the user behind ``interaction``."""
+    interaction.client.events.record(interaction.user.id, action, server_id, target_id, detail, outcome)
@@ -0,0 +1,224 @@
+import asyncio
+import json
+import logging
+import random
+import time
+
+import discord
+
+from utils import metrics
+from utils.breaker import PanelUnavailable
+from utils.ratelimit import PRIORITY_DEFAULT
+
+log = logging.getLogger("ptero.jobs")
+
+# Interaction tokens last 15 minutes; stop trying to edit a little before.
+TOKEN_LIFETIME = 14 * 60
+RETENTION = 7 * 24 * 3600
+
+
+class JobFailed(Exception):
+    """Raised by a handler for a failure that retrying will not fix."""
+
+
+class RetryJob(Exception):
+    """Raised by a handler when the attempt failed but may succeed later."""
+
+
+class JobQueue:
+    """SQLite-backed queue for panel operations that outlive an interaction.
+
+    Handlers are ``async fn(job_id, payload) -> str`` and return the
+    message to deliver. Jobs survive restarts: anything left running is
+    queued again at startup, so handlers must be safe to run twice.
+    Results are delivered by editing the original interaction response,
+    or by DM once its token has expired.
+    """
+
+    def __init__(self, db, client, workers=4, poll_interval=5, max_attempts=5, backoff=2.0, events=None):
+        self.db = db
+        self.client = client
+        self.events = events
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.handlers = {}
+        self._running = set()
+        self._wake = asyncio.Event()
+        self._task = None
+
+    def register(self, kind, handler):
+        self.handlers[kind] = handler
+
+    async def start(self):
+        requeued = await self.db.requeue_running_jobs()
+        if requeued:
+            log.info("Resuming %d interrupted job(s)", requeued)
+        await self.db.prune_jobs(time.time() - RETENTION)
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        # Jobs cut off here stay marked running and are picked up again on
+        # the next start.
+        tasks = [t for t in (self._task, *self._running) if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+    def wake(self):
+        """Look for work now, e.g. because another process queued a job."""
+        self._wake.set()
+
+    async def submit(self, kind, payload, key=None, interaction=None):
+        """Queue a job and return ``(job_id, created)``."""
+        delivery = {}
+        if interaction is not None:
+            delivery = {"user_id": str(interaction.user.id), "application_id": str(interaction.application_id),
+                        "token": interaction.token, "token_expires": time.time() + TOKEN_LIFETIME}
+        job_id, created = await self.db.enqueue_job(kind, json.dumps(payload), key, self.max_attempts, **delivery)
+        if created:
+            self._wake.set()
+        return job_id, created
+
+    async def _run(self):
+        while True:
+            # Cleared before the first await, so a wake during the pass
+            # below is not lost.
+            self._wake.clear()
+            free = self.workers - len(self._running)
+            if free > 0:
+                for job in await self.db.claim_jobs(free):
+                    task = asyncio.ensure_future(self._execute(job))
+                    self._running.add(task)
+                    task.add_done_callback(self._finished)
+
+            timeout = self.poll_interval
+            due = await self.db.next_job_due()
+            if due is not None:
+                timeout = min(timeout, max(due - time.time(), 0.05))
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _finished(self, task):
+        self._running.discard(task)
+        self._wake.set()
+
+    async def _execute(self, job):
+        kind = job["kind"]
+        attempt = job["attempts"] + 1
+        handler = self.handlers.get(kind)
+        try:
+            if handler is None:
+                raise JobFailed(f"❌ Unknown job type `{kind}`.")
+            result = await handler(job["id"], json.loads(job["payload"]))
+        except asyncio.CancelledError:
+            raise
+        except JobFailed as e:
+            return await self._complete(job, "failed", str(e))
+        except Exception as e:
+            if not isinstance(e, (RetryJob, PanelUnavailable)):
+                log.exception("Job %s (%s) attempt %d raised", job["id"], kind, attempt)
+            message = str(e) or f"❌ {type(e).__name__}"
+            if attempt >= job["max_attempts"]:
+                return await self._complete(job, "failed", message)
+            delay = self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+            metrics.JOB_ATTEMPTS.inc(1, kind, "retry")
+            await self.db.retry_job(job["id"], time.time() + delay, message)
+            return
+        await self._complete(job, "done", result)
+
+    async def _complete(self, job, state, result):
+        metrics.JOB_ATTEMPTS.inc(1, job["kind"], state)
+        metrics.JOB_LATENCY.observe(time.time() - job["created_at"], job["kind"], state)
+        await self.db.finish_job(job["id"], state, result)
+        if self.events is not None:
+            self.events.record(job["user_id"], f"job.{job['kind']}", json.loads(job["payload"]).get("server_id"),
+                               detail=f"job #{job['id']}: {result}"[:500], outcome=state)
+        try:
+            await self._deliver(job, result)
+        except Exception:
+            log.exception("Could not deliver the result of job %s", job["id"])
+
+    async def _deliver(self, job, result):
+        content = f"{result}\n-# job #{job['id']}"
+        if job["token"] and job["token_expires"] > time.time():
+            webhook = discord.Webhook.partial(int(job["application_id"]), job["token"], client=self.client)
+            try:
+                await webhook.edit_message("@original", content=content)
+                return
+            except discord.HTTPException:
+                pass
+        if job["user_id"]:
+            user = self.client.get_user(int(job["user_id"])) or await self.client.fetch_user(int(job["user_id"]))
+            await user.send(content)
+
+
+def queued_message(job_id, created):
+    if created:
+        return f"⏳ Queued as job #{job_id}. This message will be updated when it finishes."
+    return f"⏳ That is already in progress as job #{job_id}; its result will be posted where it was requested."
+
+
+def register_panel_jobs(queue, api, db, placements, backups):
+    """``placements`` maps each panel key to that panel's PlacementEngine."""
+    async def create_server(job_id, p):
+        # The server goes on the panel its owner's account lives on.
+        panel = p.get("panel")
+        placement = placements.get(panel)
+        if placement is None:
+            raise JobFailed(f"❌ Panel `{panel}` is not configured.")
+        # The external ID ties the panel server to this job, so an attempt
+        # that timed out after the panel created it is not repeated.
+        external_id = f"bot-job-{job_id}"
+        server = await api.get_server_by_external_id(external_id, panel=panel)
+        if server is None:
+            decision, reservation = await placement.reserve(p["ram"], p["disk"], p["cpu"])
+            if reservation is None:
+                raise JobFailed(f"❌ No node can fit {p['ram']} MB / {p['disk']} MB / {p['cpu']}% right now.")
+            try:
+                server = await api.create_server(p["panel_id"], p["ram"], p["disk"], p["cpu"],
+                                                 node_id=decision.node_id, external_id=external_id, panel=panel)
+            except BaseException:
+                reservation.release()
+                raise
+            if server is None:
+                reservation.release()
+                raise RetryJob("❌ Failed to create server.")
+            reservation.commit()
+        await db.add_server(server["identifier"], owner_id=p["owner_id"], node_id=server["node"],
+                            memory=p["ram"], disk=p["disk"], cpu=p["cpu"], panel=panel)
+        node = placement.nodes.get(server["node"])
+        return f"✅ Server created on **{node.name if node else server['node']}**: `{server['identifier']}`"
+
+    async def delete_server(job_id, p):
+        if not await api.delete_server(p["server_id"]):
+            raise RetryJob("❌ Failed to delete server.")
+        await db.delete_server(p["server_id"])
+        return f"🗑️ Server `{p['server_id']}` deleted."
+
+    async def wipe_server(job_id, p):
+        if not await api.wipe_server(p["server_id"]):
+            raise RetryJob("❌ Failed to wipe the server.")
+        return f"⚠️ Server `{p['server_id']}` has been wiped."
+
+    async def create_backup(job_id, p):
+        # Unlike scheduled runs, a backup the user asked for never deletes
+        # one of theirs to make room.
+        backup = await backups.backup_server(p["server_id"], priority=PRIORITY_DEFAULT)
+        if backup is None:
+            limit = await backups.at_limit(p["server_id"], priority=PRIORITY_DEFAULT)
+            if limit is not None:
+                raise JobFailed(f"❌ `{p['server_id']}` already has its limit of {limit} backups. "
+                                "Delete one before creating another.")
+            raise RetryJob("❌ Failed to create a backup.")
+        return f"🗂️ Backup `{backup['name']}` started for `{p['server_id']}`."
+
+    queue.register("create-server", create_server)
+    queue.register("delete-server", delete_server)
+    queue.register("wipe-server", wipe_server)
+    queue.register("create-backup", create_backup)
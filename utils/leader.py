@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+
+log = logging.getLogger("ptero.leader")
+
+
+def process_id():
+    """Identifies this process among those sharing the DB."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LeaderLease:
+    """Elects the one process that runs background services.
+
+    Leadership is a row in the leases table that the holder renews every
+    third of ``ttl``. Another process can only take the row once it has
+    expired, so after a crash the services move within ``ttl`` seconds, and
+    a clean shutdown hands them over at once by deleting it. A leader that
+    cannot reach the DB steps down once its last renewal is two thirds of
+    ``ttl`` old, before the row can expire under it.
+    """
+
+    def __init__(self, db, holder, name="background", ttl=None, on_elected=None, on_deposed=None):
+        self.db = db
+        self.holder = holder
+        self.name = name
+        self.ttl = ttl or int(os.getenv("LEADER_LEASE_TTL", 30))
+        self.on_elected = on_elected
+        self.on_deposed = on_deposed
+        self.is_leader = False
+        self.elections = 0
+        self._renewed = 0.0
+        self._task = None
+
+    async def start(self):
+        # The first attempt is awaited, so a lone process is leader by the
+        # time startup finishes.
+        await self._renew()
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.is_leader:
+            await self._set_leader(False)
+            await self.db.release_lease(self.name, self.holder)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            await self._renew()
+
+    async def _renew(self):
+        try:
+            held = await self.db.acquire_lease(self.name, self.holder, self.ttl)
+        except Exception:
+            log.exception("Could not renew the %s lease", self.name)
+            held = self.is_leader and time.monotonic() - self._renewed < self.ttl * 2 / 3
+        else:
+            if held:
+                self._renewed = time.monotonic()
+        if held != self.is_leader:
+            await self._set_leader(held)
+
+    async def _set_leader(self, leader):
+        self.is_leader = leader
+        if leader:
+            self.elections += 1
+            log.info("Elected to run background services (%s)", self.holder)
+        else:
+            log.info("No longer running background services (%s)", self.holder)
+        callback = self.on_elected if leader else self.on_deposed
+        if callback is not None:
+            try:
+                await callback()
+            except Exception:
+                log.exception("Leadership change handler failed")
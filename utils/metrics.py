@@ -0,0 +1,195 @@
+import bisect
+import inspect
+import logging
+import os
+import time
+
+from aiohttp import web
+
+log = logging.getLogger("ptero.metrics")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+JOB_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+SLOW_CALL_THRESHOLD = float(os.getenv("SLOW_CALL_THRESHOLD", 2.0))
+
+
+class Histogram:
+    """Fixed-bucket histogram keyed by a tuple of label values."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, value, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def quantile(self, q, *labels):
+        series = self.series.get(labels)
+        if not series or not series[2]:
+            return 0.0
+        rank = q * series[2]
+        seen = 0
+        for i, count in enumerate(series[0]):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, n) in self.series.items():
+            base = _labels(self.labels, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{base}{"," if base else ""}le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{base}}} {total}")
+            lines.append(f"{self.name}_count{{{base}}} {n}")
+        return lines
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.series = {}
+
+    def inc(self, amount=1, *labels):
+        self.series[labels] = self.series.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in self.series.items():
+            lines.append(f"{self.name}{{{_labels(self.labels, labels)}}} {value}")
+        return lines
+
+
+class Gauge:
+    """A gauge whose value is read from a callback, sync or async, at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, read):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    async def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        values = self.read()
+        if inspect.isawaitable(values):
+            values = await values
+        if isinstance(values, dict):
+            for label, value in values.items():
+                lines.append(f'{self.name}{{name="{label}"}} {value}')
+        else:
+            lines.append(f"{self.name} {values}")
+        return lines
+
+
+def _labels(names, values):
+    return ",".join(f'{k}="{str(v)}"' for k, v in zip(names, values))
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    async def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            rendered = metric.render()
+            lines.extend(await rendered if inspect.isawaitable(rendered) else rendered)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+COMMAND_LATENCY = REGISTRY.register(Histogram(
+    "bot_command_duration_seconds", "Total app command handler time.", ("command", "outcome")))
+COMMAND_ACK = REGISTRY.register(Histogram(
+    "bot_command_ack_seconds", "Time from invocation until the interaction was deferred.", ("command",)))
+PANEL_LATENCY = REGISTRY.register(Histogram(
+    "panel_request_duration_seconds", "Panel API request latency.", ("method", "endpoint", "status")))
+PANEL_RETRIES = REGISTRY.register(Counter(
+    "panel_request_retries_total", "Panel API requests retried after a 429.", ("method", "endpoint")))
+PANEL_BYTES = REGISTRY.register(Counter(
+    "panel_response_bytes_total", "Bytes received from the panel API.", ("method", "endpoint")))
+PANEL_HEDGES = REGISTRY.register(Counter(
+    "panel_hedged_requests_total", "Hedged panel reads by which copy answered first.", ("endpoint", "winner")))
+SCHEDULE_RUNS = REGISTRY.register(Counter(
+    "schedule_runs_total", "Scheduled commands and power actions run, by action and outcome.", ("action", "outcome")))
+RECONCILE_DRIFT = REGISTRY.register(Counter(
+    "reconcile_drift_total", "Differences between the panel and the local DB fixed by the reconciler.", ("kind",)))
+JOB_LATENCY = REGISTRY.register(Histogram(
+    "bot_job_duration_seconds", "Time from enqueueing a background job until it finished.", ("kind", "outcome"),
+    JOB_BUCKETS))
+JOB_ATTEMPTS = REGISTRY.register(Counter(
+    "bot_job_attempts_total", "Background job attempts by outcome.", ("kind", "outcome")))
+
+
+def _slow(kind, duration, **fields):
+    if duration >= SLOW_CALL_THRESHOLD:
+        details = " ".join(f"{k}={v}" for k, v in fields.items())
+        log.warning("slow_call kind=%s duration_ms=%d %s", kind, duration * 1000, details)
+
+
+def observe_panel(method, endpoint, status, duration, size):
+    PANEL_LATENCY.observe(duration, method, endpoint, status)
+    PANEL_BYTES.inc(size, method, endpoint)
+    _slow("panel", duration, method=method, endpoint=endpoint, status=status)
+
+
+def command_started(interaction):
+    interaction.extras["started_at"] = time.perf_counter()
+
+
+def command_finished(interaction, outcome):
+    started = interaction.extras.get("started_at")
+    if started is None or interaction.command is None:
+        return
+    name = interaction.command.qualified_name
+    duration = time.perf_counter() - started
+    COMMAND_LATENCY.observe(duration, name, outcome)
+    _slow("command", duration, command=name, outcome=outcome, user=interaction.user.id)
+
+
+async def defer(interaction, **kwargs):
+    """Defer an interaction and record how long the handler took to get there."""
+    await interaction.response.defer(**kwargs)
+    started = interaction.extras.get("started_at")
+    if started is not None and interaction.command is not None:
+        COMMAND_ACK.observe(time.perf_counter() - started, interaction.command.qualified_name)
+
+
+async def start_server(port, host="127.0.0.1"):
+    async def handle(request):
+        return web.Response(text=await REGISTRY.render(), content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,229 @@
+import time
+
+# Each migration runs once, in order, inside the writer's transaction.
+# The schema version is tracked in SQLite's ``user_version`` pragma, so an
+# existing data/users.db is upgraded in place the next time the bot starts.
+
+
+def _v1_users(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            discord_id TEXT PRIMARY KEY,
+            panel_id INTEGER,
+            email TEXT,
+            servers TEXT DEFAULT '',
+            shared TEXT DEFAULT '',
+            banned INTEGER DEFAULT 0
+        )
+    ''')
+
+
+def _v2_normalize_servers(conn):
+    conn.execute('''
+        CREATE TABLE servers (
+            identifier TEXT PRIMARY KEY,
+            owner_id TEXT NOT NULL,
+            created_at INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX idx_servers_owner ON servers (owner_id)")
+    conn.execute('''
+        CREATE TABLE server_access (
+            server_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            PRIMARY KEY (server_id, user_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute("CREATE INDEX idx_server_access_user ON server_access (user_id)")
+
+    now = int(time.time())
+    for row in conn.execute("SELECT discord_id, servers, shared FROM users").fetchall():
+        for server_id in filter(None, (row[1] or "").split(",")):
+            conn.execute("INSERT OR IGNORE INTO servers VALUES (?, ?, ?)", (server_id, row[0], now))
+        for server_id in filter(None, (row[2] or "").split(",")):
+            conn.execute("INSERT OR IGNORE INTO server_access VALUES (?, ?)", (server_id, row[0]))
+
+    conn.execute('''
+        CREATE TABLE users_new (
+            discord_id TEXT PRIMARY KEY,
+            panel_id INTEGER,
+            email TEXT,
+            banned INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute("INSERT INTO users_new SELECT discord_id, panel_id, email, COALESCE(banned, 0) FROM users")
+    conn.execute("DROP TABLE users")
+    conn.execute("ALTER TABLE users_new RENAME TO users")
+
+
+def _v3_resource_samples(conn):
+    # Memory and disk in MiB, CPU in hundredths of a percent, network in
+    # KiB, state as a small integer: compact enough for one row per
+    # server per minute.
+    conn.execute('''
+        CREATE TABLE resource_samples (
+            server_id TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            state INTEGER NOT NULL,
+            memory INTEGER NOT NULL,
+            cpu INTEGER NOT NULL,
+            disk INTEGER NOT NULL,
+            rx INTEGER NOT NULL,
+            tx INTEGER NOT NULL,
+            PRIMARY KEY (server_id, ts)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE resource_rollups (
+            server_id TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            samples INTEGER NOT NULL,
+            running INTEGER NOT NULL,
+            memory_min INTEGER NOT NULL,
+            memory_sum INTEGER NOT NULL,
+            memory_max INTEGER NOT NULL,
+            cpu_min INTEGER NOT NULL,
+            cpu_sum INTEGER NOT NULL,
+            cpu_max INTEGER NOT NULL,
+            disk_min INTEGER NOT NULL,
+            disk_sum INTEGER NOT NULL,
+            disk_max INTEGER NOT NULL,
+            PRIMARY KEY (server_id, bucket)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _v4_meta(conn):
+    conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+
+def _v5_server_resources(conn):
+    # What the bot provisioned, so placement can account for CPU (which
+    # the panel does not track per node) and for its own recent creations.
+    conn.execute("ALTER TABLE servers ADD COLUMN node_id INTEGER")
+    conn.execute("ALTER TABLE servers ADD COLUMN memory INTEGER")
+    conn.execute("ALTER TABLE servers ADD COLUMN disk INTEGER")
+    conn.execute("ALTER TABLE servers ADD COLUMN cpu INTEGER")
+    conn.execute("CREATE INDEX idx_servers_node ON servers (node_id)")
+
+
+def _v6_jobs(conn):
+    conn.execute('''
+        CREATE TABLE jobs (
+            id INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            idempotency_key TEXT,
+            state TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL,
+            run_after REAL NOT NULL,
+            created_at REAL NOT NULL,
+            finished_at REAL,
+            result TEXT,
+            user_id TEXT,
+            application_id TEXT,
+            token TEXT,
+            token_expires REAL
+        )
+    ''')
+    conn.execute("CREATE INDEX idx_jobs_due ON jobs (state, run_after)")
+    # A key only has to be unique among jobs that have not finished, so
+    # the same action can be queued again once the previous one is done.
+    conn.execute("CREATE UNIQUE INDEX idx_jobs_key ON jobs (idempotency_key) WHERE state IN ('queued', 'running')")
+
+
+def _v7_events(conn):
+    conn.execute('''
+        CREATE TABLE events (
+            id INTEGER PRIMARY KEY,
+            ts INTEGER NOT NULL,
+            actor_id TEXT,
+            action TEXT NOT NULL,
+            server_id TEXT,
+            target_id TEXT,
+            detail TEXT,
+            outcome TEXT NOT NULL
+        )
+    ''')
+    # Queries page backwards by id, so each index ends in it.
+    conn.execute("CREATE INDEX idx_events_actor ON events (actor_id, id)")
+    conn.execute("CREATE INDEX idx_events_server ON events (server_id, id)")
+    conn.execute("CREATE INDEX idx_events_ts ON events (ts)")
+
+
+def _v8_server_sync(conn):
+    # Mirrors of panel fields, kept current by the reconciler.
+    conn.execute("ALTER TABLE servers ADD COLUMN name TEXT")
+    conn.execute("ALTER TABLE servers ADD COLUMN updated_at TEXT")
+
+
+def _v9_schedules(conn):
+    conn.execute('''
+        CREATE TABLE schedules (
+            id INTEGER PRIMARY KEY,
+            owner_id TEXT NOT NULL,
+            server_id TEXT NOT NULL,
+            cron TEXT NOT NULL,
+            action TEXT NOT NULL,
+            payload TEXT,
+            jitter INTEGER NOT NULL DEFAULT 0,
+            next_run REAL NOT NULL,
+            last_run REAL,
+            last_result TEXT,
+            created_at INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX idx_schedules_server ON schedules (server_id)")
+    conn.execute("CREATE INDEX idx_schedules_owner ON schedules (owner_id)")
+
+
+def _v10_panels(conn):
+    # NULL is the default panel, which everything before this lived on.
+    conn.execute("ALTER TABLE users ADD COLUMN panel TEXT")
+    conn.execute("ALTER TABLE servers ADD COLUMN panel TEXT")
+
+
+def _v11_processes(conn):
+    conn.execute('''
+        CREATE TABLE leases (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+    # Written in the same transaction as the change it describes, so other
+    # processes can drop what they have cached.
+    conn.execute('''
+        CREATE TABLE invalidations (
+            id INTEGER PRIMARY KEY,
+            origin TEXT NOT NULL,
+            scope TEXT NOT NULL,
+            key TEXT,
+            created_at REAL NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX idx_invalidations_created ON invalidations (created_at)")
+
+
+MIGRATIONS = [
+    _v1_users,
+    _v2_normalize_servers,
+    _v3_resource_samples,
+    _v4_meta,
+    _v5_server_resources,
+    _v6_jobs,
+    _v7_events,
+    _v8_server_sync,
+    _v9_schedules,
+    _v10_panels,
+    _v11_processes,
+]
+
+
+def migrate(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, step in enumerate(MIGRATIONS[version:], start=version + 1):
+        step(conn)
+        conn.execute(f"PRAGMA user_version = {number}")
+    return len(MIGRATIONS)
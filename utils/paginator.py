@@ -0,0 +1,227 @@
+import discord
+
+
+class PageSource:
+    """Where a PaginatedView gets its rows from.
+
+    ``fetch(cursor, limit, query)`` returns ``(items, next_cursor)`` where
+    ``next_cursor`` is ``None`` on the last page. Cursors are opaque to the
+    view: a keyset key for SQLite sources, a position for panel iterators.
+    """
+
+    title = "Results"
+
+    async def fetch(self, cursor, limit, query):
+        raise NotImplementedError
+
+    def format_item(self, item):
+        raise NotImplementedError
+
+
+class UserSource(PageSource):
+    title = "📋 Linked Users"
+
+    def __init__(self, db):
+        self.db = db
+
+    async def fetch(self, cursor, limit, query):
+        rows = await self.db.list_users_page(cursor, limit + 1, query)
+        more = len(rows) > limit
+        rows = rows[:limit]
+        return rows, rows[-1]["discord_id"] if more else None
+
+    def format_item(self, row):
+        return f"`{row['discord_id']}` | {row['email']}{' 🚫' if row['banned'] else ''}"
+
+
+class NodeServerSource(PageSource):
+    """Pages through a node's servers straight from the panel iterator.
+
+    Listing pages arrive in whatever order the panels answer, so a
+    restarted iterator would not repeat the same sequence. Everything
+    fetched for the current filter is kept instead, and moving back reads
+    from that; only a new filter starts the iterator again.
+    """
+
+    def __init__(self, api, node_id, panel=None):
+        self.api = api
+        self.node_id = node_id
+        self.panel = panel
+        self.title = f"🖥️ Servers on node {node_id}" + (f" ({panel})" if panel else "")
+        self._iter = None
+        self._query = None
+        self._items = []
+        self._exhausted = False
+
+    async def _next(self):
+        while True:
+            server = await self._iter.__anext__()
+            if not self._query or self._query in server["identifier"] or self._query in server["name"].lower():
+                return server
+
+    async def fetch(self, cursor, limit, query):
+        cursor = cursor or 0
+        if self._iter is None or query != self._query:
+            if self._iter is not None:
+                await self._iter.aclose()
+            self._iter = self.api.iter_servers_on_node(self.node_id, self.panel)
+            self._query, self._items, self._exhausted = query, [], False
+        try:
+            # One past the page tells whether there is a next one.
+            while not self._exhausted and len(self._items) <= cursor + limit:
+                self._items.append(await self._next())
+        except StopAsyncIteration:
+            self._exhausted = True
+        more = len(self._items) > cursor + limit
+        return self._items[cursor:cursor + limit], cursor + limit if more else None
+
+    def format_item(self, server):
+        # Without a panel, every panel's node with this id is listed.
+        panel = f" · {server['panel']}" if server.get("panel") and not self.panel else ""
+        return f"`{server['identifier']}` — {server['name']}{panel}"
+
+
+class AuditSource(PageSource):
+    """Audit events, newest first, optionally narrowed to one actor or server.
+
+    The view's free-text filter matches action names by prefix.
+    """
+
+    def __init__(self, db, actor_id=None, server_id=None):
+        self.db = db
+        self.actor_id = actor_id
+        self.server_id = server_id
+        self.title = "📜 Audit Log"
+
+    async def fetch(self, cursor, limit, query):
+        rows = await self.db.events_page(cursor, limit + 1, self.actor_id, self.server_id, query)
+        more = len(rows) > limit
+        rows = rows[:limit]
+        return rows, rows[-1]["id"] if more else None
+
+    def format_item(self, row):
+        actor = f"<@{row['actor_id']}>" if row["actor_id"] else "system"
+        parts = [f"<t:{row['ts']}:f>", actor, f"`{row['action']}`"]
+        if row["server_id"]:
+            parts.append(f"`{row['server_id']}`")
+        if row["target_id"]:
+            parts.append(f"→ <@{row['target_id']}>")
+        if row["outcome"] != "ok":
+            parts.append(f"[{row['outcome']}]")
+        line = " ".join(parts)
+        if row["detail"]:
+            line += f" — {row['detail'][:80]}"
+        return line
+
+
+class _JumpModal(discord.ui.Modal, title="Jump to page"):
+    page = discord.ui.TextInput(label="Page number", max_length=6)
+
+    def __init__(self, view):
+        super().__init__()
+        self.view = view
+
+    async def on_submit(self, interaction: discord.Interaction):
+        target = int(self.page.value) - 1 if self.page.value.isdigit() else self.view.page
+        await self.view.show(interaction, max(target, 0))
+
+
+class _FilterModal(discord.ui.Modal, title="Filter results"):
+    query = discord.ui.TextInput(label="Contains (leave empty to clear)", required=False, max_length=100)
+
+    def __init__(self, view):
+        super().__init__()
+        self.view = view
+
+    async def on_submit(self, interaction: discord.Interaction):
+        self.view.reset(self.query.value.strip().lower() or None)
+        await self.view.show(interaction, 0)
+
+
+class PaginatedView(discord.ui.View):
+    """Data-driven pager: fetches one page at a time and caches only nearby pages.
+
+    Only the cursor that starts each visited page is remembered, so jumping
+    ahead walks forward from the furthest known cursor while keeping at
+    most ``radius`` pages of rows on either side of the current one.
+    """
+
+    def __init__(self, source, owner_id, per_page=15, radius=2, timeout=180):
+        super().__init__(timeout=timeout)
+        self.source = source
+        self.owner_id = owner_id
+        self.per_page = per_page
+        self.radius = radius
+        self.reset(None)
+
+    def reset(self, query):
+        self.query = query
+        self.page = 0
+        self.cursors = [None]
+        self.pages = {}
+        self.last_page = None
+
+    async def _load(self, index):
+        if index in self.pages:
+            return self.pages[index]
+        while len(self.cursors) <= index:
+            known = len(self.cursors) - 1
+            if self.last_page is not None and known >= self.last_page:
+                break
+            await self._load(known)
+        index = min(index, len(self.cursors) - 1)
+        items, next_cursor = await self.source.fetch(self.cursors[index], self.per_page, self.query)
+        self.pages[index] = items
+        if next_cursor is None:
+            self.last_page = index
+        elif len(self.cursors) == index + 1:
+            self.cursors.append(next_cursor)
+        return items
+
+    async def render(self, index):
+        if self.last_page is not None:
+            index = min(index, self.last_page)
+        items = await self._load(index)
+        index = min(index, len(self.cursors) - 1)
+        self.page = index
+        for key in [k for k in self.pages if abs(k - index) > self.radius]:
+            del self.pages[key]
+
+        body = "\n".join(self.source.format_item(item) for item in items) or "No results."
+        embed = discord.Embed(title=self.source.title, description=body[:4000], color=discord.Color.blurple())
+        total = f"{self.last_page + 1}" if self.last_page is not None else "?"
+        footer = f"Page {index + 1}/{total}"
+        if self.query:
+            footer += f" · filter: {self.query}"
+        embed.set_footer(text=footer)
+        self.first.disabled = self.previous.disabled = index == 0
+        self.next.disabled = self.last_page is not None and index >= self.last_page
+        return embed
+
+    async def show(self, interaction: discord.Interaction, index):
+        await interaction.response.defer()
+        embed = await self.render(index)
+        await interaction.edit_original_response(embed=embed, view=self)
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.owner_id
+
+    @discord.ui.button(label="⏮️", style=discord.ButtonStyle.gray)
+    async def first(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, 0)
+
+    @discord.ui.button(label="◀️ Previous", style=discord.ButtonStyle.gray)
+    async def previous(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, self.page - 1)
+
+    @discord.ui.button(label="Next ▶️", style=discord.ButtonStyle.gray)
+    async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, self.page + 1)
+
+    @discord.ui.button(label="🔢 Jump", style=discord.ButtonStyle.blurple)
+    async def jump(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.send_modal(_JumpModal(self))
+
+    @discord.ui.button(label="🔍 Filter", style=discord.ButtonStyle.blurple)
+    async def filter(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.send_modal(_FilterModal(self))
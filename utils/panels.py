@@ -0,0 +1,241 @@
+import asyncio
+import json
+import logging
+import os
+
+from utils.ptero_api import PteroAPI, PER_PAGE, PAGE_CONCURRENCY
+from utils.ratelimit import PRIORITY_DEFAULT
+
+# Calls whose first argument is a server identifier; they go to the panel
+# that server lives on.
+SERVER_METHODS = (
+    "send_power_action", "get_server_status", "get_server_info", "send_command", "send_commands", "rename_server",
+    "wipe_server", "create_backup", "list_backups", "get_backup_download_url", "delete_backup", "delete_server",
+    "suspend_server", "unsuspend_server", "update_limits",
+)
+log = logging.getLogger("ptero.panels")
+
+# Items buffered per merged listing before the panels producing them wait.
+MERGE_BUFFER = 256
+
+
+def _log_failure(task):
+    if not task.cancelled() and task.exception() is not None:
+        log.warning("Could not share a cache invalidation: %s", task.exception())
+
+
+class PanelRouter:
+    """Fronts one or more panels behind the PteroAPI interface.
+
+    Each panel is its own PteroAPI with its own connection pool, rate-limit
+    budget, breakers and cache. Server calls go to the panel the server
+    lives on, as recorded in the DB and learned from listings; account and
+    server creation name the panel. Listings are fetched from every panel
+    at once and merged, each item tagged with its ``panel``.
+
+    Methods take a panel by name. The first panel is the default; the DB
+    stores it as NULL (see ``key``), so everything written before
+    ``PANELS`` was set keeps pointing at it.
+    """
+
+    def __init__(self, panels):
+        self.panels = panels
+        self.default = next(iter(panels))
+        # server identifier -> panel key, for servers not on the default.
+        self.server_panels = {}
+
+    @classmethod
+    def from_env(cls):
+        # PANELS=eu,us reads PANEL_EU_URL, PANEL_EU_CLIENT_KEY,
+        # PANEL_EU_ADMIN_KEY and optionally PANEL_EU_CLIENT_RATELIMIT /
+        # PANEL_EU_APPLICATION_RATELIMIT for each name.
+        names = [n.strip() for n in os.getenv("PANELS", "").split(",") if n.strip()]
+        if not names:
+            return cls({"default": PteroAPI()})
+        panels = {}
+        for name in names:
+            prefix = f"PANEL_{name.upper()}_"
+            if not os.getenv(prefix + "URL"):
+                raise RuntimeError(f"{prefix}URL is not set")
+            panels[name] = PteroAPI(os.getenv(prefix + "URL"), os.getenv(prefix + "CLIENT_KEY"),
+                                    os.getenv(prefix + "ADMIN_KEY"), name=name,
+                                    client_ratelimit=os.getenv(prefix + "CLIENT_RATELIMIT"),
+                                    application_ratelimit=os.getenv(prefix + "APPLICATION_RATELIMIT"))
+        return cls(panels)
+
+    async def start(self):
+        await asyncio.gather(*(api.start() for api in self.panels.values()))
+
+    async def close(self):
+        await asyncio.gather(*(api.close() for api in self.panels.values()))
+
+    def key(self, name):
+        """The value stored in the DB for panel ``name``."""
+        return None if name in (None, self.default) else name
+
+    def get(self, panel):
+        return self.panels[panel or self.default]
+
+    def for_server(self, server_id):
+        return self.get(self.server_panels.get(server_id))
+
+    def _tag(self, name, item):
+        return dict(item, panel=self.key(name))
+
+    # --- shared state --------------------------------------------------
+
+    @property
+    def panel_url(self):
+        return self.panels[self.default].panel_url
+
+    @property
+    def session(self):
+        # Backup downloads follow signed absolute URLs, so any pool will do.
+        return self.panels[self.default].session
+
+    def _stats(self, method):
+        stats = []
+        for name, api in self.panels.items():
+            for s in getattr(api, method)():
+                stats.append(dict(s, name=f"{name}/{s['name']}") if len(self.panels) > 1 else s)
+        return stats
+
+    def breaker_stats(self):
+        return self._stats("breaker_stats")
+
+    def limiter_stats(self):
+        return self._stats("limiter_stats")
+
+    def share_invalidations(self, db):
+        """Pass every panel cache invalidation on to the other processes through ``db``."""
+        for name, api in self.panels.items():
+            api.cache.on_invalidate = lambda what, value, name=name: self._publish(db, name, what, value)
+
+    @staticmethod
+    def _publish(db, name, what, value):
+        task = asyncio.ensure_future(db.publish("cache", json.dumps([name, what, value])))
+        task.add_done_callback(_log_failure)
+
+    def apply_invalidations(self, keys):
+        """Coherence handler for the ``cache`` scope."""
+        if keys is None:
+            for api in self.panels.values():
+                api.cache.clear()
+            return
+        for key in keys:
+            name, what, value = json.loads(key)
+            if name in self.panels:
+                self.panels[name].cache.apply(what, value)
+
+    def cache_stats(self):
+        totals = {}
+        for api in self.panels.values():
+            for k, v in api.cache_stats().items():
+                totals[k] = totals.get(k, 0) + v
+        return totals
+
+    # --- single panel --------------------------------------------------
+
+    async def create_account(self, email, password, username, panel=None):
+        created = await self.get(panel).create_account(email, password, username)
+        return self._tag(panel, created) if created else None
+
+    async def create_server(self, user_id, ram, disk, cpu, node_id=None, external_id=None, panel=None):
+        server = await self.get(panel).create_server(user_id, ram, disk, cpu, node_id, external_id)
+        if server is None:
+            return None
+        if self.key(panel) is not None:
+            self.server_panels[server["identifier"]] = self.key(panel)
+        return self._tag(panel, server)
+
+    async def get_server_by_external_id(self, external_id, panel=None):
+        server = await self.get(panel).get_server_by_external_id(external_id)
+        return self._tag(panel, server) if server else None
+
+    async def get_websocket_credentials(self, server_id):
+        api = self.for_server(server_id)
+        creds = await api.get_websocket_credentials(server_id)
+        return dict(creds, origin=api.panel_url) if creds else None
+
+    async def get_node_status(self, node_id: int, panel=None):
+        return await self.get(panel).get_node_status(node_id)
+
+    # --- every panel ---------------------------------------------------
+
+    async def _merged(self, listing):
+        """Yield ``(name, item)`` from ``listing(api)`` on every panel, interleaved as pages arrive."""
+        if len(self.panels) == 1:
+            name, api = next(iter(self.panels.items()))
+            async for item in listing(api):
+                yield name, item
+            return
+        queue = asyncio.Queue(MERGE_BUFFER)
+        finished = object()
+
+        async def pump(name, api):
+            try:
+                async for item in listing(api):
+                    await queue.put((name, item))
+                await queue.put((name, finished))
+            except Exception as e:
+                await queue.put((name, e))
+
+        tasks = [asyncio.ensure_future(pump(name, api)) for name, api in self.panels.items()]
+        try:
+            remaining = len(tasks)
+            while remaining:
+                name, item = await queue.get()
+                if item is finished:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield name, item
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def iter_servers(self, filters=None, per_page=PER_PAGE, concurrency=PAGE_CONCURRENCY,
+                           priority=PRIORITY_DEFAULT, strict=False):
+        listing = lambda api: api.iter_servers(filters, per_page, concurrency, priority, strict)
+        async for name, server in self._merged(listing):
+            key = self.key(name)
+            if key is None:
+                self.server_panels.pop(server["identifier"], None)
+            else:
+                self.server_panels[server["identifier"]] = key
+            yield dict(server, panel=key)
+
+    async def iter_users(self, filters=None, per_page=PER_PAGE, concurrency=PAGE_CONCURRENCY,
+                         priority=PRIORITY_DEFAULT, strict=False):
+        listing = lambda api: api.iter_users(filters, per_page, concurrency, priority, strict)
+        async for name, user in self._merged(listing):
+            yield self._tag(name, user)
+
+    async def list_nodes(self):
+        results = await asyncio.gather(*(api.list_nodes() for api in self.panels.values()))
+        return [self._tag(name, node) for name, nodes in zip(self.panels, results) for node in nodes]
+
+    async def iter_servers_on_node(self, node_id: int, panel=None, **kwargs):
+        # Node ids are only unique within a panel; without one, every
+        # panel's node with that id is listed.
+        if panel is not None or len(self.panels) == 1:
+            async for server in self.get(panel).iter_servers_on_node(node_id, **kwargs):
+                yield self._tag(panel, server)
+            return
+        async for name, server in self._merged(lambda api: api.iter_servers_on_node(node_id, **kwargs)):
+            yield self._tag(name, server)
+
+    async def list_servers_on_node(self, node_id: int, panel=None):
+        return [s["identifier"] async for s in self.iter_servers_on_node(node_id, panel)]
+
+
+def _routed(method):
+    async def call(self, server_id, *args, **kwargs):
+        return await getattr(self.for_server(server_id), method)(server_id, *args, **kwargs)
+    call.__name__ = method
+    return call
+
+
+for _method in SERVER_METHODS:
+    setattr(PanelRouter, _method, _routed(_method))
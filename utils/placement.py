@@ -0,0 +1,138 @@
+import asyncio
+import os
+import time
+from collections import namedtuple
+
+Decision = namedtuple("Decision", "node_id name score reason candidates")
+
+
+class NodeCapacity:
+    def __init__(self, node, provisioned, cpu_capacity):
+        self.node_id = node["id"]
+        self.name = node["name"]
+        allocated = node.get("allocated_resources") or {}
+        self.memory_total = _effective(node["memory"], node.get("memory_overallocate", 0))
+        self.disk_total = _effective(node["disk"], node.get("disk_overallocate", 0))
+        self.cpu_total = cpu_capacity or float("inf")
+        self.memory_used = allocated.get("memory", provisioned["memory"] if provisioned else 0) or 0
+        self.disk_used = allocated.get("disk", provisioned["disk"] if provisioned else 0) or 0
+        self.cpu_used = (provisioned["cpu"] if provisioned else 0) or 0
+        self.maintenance = node.get("maintenance_mode", False)
+
+    def headroom(self, memory, disk, cpu, reserved):
+        """Fraction of each bounded resource left after placing the request, or None if it does not fit."""
+        left = []
+        for total, used, pending, wanted in ((self.memory_total, self.memory_used, reserved[0], memory),
+                                             (self.disk_total, self.disk_used, reserved[1], disk),
+                                             (self.cpu_total, self.cpu_used, reserved[2], cpu)):
+            if total == float("inf"):
+                continue
+            free = total - used - pending - wanted
+            if free < 0:
+                return None
+            left.append(free / total if total else 0.0)
+        return left
+
+
+def _effective(total, overallocate):
+    # -1 disables the panel's limit check for that resource entirely.
+    if overallocate is not None and overallocate < 0:
+        return float("inf")
+    return total * (1 + (overallocate or 0) / 100)
+
+
+class Reservation:
+    def __init__(self, engine, node_id, amounts):
+        self.engine = engine
+        self.node_id = node_id
+        self.amounts = amounts
+        self.active = True
+
+    def commit(self):
+        # Keep counting it until a refresh picks the new server up from the panel.
+        if self.active:
+            self.engine._committed.append((time.monotonic(), self.node_id, self.amounts))
+            self.release()
+
+    def release(self):
+        if self.active:
+            self.active = False
+            self.engine._release(self.node_id, self.amounts)
+
+
+class PlacementEngine:
+    """Picks a node for new servers from a cached view of node capacity.
+
+    Capacity comes from the panel's node listing (allocated memory and
+    disk) plus what the bot itself provisioned (CPU, which the panel does
+    not track per node). Reservations are taken synchronously after
+    scoring, so concurrent creations cannot both claim the last slot.
+    Node ids are per panel, so there is one engine per panel.
+    """
+
+    def __init__(self, api, db, strategy=None, ttl=60, panel=None):
+        self.api = api
+        self.db = db
+        self.panel = panel
+        self.strategy = strategy or os.getenv("PLACEMENT_STRATEGY", "best-fit")
+        self.cpu_capacity = int(os.getenv("NODE_CPU_CAPACITY", 0))
+        self.ttl = ttl
+        self.nodes = {}
+        self._reserved = {}
+        self._committed = []
+        self._refreshed = 0.0
+        self._lock = asyncio.Lock()
+
+    async def refresh(self, force=False):
+        async with self._lock:
+            if not force and time.monotonic() - self._refreshed < self.ttl:
+                return
+            started = time.monotonic()
+            nodes = await self.api.list_nodes()
+            provisioned = await self.db.provisioned_by_node(self.panel)
+            if nodes:
+                self.nodes = {n["id"]: NodeCapacity(n, provisioned.get(n["id"]), self.cpu_capacity) for n in nodes}
+            self._committed = [c for c in self._committed if c[0] >= started]
+            self._refreshed = started
+
+    def pending(self, node_id):
+        reserved = list(self._reserved.get(node_id, (0, 0, 0)))
+        for _, committed_node, amounts in self._committed:
+            if committed_node == node_id:
+                reserved = [a + b for a, b in zip(reserved, amounts)]
+        return reserved
+
+    def _release(self, node_id, amounts):
+        current = self._reserved.get(node_id, (0, 0, 0))
+        self._reserved[node_id] = tuple(a - b for a, b in zip(current, amounts))
+
+    def _score(self, left):
+        if self.strategy == "least-loaded":
+            # Prefer the node whose scarcest resource has the most room left.
+            return -min(left, default=1.0)
+        # Best fit: prefer the node the request fills most tightly, keeping
+        # large contiguous headroom free elsewhere.
+        return sum(left) / len(left) if left else 0.0
+
+    def decide(self, memory, disk, cpu):
+        candidates = []
+        for node in self.nodes.values():
+            if node.maintenance:
+                candidates.append((node, None, "maintenance"))
+                continue
+            left = node.headroom(memory, disk, cpu, self.pending(node.node_id))
+            candidates.append((node, None if left is None else self._score(left), "full" if left is None else "fits"))
+        fitting = [c for c in candidates if c[1] is not None]
+        if not fitting:
+            return Decision(None, None, None, "no node has enough free capacity", candidates)
+        node, score, _ = min(fitting, key=lambda c: c[1])
+        return Decision(node.node_id, node.name, score, self.strategy, candidates)
+
+    async def reserve(self, memory, disk, cpu):
+        await self.refresh()
+        decision = self.decide(memory, disk, cpu)
+        if decision.node_id is None:
+            return decision, None
+        current = self._reserved.get(decision.node_id, (0, 0, 0))
+        self._reserved[decision.node_id] = (current[0] + memory, current[1] + disk, current[2] + cpu)
+        return decision, Reservation(self, decision.node_id, (memory, disk, cpu))
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import os
+import random
+import time
+
+from utils.breaker import PanelUnavailable
+from utils.ratelimit import PRIORITY_BACKGROUND
+
+log = logging.getLogger("ptero.poller")
+
+STATES = {"offline": 0, "starting": 1, "running": 2, "stopping": 3}
+
+RAW_RETENTION = 24 * 3600
+ROLLUP_RETENTION = 7 * 24 * 3600
+COMPACT_EVERY = 600
+
+
+class ResourcePoller:
+    """Samples /resources for every registered server on a fixed cadence.
+
+    Each cycle spreads its requests over the first part of the interval and
+    runs at most ``concurrency`` at once, so the panel sees a steady trickle
+    rather than a burst every minute.
+    """
+
+    def __init__(self, db, api, interval=None, concurrency=8, jitter=0.2):
+        self.db = db
+        self.api = api
+        self.interval = interval or int(os.getenv("RESOURCE_POLL_INTERVAL", 60))
+        self.concurrency = concurrency
+        self.jitter = jitter
+        self.last_cycle = None
+        self._task = None
+        self._last_compact = 0.0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                await self.poll_once()
+                if started - self._last_compact > COMPACT_EVERY:
+                    now = int(time.time())
+                    await self.db.compact_resources(now - RAW_RETENTION, now - ROLLUP_RETENTION)
+                    self._last_compact = started
+            except Exception:
+                log.exception("Resource poll failed")
+            elapsed = time.monotonic() - started
+            delay = self.interval * (1 + random.uniform(-self.jitter, self.jitter)) - elapsed
+            await asyncio.sleep(max(delay, 1))
+
+    async def poll_once(self):
+        server_ids = await self.db.get_all_server_ids()
+        sem = asyncio.Semaphore(self.concurrency)
+        spread = self.interval * self.jitter
+
+        async def sample(server_id):
+            await asyncio.sleep(random.uniform(0, spread))
+            async with sem:
+                try:
+                    data = await self.api.get_server_status(server_id, priority=PRIORITY_BACKGROUND)
+                except PanelUnavailable:
+                    return None
+                except Exception:
+                    log.exception("Could not sample %s", server_id)
+                    return None
+            if not data:
+                return None
+            try:
+                attrs = data["attributes"]
+                usage = attrs["resources"]
+                return (
+                    server_id,
+                    int(time.time()),
+                    STATES.get(attrs["current_state"], 0),
+                    usage["memory_bytes"] >> 20,
+                    round(usage["cpu_absolute"] * 100),
+                    usage["disk_bytes"] >> 20,
+                    usage["network_rx_bytes"] >> 10,
+                    usage["network_tx_bytes"] >> 10,
+                )
+            except (KeyError, TypeError, ValueError):
+                log.warning("Unexpected resources payload for %s", server_id)
+                return None
+
+        results = await asyncio.gather(*(sample(s) for s in server_ids))
+        samples = [r for r in results if r is not None]
+        if samples:
+            await self.db.add_resource_samples(samples)
+        self.last_cycle = (len(server_ids), len(samples))
+        return samples
@@ -1,23 +1,219 @@
-import aiohttp
-import os
+import asyncio
 import json
+import os
+import random
+import time
+from collections import defaultdict, deque, namedtuple
+
+import aiohttp
+
+from utils import metrics
+from utils.breaker import BreakerSet
+from utils.cache import TTLCache
+from utils.ratelimit import RateLimiter, PRIORITY_ADMIN, PRIORITY_DEFAULT
+
+DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=15, connect=5, sock_read=10)
 
-PANEL_URL = os.getenv("PANEL_URL")
-CLIENT_API_KEY = os.getenv("CLIENT_API_KEY")
-ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+# Routes that are expected to be fast get a tighter budget so a hung panel
+# is noticed quickly; long-running operations get a looser one.
+TIMEOUTS = {
+    "/api/client/servers/{server}/resources": aiohttp.ClientTimeout(total=5, connect=3),
+    "/api/client/servers/{server}": aiohttp.ClientTimeout(total=5, connect=3),
+    "/api/client/servers/{server}/power": aiohttp.ClientTimeout(total=10, connect=3),
+    "/api/client/servers/{server}/command": aiohttp.ClientTimeout(total=10, connect=3),
+    "/api/client/servers/{server}/files/delete": aiohttp.ClientTimeout(total=60, connect=5),
+    "/api/client/servers/{server}/backups": aiohttp.ClientTimeout(total=30, connect=5),
+    "/api/client/servers/{server}/backups/{backup}/download": aiohttp.ClientTimeout(total=10, connect=3),
+    "/api/application/servers": aiohttp.ClientTimeout(total=30, connect=5),
+    "/api/application/servers/{server}/force": aiohttp.ClientTimeout(total=60, connect=5),
+    "/api/application/nodes/{node}/allocations": aiohttp.ClientTimeout(total=10, connect=3),
+}
+
+# (fresh seconds, extra seconds a stale value may be served while refreshing)
+CACHE_TTLS = {
+    "resources": (3, 15),
+    "server": (60, 300),
+    "node": (30, 120),
+}
+
+PER_PAGE = int(os.getenv("PANEL_PER_PAGE", 100))
+PAGE_CONCURRENCY = 4
 
-HEADERS = {
-    "Content-Type": "application/json",
-    "Accept": "application/json",
-    "Authorization": f"Bearer {CLIENT_API_KEY}"
+# Routes the panel forwards to the server's Wings daemon.
+WINGS_ROUTES = {
+    "/api/client/servers/{server}/resources",
+    "/api/client/servers/{server}/power",
+    "/api/client/servers/{server}/command",
+    "/api/client/servers/{server}/files/delete",
+    "/api/client/servers/{server}/backups",
 }
 
-ADMIN_HEADERS = HEADERS.copy()
-ADMIN_HEADERS["Authorization"] = f"Bearer {ADMIN_API_KEY}"
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY = 0.05
+
+MAX_RETRIES = 3
+RETRY_BASE = 1.0
+
+Response = namedtuple("Response", "status data headers")
+
+
+class IncompleteListing(Exception):
+    """A strict listing could not fetch every page."""
+
 
 class PteroAPI:
-    def __init__(self):
-        self.session = aiohttp.ClientSession()
+    def __init__(self, panel_url=None, client_key=None, admin_key=None, limit_per_host=32, name=None,
+                 client_ratelimit=None, application_ratelimit=None):
+        self.name = name
+        self.panel_url = (panel_url or os.getenv("PANEL_URL", "")).rstrip("/")
+        client_key = client_key or os.getenv("CLIENT_API_KEY")
+        admin_key = admin_key or os.getenv("ADMIN_API_KEY")
+        self.headers = {"Authorization": f"Bearer {client_key}"}
+        self.admin_headers = {"Authorization": f"Bearer {admin_key}"}
+        self.limit_per_host = limit_per_host
+        self.session = None
+        # Pterodactyl's defaults are 720/min for client keys and 240/min for
+        # application keys; override to match the panel's configuration.
+        # Every bot process uses the same keys, so each takes its share.
+        share = int(os.getenv("BOT_PROCESSES", 1))
+        self.limiters = {
+            "client": RateLimiter("client", int(client_ratelimit or os.getenv("CLIENT_RATELIMIT", 720)), share=share),
+            "application": RateLimiter("application",
+                                       int(application_ratelimit or os.getenv("APPLICATION_RATELIMIT", 240)),
+                                       share=share),
+        }
+        self.cache = TTLCache(maxsize=int(os.getenv("PANEL_CACHE_SIZE", 4096)))
+        # Allocations handed to in-flight creations, so two concurrent
+        # creations on one node don't both grab the same free port.
+        self.claimed_allocations = set()
+        self.breakers = BreakerSet(name)
+        # server identifier -> node id, learned from server listings.
+        self.server_nodes = {}
+        self._latencies = defaultdict(lambda: deque(maxlen=200))
+
+    async def start(self):
+        # The session must be created inside the running loop, so this is
+        # called from the bot's startup instead of __init__.
+        if self.session is not None and not self.session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.limit_per_host * 2,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=300,
+            keepalive_timeout=60,
+            enable_cleanup_closed=True,
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=DEFAULT_TIMEOUT,
+            headers={"Content-Type": "application/json", "Accept": "application/json"},
+        )
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+            # Give the connector a moment to close TLS transports cleanly.
+            await asyncio.sleep(0.25)
+
+    def _breaker(self, route, admin, path):
+        # Server routes that the panel proxies to Wings are charged to that
+        # server's node, so one dead node doesn't trip the whole client API.
+        node_id = self.server_nodes.get(path.get("server")) if route in WINGS_ROUTES else None
+        if node_id is not None:
+            return self.breakers.node(node_id)
+        return self.breakers.breakers["application" if admin else "client"]
+
+    async def _request(self, method, route, *, admin=False, json_body=None, params=None,
+                       priority=PRIORITY_DEFAULT, hedge=False, **path):
+        breaker = self._breaker(route, admin, path)
+        probe = breaker.check()
+        try:
+            if hedge and method == "GET":
+                return await self._hedged(breaker, route, admin, params, priority, path)
+            return await self._send(breaker, method, route, admin, json_body, params, priority, path)
+        finally:
+            if probe:
+                breaker.release()
+
+    async def _send(self, breaker, method, route, admin, json_body, params, priority, path):
+        url = self.panel_url + route.format(**path)
+        headers = self.admin_headers if admin else self.headers
+        timeout = TIMEOUTS.get(route, DEFAULT_TIMEOUT)
+        limiter = self.limiters["application" if admin else "client"]
+        for attempt in range(MAX_RETRIES + 1):
+            await limiter.acquire(priority)
+            started = time.perf_counter()
+            try:
+                async with self.session.request(method, url, headers=headers, json=json_body,
+                                                params=params, timeout=timeout) as r:
+                    limiter.update(r.headers)
+                    if r.status == 429 and attempt < MAX_RETRIES:
+                        metrics.observe_panel(method, route, 429, time.perf_counter() - started, 0)
+                        metrics.PANEL_RETRIES.inc(1, method, route)
+                        retry_after = r.headers.get("Retry-After", "")
+                        backoff = RETRY_BASE * 2 ** attempt
+                        delay = float(retry_after) if retry_after.isdigit() else backoff
+                        limiter.pause(delay)
+                        await asyncio.sleep(delay + random.uniform(0, backoff))
+                        continue
+                    body = await r.read()
+                    duration = time.perf_counter() - started
+                    metrics.observe_panel(method, route, r.status, duration, len(body))
+                    breaker.record(r.status < 500, duration)
+                    if r.status < 500:
+                        self._latencies[route].append(duration)
+                    data = json.loads(body) if body else None
+                    return Response(r.status, data, r.headers)
+            except (aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError):
+                duration = time.perf_counter() - started
+                metrics.observe_panel(method, route, 0, duration, 0)
+                breaker.record(False, duration)
+                return Response(0, None, {})
+
+    def _hedge_delay(self, route):
+        samples = self._latencies[route]
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return max(sorted(samples)[int(len(samples) * 0.95)], HEDGE_MIN_DELAY)
+
+    async def _hedged(self, breaker, route, admin, params, priority, path):
+        """GET with a second copy sent if the first is slower than this route's p95."""
+        send = lambda: self._send(breaker, "GET", route, admin, None, params, priority, path)
+        first = asyncio.ensure_future(send())
+        delay = self._hedge_delay(route)
+        tasks = {first}
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                limiter = self.limiters["application" if admin else "client"]
+                # Only hedge with spare budget; under load it would just
+                # double the queue.
+                if not done and limiter.has_spare():
+                    tasks.add(asyncio.ensure_future(send()))
+            while True:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    r = task.result()
+                    if 0 < r.status < 500 or not tasks:
+                        if delay is not None and (tasks or task is not first):
+                            metrics.PANEL_HEDGES.inc(1, route, "first" if task is first else "hedge")
+                        return r
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def breaker_stats(self):
+        return self.breakers.stats()
+
+    def limiter_stats(self):
+        return [limiter.stats() for limiter in self.limiters.values()]
+
+    def cache_stats(self):
+        return self.cache.stats()
+
+    async def _cached(self, kind, obj, fetch):
+        ttl, stale = CACHE_TTLS[kind]
+        return await self.cache.get_or_fetch((kind, obj), fetch, ttl, stale)
 
     async def create_account(self, email, password, username):
         payload = {
@@ -27,60 +223,84 @@ class PteroAPI:
             "last_name": "Bot",
             "password": password
         }
-        async with self.session.post(f"{PANEL_URL}/api/application/users", headers=ADMIN_HEADERS, json=payload) as r:
-            if r.status == 201:
-                return await r.json()
-            return None
+        r = await self._request("POST", "/api/application/users", admin=True, json_body=payload)
+        return r.data["attributes"] if r.status == 201 else None
 
-    async def send_power_action(self, server_id, signal):
-        async with self.session.post(f"{PANEL_URL}/api/client/servers/{server_id}/power", headers=HEADERS, json={"signal": signal}) as r:
-            return r.status == 204
+    async def send_power_action(self, server_id, signal, priority=PRIORITY_DEFAULT):
+        r = await self._request("POST", "/api/client/servers/{server}/power", server=server_id,
+                                json_body={"signal": signal}, priority=priority)
+        self.cache.invalidate(("resources", server_id))
+        return r.status == 204
 
-    async def get_server_status(self, server_id):
-        async with self.session.get(f"{PANEL_URL}/api/client/servers/{server_id}/resources", headers=HEADERS) as r:
-            if r.status == 200:
-                return await r.json()
-            return None
+    async def get_server_status(self, server_id, priority=PRIORITY_DEFAULT):
+        async def fetch():
+            r = await self._request("GET", "/api/client/servers/{server}/resources", server=server_id,
+                                    priority=priority, hedge=True)
+            return r.data if r.status == 200 else None
+        return await self._cached("resources", server_id, fetch)
 
-    async def get_server_info(self, server_id):
-        async with self.session.get(f"{PANEL_URL}/api/client/servers/{server_id}", headers=HEADERS) as r:
-            return await r.json() if r.status == 200 else None
+    async def get_server_info(self, server_id, priority=PRIORITY_DEFAULT):
+        async def fetch():
+            r = await self._request("GET", "/api/client/servers/{server}", server=server_id, priority=priority,
+                                    hedge=True)
+            return r.data if r.status == 200 else None
+        return await self._cached("server", server_id, fetch)
 
-    async def send_command(self, server_id, command):
-        async with self.session.post(f"{PANEL_URL}/api/client/servers/{server_id}/command", headers=HEADERS, json={"command": command}) as r:
-            return r.status == 204
+    async def send_command(self, server_id, command, priority=PRIORITY_DEFAULT):
+        r = await self._request("POST", "/api/client/servers/{server}/command", server=server_id,
+                                json_body={"command": command}, priority=priority)
+        return r.status == 204
 
-    async def get_logs(self, server_id):
-        async with self.session.get(f"{PANEL_URL}/api/client/servers/{server_id}/logs", headers=HEADERS) as r:
-            if r.status == 200:
-                data = await r.json()
-                return data.get("data", "")
-            return None
+    async def send_commands(self, server_id, commands, priority=PRIORITY_DEFAULT):
+        """Send ``commands`` in order, stopping at the first failure; returns how many went through."""
+        # One after the other so the console sees them in order; the
+        # session's keep-alive pool carries them over the same connection.
+        for sent, command in enumerate(commands):
+            if not await self.send_command(server_id, command, priority=priority):
+                return sent
+        return len(commands)
+
+    async def get_websocket_credentials(self, server_id):
+        r = await self._request("GET", "/api/client/servers/{server}/websocket", server=server_id)
+        return r.data["data"] if r.status == 200 else None
 
     async def rename_server(self, server_id, name):
-        async with self.session.patch(f"{PANEL_URL}/api/application/servers/{server_id}/details", headers=ADMIN_HEADERS,
-                                      json={"name": name, "external_id": None}) as r:
-            return r.status == 200
+        r = await self._request("PATCH", "/api/application/servers/{server}/details", admin=True, server=server_id,
+                                json_body={"name": name, "external_id": None})
+        self.cache.invalidate(("server", server_id))
+        return r.status == 200
 
     async def wipe_server(self, server_id):
-        async with self.session.post(f"{PANEL_URL}/api/client/servers/{server_id}/files/delete", headers=HEADERS,
-                                     json={"root": "/", "files": ["*"]}) as r:
-            return r.status == 204
-
-    async def create_backup(self, server_id):
-        async with self.session.post(f"{PANEL_URL}/api/client/servers/{server_id}/backups", headers=HEADERS) as r:
-            return await r.json() if r.status == 201 else None
-
-    async def list_backups(self, server_id):
-        async with self.session.get(f"{PANEL_URL}/api/client/servers/{server_id}/backups", headers=HEADERS) as r:
-            if r.status == 200:
-                data = await r.json()
-                return [{"name": b["attributes"]["name"], "url": b["attributes"]["uuid"]} for b in data["data"]]
+        r = await self._request("POST", "/api/client/servers/{server}/files/delete", server=server_id,
+                                json_body={"root": "/", "files": ["*"]})
+        self.cache.invalidate(("resources", server_id))
+        return r.status == 204
+
+    async def create_backup(self, server_id, priority=PRIORITY_DEFAULT):
+        r = await self._request("POST", "/api/client/servers/{server}/backups", server=server_id, priority=priority)
+        return r.data if r.status in [200, 201] else None
+
+    async def list_backups(self, server_id, priority=PRIORITY_DEFAULT):
+        r = await self._request("GET", "/api/client/servers/{server}/backups", server=server_id, priority=priority)
+        if r.status != 200:
             return None
+        return [b["attributes"] for b in r.data["data"]]
+
+    async def get_backup_download_url(self, server_id, backup_id):
+        # A short-lived signed URL served by the node (Wings), not the panel.
+        r = await self._request("GET", "/api/client/servers/{server}/backups/{backup}/download", server=server_id,
+                                backup=backup_id)
+        return r.data["attributes"]["url"] if r.status == 200 else None
 
-    async def create_server(self, user_id, ram, disk, cpu):
+    async def delete_backup(self, server_id, backup_id, priority=PRIORITY_DEFAULT):
+        r = await self._request("DELETE", "/api/client/servers/{server}/backups/{backup}", server=server_id,
+                                backup=backup_id, priority=priority)
+        return r.status == 204
+
+    async def create_server(self, user_id, ram, disk, cpu, node_id=None, external_id=None):
         payload = {
             "name": "NewServer",
+            "external_id": external_id,
             "user": user_id,
             "egg": 1,
             "docker_image": "ghcr.io/pterodactyl/yolks:java_17",
@@ -96,53 +316,159 @@ class PteroAPI:
             "deploy": {"locations": [1], "dedicated_ip": False, "port_range": []},
             "start_on_completion": True
         }
-        async with self.session.post(f"{PANEL_URL}/api/application/servers", headers=ADMIN_HEADERS, json=payload) as r:
-            return await r.json() if r.status in [200, 201] else None
+        allocation = None
+        if node_id is not None:
+            # Pin the server to the chosen node by handing the panel one of
+            # that node's free allocations instead of letting it deploy.
+            allocation = await self.get_free_allocation(node_id)
+            if allocation is None:
+                return None
+            payload["allocation"] = {"default": allocation["id"]}
+            del payload["deploy"]
+        try:
+            r = await self._request("POST", "/api/application/servers", admin=True, json_body=payload,
+                                    priority=PRIORITY_ADMIN)
+        finally:
+            if allocation is not None:
+                self.claimed_allocations.discard(allocation["id"])
+        self.cache.invalidate_kind("node")
+        if r.status not in [200, 201]:
+            return None
+        server = r.data["attributes"]
+        self.server_nodes[server["identifier"]] = server["node"]
+        return server
+
+    async def get_server_by_external_id(self, external_id):
+        r = await self._request("GET", "/api/application/servers/external/{external_id}", admin=True,
+                                external_id=external_id, priority=PRIORITY_ADMIN)
+        return r.data["attributes"] if r.status == 200 else None
 
     async def delete_server(self, server_id):
-        async with self.session.delete(f"{PANEL_URL}/api/application/servers/{server_id}/force", headers=ADMIN_HEADERS) as r:
-            return r.status == 204
+        r = await self._request("DELETE", "/api/application/servers/{server}/force", admin=True, server=server_id,
+                                priority=PRIORITY_ADMIN)
+        self.cache.invalidate_object(server_id)
+        self.cache.invalidate_kind("node")
+        # A 404 means it is already gone, e.g. deleted by an earlier
+        # attempt that failed before the local row was removed.
+        return r.status in (204, 404)
 
     async def suspend_server(self, server_id):
-        async with self.session.post(f"{PANEL_URL}/api/application/servers/{server_id}/suspend", headers=ADMIN_HEADERS) as r:
-            return r.status == 204
+        r = await self._request("POST", "/api/application/servers/{server}/suspend", admin=True, server=server_id,
+                                priority=PRIORITY_ADMIN)
+        self.cache.invalidate_object(server_id)
+        return r.status == 204
 
     async def unsuspend_server(self, server_id):
-        async with self.session.post(f"{PANEL_URL}/api/application/servers/{server_id}/unsuspend", headers=ADMIN_HEADERS) as r:
-            return r.status == 204
+        r = await self._request("POST", "/api/application/servers/{server}/unsuspend", admin=True, server=server_id,
+                                priority=PRIORITY_ADMIN)
+        self.cache.invalidate_object(server_id)
+        return r.status == 204
 
     async def update_limits(self, server_id, ram, disk, cpu):
         payload = {
             "limits": {"memory": ram, "swap": 0, "disk": disk, "io": 500, "cpu": cpu}
         }
-        async with self.session.patch(f"{PANEL_URL}/api/application/servers/{server_id}/build", headers=ADMIN_HEADERS, json=payload) as r:
-            return r.status == 200
+        r = await self._request("PATCH", "/api/application/servers/{server}/build", admin=True, server=server_id,
+                                json_body=payload, priority=PRIORITY_ADMIN)
+        self.cache.invalidate_object(server_id)
+        return r.status == 200
+
+    async def _paginate(self, route, params=None, per_page=PER_PAGE, concurrency=PAGE_CONCURRENCY,
+                        priority=PRIORITY_DEFAULT, strict=False, **path):
+        # Failed pages are skipped, which is fine for browsing. Callers that
+        # act on what is missing from a listing pass strict=True instead.
+        params = dict(params or {}, per_page=per_page)
+        r = await self._request("GET", route, admin=True, params=dict(params, page=1), priority=priority, **path)
+        if r.status != 200:
+            if strict:
+                raise IncompleteListing(f"{route} page 1 returned {r.status}")
+            return
+        for item in r.data["data"]:
+            yield item["attributes"]
+        total_pages = r.data.get("meta", {}).get("pagination", {}).get("total_pages", 1)
+        if total_pages <= 1:
+            return
+
+        # Fetch the remaining pages concurrently, but keep at most
+        # ``concurrency`` pages in flight so memory stays bounded.
+        def fetch(page):
+            return self._request("GET", route, admin=True, params=dict(params, page=page), priority=priority,
+                                 **path)
+
+        pages = iter(range(2, total_pages + 1))
+        pending = set()
+        try:
+            while True:
+                for page in pages:
+                    pending.add(asyncio.ensure_future(fetch(page)))
+                    if len(pending) >= concurrency:
+                        break
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    r = task.result()
+                    if r.status != 200:
+                        if strict:
+                            raise IncompleteListing(f"{route} returned {r.status} for a page")
+                        continue
+                    for item in r.data["data"]:
+                        yield item["attributes"]
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def iter_servers(self, filters=None, per_page=PER_PAGE, concurrency=PAGE_CONCURRENCY,
+                           priority=PRIORITY_DEFAULT, strict=False):
+        # The application API filters servers by uuid, uuidShort, name,
+        # description, image or external_id, e.g. {"name": "lobby"}.
+        params = {f"filter[{k}]": v for k, v in (filters or {}).items()}
+        async for server in self._paginate("/api/application/servers", params, per_page, concurrency, priority,
+                                           strict):
+            self.server_nodes[server["identifier"]] = server["node"]
+            yield server
+
+    def iter_nodes(self, per_page=PER_PAGE, concurrency=PAGE_CONCURRENCY, priority=PRIORITY_DEFAULT):
+        return self._paginate("/api/application/nodes", None, per_page, concurrency, priority)
+
+    def iter_users(self, filters=None, per_page=PER_PAGE, concurrency=PAGE_CONCURRENCY,
+                   priority=PRIORITY_DEFAULT, strict=False):
+        params = {f"filter[{k}]": v for k, v in (filters or {}).items()}
+        return self._paginate("/api/application/users", params, per_page, concurrency, priority, strict)
+
+    def iter_allocations(self, node_id: int, per_page=PER_PAGE, priority=PRIORITY_DEFAULT):
+        return self._paginate("/api/application/nodes/{node}/allocations", None, per_page, 1, priority,
+                              node=node_id)
+
+    async def get_free_allocation(self, node_id: int):
+        async for allocation in self.iter_allocations(node_id, priority=PRIORITY_ADMIN):
+            if not allocation["assigned"] and allocation["id"] not in self.claimed_allocations:
+                self.claimed_allocations.add(allocation["id"])
+                return allocation
+        return None
+
+    async def iter_servers_on_node(self, node_id: int, **kwargs):
+        # The panel has no server-side node filter, so the listing is
+        # streamed page by page and filtered as it arrives.
+        async for server in self.iter_servers(**kwargs):
+            if server["node"] == node_id:
+                yield server
 
     async def list_servers_on_node(self, node_id: int):
-        async with self.session.get(f"{PANEL_URL}/api/application/servers", headers=ADMIN_HEADERS) as r:
-            if r.status != 200:
-                return []
-            data = await r.json()
-            servers = [s["attributes"]["identifier"] for s in data["data"] if s["attributes"]["node"] == node_id]
-            return servers
+        return [s["identifier"] async for s in self.iter_servers_on_node(node_id)]
 
     async def list_nodes(self):
-        async with self.session.get(f"{PANEL_URL}/api/application/nodes", headers=ADMIN_HEADERS) as r:
-            if r.status != 200:
-                return []
-            data = await r.json()
-            return [n["attributes"] for n in data["data"]]
+        return [n async for n in self.iter_nodes()]
 
     async def get_node_status(self, node_id: int):
-        async with self.session.get(f"{PANEL_URL}/api/application/nodes/{node_id}", headers=ADMIN_HEADERS) as r:
-            if r.status != 200:
-                return None
-            node = await r.json()
-            return {
-                "disk": f"{node['attributes']['disk_used']} / {node['attributes']['disk']}",
-                "memory": f"{node['attributes']['memory_used']} / {node['attributes']['memory']}",
-                "servers": node['attributes']['servers_count']
-            }
-
-    async def close(self):
-        await self.session.close()
+        async def fetch():
+            r = await self._request("GET", "/api/application/nodes/{node}", admin=True, node=node_id)
+            return r.data if r.status == 200 else None
+        node = await self._cached("node", node_id, fetch)
+        if node is None:
+            return None
+        return {
+            "disk": f"{node['attributes']['disk_used']} / {node['attributes']['disk']}",
+            "memory": f"{node['attributes']['memory_used']} / {node['attributes']['memory']}",
+            "servers": node['attributes']['servers_count']
+        }
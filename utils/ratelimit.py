@@ -0,0 +1,110 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+
+# Lower numbers are served first.
+PRIORITY_ADMIN = 0
+PRIORITY_DEFAULT = 5
+PRIORITY_BACKGROUND = 10
+
+
+class RateLimiter:
+    """Token bucket for one API key, with a priority queue for waiters.
+
+    The bucket starts from the configured budget and is corrected by the
+    panel's ``X-RateLimit-*`` headers as responses come back. When
+    ``share`` processes use the same key, each gets that fraction of it.
+    """
+
+    def __init__(self, name, rate, per=60.0, share=1):
+        self.name = name
+        self.per = per
+        self.share = share
+        self.capacity = max(rate // share, 1)
+        self.fill_rate = self.capacity / per
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._timer = None
+        self._waits = deque(maxlen=512)
+        self.acquired = 0
+        self.throttled = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+        self.updated = now
+
+    async def acquire(self, priority=PRIORITY_DEFAULT):
+        start = time.monotonic()
+        self._refill()
+        if not self._waiters and self.tokens >= 1 and start >= self.blocked_until:
+            self.tokens -= 1
+        else:
+            fut = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+            self._schedule()
+            await fut
+        self.acquired += 1
+        self._waits.append(time.monotonic() - start)
+
+    def _schedule(self):
+        if self._timer is not None or not self._waiters:
+            return
+        self._refill()
+        now = time.monotonic()
+        delay = max(self.blocked_until - now, (1 - self.tokens) / self.fill_rate, 0)
+        self._timer = asyncio.get_running_loop().call_later(delay, self._wake)
+
+    def _wake(self):
+        self._timer = None
+        self._refill()
+        if time.monotonic() >= self.blocked_until:
+            while self._waiters and self.tokens >= 1:
+                _, _, fut = heapq.heappop(self._waiters)
+                if fut.done():
+                    continue
+                self.tokens -= 1
+                fut.set_result(None)
+        while self._waiters and self._waiters[0][2].done():
+            heapq.heappop(self._waiters)
+        self._schedule()
+
+    def update(self, headers):
+        limit = headers.get("X-RateLimit-Limit")
+        remaining = headers.get("X-RateLimit-Remaining")
+        self._refill()
+        if limit and limit.isdigit() and max(int(limit) // self.share, 1) != self.capacity:
+            self.capacity = max(int(limit) // self.share, 1)
+            self.fill_rate = self.capacity / self.per
+        if remaining and remaining.isdigit():
+            self.tokens = min(self.tokens, float(remaining))
+
+    def pause(self, seconds):
+        self.throttled += 1
+        self._refill()
+        self.tokens = 0
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def has_spare(self):
+        """True if a request could go out right now without queueing."""
+        self._refill()
+        return not self._waiters and self.tokens >= 2 and time.monotonic() >= self.blocked_until
+
+    def stats(self):
+        waits = sorted(self._waits)
+        return {
+            "name": self.name,
+            "queue_depth": sum(1 for _, _, fut in self._waiters if not fut.done()),
+            "tokens": round(self.tokens, 1),
+            "capacity": self.capacity,
+            "acquired": self.acquired,
+            "throttled": self.throttled,
+            "avg_wait": sum(waits) / len(waits) if waits else 0.0,
+            "p95_wait": waits[int(len(waits) * 0.95)] if waits else 0.0,
+            "max_wait": waits[-1] if waits else 0.0,
+        }
@@ -0,0 +1,142 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import Counter
+
+from utils import metrics
+from utils.breaker import PanelUnavailable
+from utils.ptero_api import IncompleteListing
+from utils.ratelimit import PRIORITY_BACKGROUND
+
+log = logging.getLogger("ptero.reconciler")
+
+BATCH_SIZE = 500
+
+
+class Reconciler:
+    """Keeps the local users/servers tables in step with the panel.
+
+    Each cycle walks the application users and servers listings page by
+    page and diffs them against the DB: rows whose ``updated_at`` matches
+    are skipped, and only additions, transfers, updates and deletions are
+    written, in batched transactions. The panel has no "changed since"
+    filter, so the walk itself is always complete; the cursor kept in
+    meta is the newest ``updated_at`` seen, which tells how far behind the
+    local copy can be. Deletions only happen after a walk that fetched
+    every page, and never touch rows written after the walk began.
+    """
+
+    def __init__(self, db, api, directory=None, interval=None):
+        self.db = db
+        self.api = api
+        self.directory = directory
+        self.interval = interval or int(os.getenv("RECONCILE_INTERVAL", 300))
+        self.last_report = None
+        self.drift = Counter()
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.reconcile()
+            except (PanelUnavailable, IncompleteListing) as e:
+                log.warning("Reconcile skipped: %s", e)
+            except Exception:
+                log.exception("Reconcile failed")
+            await asyncio.sleep(self.interval)
+
+    async def reconcile(self):
+        started = time.time()
+        report = Counter()
+        owners = await self._reconcile_users(report)
+        cursor = await self._reconcile_servers(owners, started, report)
+        self.drift.update(report)
+        for kind, count in report.items():
+            metrics.RECONCILE_DRIFT.inc(count, kind)
+        self.last_report = {"at": int(started), "duration": round(time.time() - started, 2), "cursor": cursor,
+                            **report}
+        await self.db.set_meta("reconcile_cursor", cursor or "")
+        await self.db.set_meta("reconcile_last", json.dumps(self.last_report))
+        changed = {k: v for k, v in report.items() if k != "unchanged" and v}
+        if changed:
+            log.info("Reconciled with the panel: %s", changed)
+        return self.last_report
+
+    async def _reconcile_users(self, report):
+        """Returns (panel, panel user id) -> discord id for every linked user still on their panel."""
+        # Panel user ids are only unique within one panel.
+        linked = {(row["panel"], row["panel_id"]): row for row in await self.db.linked_users()}
+        seen = set()
+        emails = []
+        async for user in self.api.iter_users(priority=PRIORITY_BACKGROUND, strict=True):
+            key = (user.get("panel"), user["id"])
+            row = linked.get(key)
+            if row is None:
+                continue
+            seen.add(key)
+            if user["email"] != row["email"]:
+                emails.append((user["email"], row["discord_id"]))
+        unlinked = [row["discord_id"] for key, row in linked.items() if key not in seen]
+        if emails or unlinked:
+            await self.db.apply_user_changes(emails, unlinked)
+        report["user_email_changed"] += len(emails)
+        report["user_unlinked"] += len(unlinked)
+        return {key: row["discord_id"] for key, row in linked.items() if key in seen}
+
+    async def _reconcile_servers(self, owners, started, report):
+        local = {row["identifier"]: row for row in await self.db.server_sync_state()}
+        seen = set()
+        names = {}
+        upserts = []
+        cursor = await self.db.get_meta("reconcile_cursor") or None
+        async for server in self.api.iter_servers(priority=PRIORITY_BACKGROUND, strict=True):
+            identifier = server["identifier"]
+            names[identifier] = server["name"]
+            owner = owners.get((server.get("panel"), server["user"]))
+            if owner is None:
+                # Owned by someone with no linked Discord account.
+                continue
+            seen.add(identifier)
+            updated_at = server.get("updated_at")
+            if updated_at and (cursor is None or updated_at > cursor):
+                cursor = updated_at
+            row = local.get(identifier)
+            if (row is not None and row["owner_id"] == owner and row["updated_at"] == updated_at
+                    and row["panel"] == server.get("panel")):
+                report["unchanged"] += 1
+                continue
+            if row is None:
+                report["server_added"] += 1
+            elif row["owner_id"] != owner:
+                report["server_transferred"] += 1
+            else:
+                report["server_updated"] += 1
+            limits = server.get("limits") or {}
+            upserts.append((identifier, owner, int(started), server["node"], limits.get("memory"),
+                            limits.get("disk"), limits.get("cpu"), server["name"], updated_at, server.get("panel")))
+            if len(upserts) >= BATCH_SIZE:
+                await self.db.apply_server_changes(upserts, [])
+                upserts = []
+
+        deletes = [sid for sid, row in local.items() if sid not in seen and row["created_at"] < int(started)]
+        report["server_removed"] += len(deletes)
+        for i in range(0, max(len(upserts), len(deletes)), BATCH_SIZE):
+            await self.db.apply_server_changes(upserts[i:i + BATCH_SIZE], deletes[i:i + BATCH_SIZE])
+        if self.directory is not None:
+            self.directory.set_names(names)
+        return cursor
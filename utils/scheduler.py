@@ -0,0 +1,250 @@
+import asyncio
+import heapq
+import json
+import logging
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from utils import metrics
+from utils.authz import is_admin
+from utils.console import send_commands
+from utils.ratelimit import PRIORITY_BACKGROUND
+
+log = logging.getLogger("ptero.scheduler")
+
+ACTIONS = ("command", "start", "stop", "restart", "kill")
+ALIASES = {"@hourly": "0 * * * *", "@daily": "0 0 * * *", "@weekly": "0 0 * * 0", "@monthly": "0 0 1 * *"}
+# minute, hour, day of month, month, day of week (0 or 7 is Sunday)
+FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+# Long enough to find Feb 29 from anywhere.
+SEARCH_LIMIT = timedelta(days=366 * 8)
+
+
+class CronExpr:
+    """A five-field cron expression, evaluated in UTC.
+
+    Fields take ``*``, numbers, ``a-b`` ranges, ``/step`` and comma lists.
+    When both day fields are restricted a day matching either one counts,
+    as in cron.
+    """
+
+    def __init__(self, expr):
+        self.expr = expr.strip()
+        fields = ALIASES.get(self.expr, self.expr).split()
+        if len(fields) != 5:
+            raise ValueError("a cron expression needs 5 fields: minute hour day month weekday")
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self._parse(field, low, high) for field, (low, high) in zip(fields, FIELDS))
+        self.weekdays = {d % 7 for d in weekdays}
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+        self.next_after(time.time())
+
+    @staticmethod
+    def _parse(field, low, high):
+        values = set()
+        for part in field.split(","):
+            base, _, step = part.partition("/")
+            try:
+                if base == "*":
+                    start, end = low, high
+                elif "-" in base:
+                    start, end = (int(x) for x in base.split("-", 1))
+                else:
+                    start = end = int(base)
+                    if step:
+                        end = high
+                step = int(step) if step else 1
+            except ValueError:
+                raise ValueError(f"`{part}` is not a valid cron field") from None
+            if not low <= start <= end <= high or step < 1:
+                raise ValueError(f"`{part}` is out of range {low}-{high}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, t):
+        day = t.day in self.days
+        weekday = (t.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, ts):
+        """The first matching minute strictly after ``ts``, as a timestamp."""
+        t = datetime.fromtimestamp(ts, timezone.utc).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + SEARCH_LIMIT
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t.timestamp()
+        raise ValueError(f"`{self.expr}` never matches")
+
+
+class Scheduler:
+    """Runs recurring console commands and power actions from the schedules table.
+
+    Every schedule sits in an in-memory heap keyed by its next run, so
+    finding what is due costs O(log n) however many exist; removed
+    schedules are dropped lazily when they reach the top. Each run adds a
+    random delay of up to the schedule's ``jitter`` seconds, so servers
+    sharing an expression don't all reach the panel in the same second.
+    After a restart, runs missed by more than ``grace`` seconds are
+    skipped rather than replayed. Only the leader process ``start``s the
+    loop; the others just ``load`` so lookups and removals work anywhere.
+    """
+
+    def __init__(self, db, api, console, events=None, concurrency=8, grace=3600):
+        self.db = db
+        self.api = api
+        self.console = console
+        self.events = events
+        self.grace = grace
+        self.default_jitter = int(os.getenv("SCHEDULE_JITTER", 60))
+        self.schedules = {}
+        self._exprs = {}
+        self._heap = []
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._wake = asyncio.Event()
+        self._running = set()
+        self._task = None
+
+    async def load(self):
+        """Read every schedule from the DB; processes that don't run them still answer lookups from memory."""
+        self.schedules = {}
+        self._heap = []
+        for row in await self.db.get_schedules():
+            self._push(dict(row))
+
+    async def reload(self, schedule_ids):
+        """Pick up schedules another process added or removed; None reloads all of them."""
+        if schedule_ids is None:
+            return await self.load()
+        ids = [int(i) for i in schedule_ids]
+        rows = {row["id"]: row for row in await self.db.get_schedules(ids=ids)}
+        for schedule_id in ids:
+            if schedule_id in rows:
+                self._push(dict(rows[schedule_id]))
+            else:
+                self.schedules.pop(schedule_id, None)
+        self._wake.set()
+
+    async def start(self):
+        await self.load()
+        now = time.time()
+        skipped = []
+        for schedule in list(self.schedules.values()):
+            if schedule["next_run"] < now - self.grace:
+                schedule["next_run"] = self._next_run(schedule, now)
+                skipped.append((schedule["next_run"], schedule["last_run"], "skipped while offline",
+                                schedule["id"]))
+                self._push(schedule)
+        if skipped:
+            log.info("Skipped %d schedule run(s) missed while offline", len(skipped))
+            await self.db.record_schedule_runs(skipped)
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        tasks = [t for t in (self._task, *self._running) if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+    async def add(self, owner_id, server_ids, cron, action, commands=None, jitter=None):
+        """Create one schedule per server and return their ids; raises ValueError for a bad expression."""
+        expr = CronExpr(cron)
+        if action not in ACTIONS:
+            raise ValueError(f"unknown action `{action}`")
+        jitter = self.default_jitter if jitter is None else jitter
+        payload = json.dumps(commands) if action == "command" else None
+        first = expr.next_after(time.time())
+        rows = [(str(owner_id), sid, expr.expr, action, payload, jitter, first + random.uniform(0, jitter))
+                for sid in server_ids]
+        ids = await self.db.add_schedules(rows)
+        for schedule_id, row in zip(ids, rows):
+            self._push(dict(zip(("owner_id", "server_id", "cron", "action", "payload", "jitter", "next_run"), row),
+                            id=schedule_id, last_run=None, last_result=None))
+        self._wake.set()
+        return ids
+
+    async def remove(self, schedule_id):
+        self.schedules.pop(schedule_id, None)
+        return await self.db.remove_schedule(schedule_id)
+
+    def _push(self, schedule):
+        self.schedules[schedule["id"]] = schedule
+        heapq.heappush(self._heap, (schedule["next_run"], schedule["id"]))
+
+    def _next_run(self, schedule, after):
+        expr = self._exprs.get(schedule["cron"])
+        if expr is None:
+            expr = self._exprs[schedule["cron"]] = CronExpr(schedule["cron"])
+        return expr.next_after(after) + random.uniform(0, schedule["jitter"])
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            now = time.time()
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                next_run, schedule_id = heapq.heappop(self._heap)
+                schedule = self.schedules.get(schedule_id)
+                # Removed, or already pushed again with a later time.
+                if schedule is None or schedule["next_run"] != next_run:
+                    continue
+                schedule["next_run"] = self._next_run(schedule, now)
+                self._push(schedule)
+                due.append(schedule)
+            if due:
+                task = asyncio.ensure_future(self._execute_batch(due, now))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+            # Wake at least once a minute in case the clock jumped.
+            timeout = min(self._heap[0][0] - time.time(), 60) if self._heap else 60
+            try:
+                await asyncio.wait_for(self._wake.wait(), max(timeout, 0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _execute_batch(self, due, now):
+        results = await asyncio.gather(*(self._execute(s) for s in due))
+        await self.db.record_schedule_runs([(s["next_run"], now, result, s["id"]) for s, result in zip(due, results)])
+
+    async def _execute(self, schedule):
+        server_id, action = schedule["server_id"], schedule["action"]
+        # Admins can schedule servers that no linked user owns (a node's
+        # servers come from the panel listing), so only users' schedules
+        # are tied to the local ownership records.
+        if not is_admin(schedule["owner_id"]) and not self.db.authz.can_access(schedule["owner_id"], server_id):
+            await self.remove(schedule["id"])
+            return "removed: server gone or access revoked"
+        async with self._semaphore:
+            try:
+                if action == "command":
+                    commands = json.loads(schedule["payload"])
+                    sent = await send_commands(self.console, self.api, server_id, commands, PRIORITY_BACKGROUND)
+                    ok = sent == len(commands)
+                    result = f"sent {sent}/{len(commands)} commands"
+                else:
+                    ok = await self.api.send_power_action(server_id, action, priority=PRIORITY_BACKGROUND)
+                    result = "ok" if ok else "panel rejected the request"
+            except Exception as e:
+                ok, result = False, str(e) or type(e).__name__
+        outcome = "ok" if ok else "failed"
+        metrics.SCHEDULE_RUNS.inc(1, action, outcome)
+        if self.events is not None:
+            prefix = "console" if action == "command" else "power"
+            self.events.record(schedule["owner_id"], f"{prefix}.scheduled", server_id,
+                               detail=f"schedule #{schedule['id']}: {result}", outcome=outcome)
+        return result